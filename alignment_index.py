@@ -0,0 +1,151 @@
+import bisect
+import re
+from collections import Counter, deque
+
+import langextract as lx
+
+from instrumentation import TimedResolver, metrics
+
+# Exact-substring alignment in one pass. lx's WordAligner tokenizes the chunk and aligns every extraction
+# with token matching and a fuzzy fallback, seconds of CPU on a long wording with hundreds of extractions.
+# The prompts ask for exact substrings, so nearly all of them are found by an Aho-Corasick automaton over
+# the extraction texts, run once over the text; only the leftovers go through WordAligner.
+
+WHITESPACE = re.compile(r"\s+")
+LETTERS = re.compile(r"[^\W\d_]")
+DIGITS = re.compile(r"\d")
+MASK_LETTER = "\ua66e" # a letter no extraction contains, so WordAligner cannot match a masked word
+
+
+class AhoCorasick:
+    """Automaton over a set of patterns; find_all() reports every occurrence of every pattern in one pass."""
+
+    def __init__(self, patterns):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._out: list[list[str]] = [[]] # patterns ending in each state, including those of its fail chain
+        for pattern in set(patterns):
+            state = 0
+            for char in pattern:
+                following = self._goto[state].get(char)
+                if following is None:
+                    following = len(self._goto)
+                    self._goto[state][char] = following
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = following
+            self._out[state].append(pattern)
+
+        queue = deque(self._goto[0].values()) # breadth first, so every fail target is complete before it is used
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[following] = target if target != following else 0
+                self._out[following] = self._out[following] + self._out[self._fail[following]]
+
+    def find_all(self, text: str) -> dict[str, list[int]]:
+        """Start offsets of all (also overlapping) occurrences per pattern, ascending."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: dict[str, list[int]] = {}
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in out[state]:
+                found.setdefault(pattern, []).append(position - len(pattern) + 1)
+        return found
+
+
+def _normalize(text: str) -> tuple[str, list[int]] | None:
+    """
+    text lowercased with every whitespace run as one space, like WordAligner compares tokens, and the
+    offset in text of every character of the result. None if lowercasing changes a length (e.g. "İ").
+    """
+    parts, offsets, position = [], [], 0
+    for match in WHITESPACE.finditer(text + " "):
+        word = text[position:match.start()].lower()
+        if len(word) != match.start() - position:
+            return None
+        parts.append(word)
+        offsets.extend(range(position, match.start()))
+        parts.append(" ")
+        offsets.append(match.start())
+        position = match.end()
+    return "".join(parts)[:-1], offsets[:-1]
+
+
+def align_exact(extractions: list[lx.data.Extraction], text: str, char_offset: int = 0) -> list[lx.data.Extraction]:
+    """
+    Set char_interval and MATCH_EXACT on every extraction whose text occurs in text, verbatim or up to
+    case and whitespace (the model rejoined a wrapped line); returns the others.
+    Extractions come in order of appearance, so each one takes the first unused occurrence at or after the
+    previous match: repeated strings ("four", the same instalment dates in every layer) get distinct
+    occurrences in order. An extraction out of order falls back to its first unused occurrence anywhere.
+    """
+    wanted = Counter(e.extraction_text for e in extractions if e.extraction_text and e.extraction_text.strip())
+    verbatim = AhoCorasick(wanted).find_all(text) if wanted else {}
+    unused = {pattern: [(start, start + len(pattern)) for start in starts] for pattern, starts in verbatim.items()}
+
+    # every pattern also takes its occurrences up to case and whitespace, merged in text order with the
+    # verbatim ones, as WordAligner compares lowercased tokens: "four" x3 in "four and four and FOUR".
+    # Only a text whose lowercase changes length (no normalized pass) keeps to the verbatim occurrences.
+    normalized = _normalize(text) if wanted else None
+    if normalized is not None:
+        folded, offsets = normalized
+        keys = {pattern: " ".join(pattern.lower().split()) for pattern in wanted}
+        found = AhoCorasick(keys.values()).find_all(folded)
+        for pattern, key in keys.items():
+            spans = {(offsets[start], offsets[start + len(key) - 1] + 1) for start in found.get(key, ())}
+            unused[pattern] = sorted(spans.union(unused.get(pattern, ())))
+
+    leftovers, cursor = [], 0
+    for extraction in extractions:
+        spans = unused.get(extraction.extraction_text)
+        if not spans:
+            leftovers.append(extraction)
+            continue
+        index = bisect.bisect_left(spans, (cursor,))
+        start, end = spans.pop(index if index < len(spans) else 0)
+        cursor = start
+        extraction.char_interval = lx.data.CharInterval(start_pos=char_offset + start, end_pos=char_offset + end)
+        extraction.token_interval = None # not needed downstream, and tokenizing the text would cost more than the whole match
+        extraction.alignment_status = lx.data.AlignmentStatus.MATCH_EXACT # what WordAligner reports for case or whitespace differences too
+    return leftovers
+
+
+def mask_spans(text: str, spans) -> str:
+    """
+    text with the letters and digits of the given (start, end) spans replaced, same length and same tokens:
+    WordAligner run on it cannot pick a span already taken by another extraction, and its offsets still fit text.
+    """
+    chars = list(text)
+    for start, end in spans:
+        masked = DIGITS.sub("0", LETTERS.sub(MASK_LETTER, text[start:end]))
+        chars[start:end] = masked
+    return "".join(chars)
+
+
+class IndexedResolver(TimedResolver):
+    """TimedResolver whose align() matches exact substrings first and hands only the rest to WordAligner."""
+
+    def align(self, extractions, source_text, token_offset, char_offset=None, *args, **kwargs):
+        extractions = list(extractions)
+        with metrics.stage("align", bytes_in=len(source_text)) as span:
+            leftovers = align_exact(extractions, source_text, char_offset or 0)
+            if leftovers: # paraphrases, partial matches: WordAligner's token matching and fuzzy fallback
+                taken = [
+                    (e.char_interval.start_pos - (char_offset or 0), e.char_interval.end_pos - (char_offset or 0))
+                    for e in extractions if e.char_interval is not None
+                ]
+                masked = mask_spans(source_text, taken) # the leftovers only get spans no exact match took
+                for _ in lx.resolver.Resolver.align(self, leftovers, masked, token_offset, char_offset, *args, **kwargs):
+                    pass # aligns the leftovers in place
+            span.chunks = 1
+        yield from extractions
@@ -0,0 +1,133 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import langextract as lx
+
+from model_utils import DelegatingModel
+
+RETRY_STATUS = {429, 500, 502, 503, 504} # rate limited or server side errors, worth another try
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows `rate` requests per second on average, with bursts up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait) # sleep outside the lock so other threads can refill and check
+
+
+def status_code(error: Exception) -> int | None:
+    """
+    Best effort HTTP status of a failed model call. Providers wrap errors in
+    InferenceRuntimeError, so look at the original exception and the message as well.
+    """
+    for candidate in (error, getattr(error, "original", None)):
+        if candidate is None:
+            continue
+        code = getattr(candidate, "status_code", None)
+        if code is None:
+            code = getattr(getattr(candidate, "response", None), "status_code", None)
+        if code is not None:
+            return int(code)
+    match = re.search(r"status code[^0-9]{0,20}(\d{3})", str(error), re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+class ThrottledModel(DelegatingModel):
+    """
+    Sends the prompts of a batch to the wrapped model concurrently, at most max_in_flight at a
+    time across all callers, optionally rate limited, retrying 429/5xx answers with exponential backoff.
+    Owns a thread pool: close() it, or use it as a context manager, when done with the model.
+    """
+
+    def __init__(
+            self,
+            inner,
+            model_id: str,
+            max_in_flight: int = 16,
+            requests_per_second: float | None = None, # None means no rate limit
+            max_retries: int = 5,
+            backoff_seconds: float = 1.0
+    ):
+        super().__init__(inner, model_id)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self.retries = 0
+        self._retries_lock = threading.Lock() # _call runs on the pool threads
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="model-call")
+
+    def _call(self, prompt: str, kwargs: dict):
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                return next(iter(self.inner.infer([prompt], **kwargs)))
+            except Exception as e:
+                if status_code(e) not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+            with self._retries_lock:
+                self.retries += 1
+            delay = self.backoff_seconds * 2 ** attempt
+            time.sleep(delay * random.uniform(0.5, 1.0)) # jitter, so throttled callers do not retry in lockstep
+
+    def infer(self, batch_prompts, **kwargs):
+        futures = [self._pool.submit(self._call, prompt, kwargs) for prompt in batch_prompts]
+        for future in futures:
+            yield future.result() # keep langextract's prompt order
+
+    def close(self):
+        """Stop the pool threads; calls already submitted finish first."""
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+async def extract_documents(
+        texts: list[str],
+        model,
+        max_documents: int = 4, # documents extracted at the same time
+        batch_length: int = 16, # chunks handed to the model in one infer() call, match the in-flight limit
+        **extract_kwargs # passed on to lx.extract, e.g. prompt_description and examples
+) -> list:
+    """
+    Run lx.extract for many documents concurrently and return the results in input order.
+    A failed document shows up as its exception instead of an AnnotatedDocument.
+    """
+    extract_kwargs.setdefault("max_workers", batch_length)
+    extract_kwargs.setdefault("show_progress", False) # parallel progress bars would interleave
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max_documents, thread_name_prefix="document") as pool:
+        jobs = [
+            loop.run_in_executor(pool, partial(lx.extract, text_or_documents=text, model=model, batch_length=batch_length, **extract_kwargs))
+            for text in texts
+        ]
+        return await asyncio.gather(*jobs, return_exceptions=True)
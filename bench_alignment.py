@@ -0,0 +1,55 @@
+import argparse
+import random
+import time
+
+import langextract as lx
+
+from alignment_index import IndexedResolver
+import synthetic_slips
+
+# Alignment CPU on a long wording: lx's Resolver (WordAligner) vs IndexedResolver, on the same extractions.
+# The extractions are the first words of every few lines, some of them repeated strings, some with the
+# whitespace collapsed like a model rejoining wrapped lines, and some with different case.
+
+
+def make_extractions(text: str, count: int, rng: random.Random) -> list[tuple[str, str]]:
+    lines = [line for line in text.splitlines() if line.strip()]
+    step = max(1, len(lines) // count)
+    picked = []
+    for line in lines[::step][:count]:
+        words = line.split()[:4]
+        extraction_text = " ".join(words) if rng.random() < 0.3 else line[:line.find(words[-1]) + len(words[-1])].strip()
+        if rng.random() < 0.05:
+            extraction_text = extraction_text.lower()
+        picked.append(("x", extraction_text))
+    return picked
+
+
+def align(resolver, picked, text) -> tuple[float, list]:
+    extractions = [lx.data.Extraction(extraction_class=extraction_class, extraction_text=extraction_text) for extraction_class, extraction_text in picked]
+    start = time.perf_counter()
+    aligned = list(resolver.align(extractions, text, 0, 0))
+    return time.perf_counter() - start, aligned
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="lx WordAligner vs the Aho-Corasick alignment index on a long synthetic wording")
+    parser.add_argument("--slips", type = int, default = 40, help = "slips concatenated into one long document")
+    parser.add_argument("--extractions", type = int, default = 400)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    text = "".join(synthetic_slips.make_slip(rng, i + 1) for i in range(args.slips))
+    picked = make_extractions(text, args.extractions, rng)
+
+    lx_seconds, expected = align(lx.resolver.Resolver(), picked, text)
+    indexed_seconds, aligned = align(IndexedResolver(), picked, text)
+    same = sum(
+        1 for a, b in zip(expected, aligned)
+        if (a.char_interval and (a.char_interval.start_pos, a.char_interval.end_pos)) == (b.char_interval and (b.char_interval.start_pos, b.char_interval.end_pos))
+    )
+    print(f"{len(text):,} chars, {len(picked)} extractions")
+    print(f"lx Resolver      {lx_seconds * 1e3:8.1f}ms")
+    print(f"IndexedResolver  {indexed_seconds * 1e3:8.1f}ms ({lx_seconds / indexed_seconds:.0f}x)")
+    print(f"same offsets as lx for {same}/{len(picked)} extractions")
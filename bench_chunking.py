@@ -0,0 +1,71 @@
+import argparse
+from pathlib import Path
+
+import langextract as lx
+from langextract.core import base_model, format_handler as fh, types as lx_types
+
+import treaty_chunking
+import treaty_prompt
+from fake_model_server import fake_answer
+
+
+class CountingModel(base_model.BaseLanguageModel):
+    """In-process stand-in model that records every prompt it is sent."""
+
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def infer(self, batch_prompts, **kwargs):
+        for prompt in batch_prompts:
+            self.prompts.append(prompt)
+            yield [lx_types.ScoredOutput(score=1.0, output=fake_answer(prompt))]
+
+
+def split_sections(text: str, chunk_texts: list[str]) -> int:
+    """Number of sections that do not fit completely inside one chunk."""
+    spans = []
+    position = 0
+    for chunk_text in chunk_texts:
+        start = text.find(chunk_text, position)
+        if start >= 0:
+            spans.append((start, start + len(chunk_text)))
+            position = start + 1
+    starts = treaty_chunking.section_starts(text) + [len(text)]
+    sections = [(start, start + len(text[start:end].rstrip())) for start, end in zip(starts, starts[1:])] # chunks drop trailing whitespace
+    return sum(
+        1 for start, end in sections
+        if not any(chunk_start <= start and end <= chunk_end for chunk_start, chunk_end in spans)
+    )
+
+
+def measure(text: str, section_tokens: int | None, max_char_buffer: int) -> tuple[int, int, int]:
+    model = CountingModel()
+    treaty_prompt.extract(text, model, max_char_buffer=max_char_buffer, show_progress=False, section_tokens=section_tokens)
+    prefix_chars = len(treaty_prompt.load_artifact().prefix(_handler_for(model)))
+    chunk_texts = [prompt[prefix_chars:].removeprefix("Q: ").removesuffix("\nA: ") for prompt in model.prompts]
+    tokens = sum(treaty_chunking.estimate_tokens(prompt) for prompt in model.prompts)
+    return len(model.prompts), tokens, split_sections(text, chunk_texts)
+
+
+def _handler_for(model):
+    return fh.FormatHandler(format_type=lx.data.FormatType.JSON, use_wrapper=True, wrapper_key=lx.data.EXTRACTIONS_KEY, use_fences=model.requires_fence_output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model calls and tokens sent per document: langextract char chunking vs section chunking")
+    parser.add_argument("sources", nargs = "*", help = "converted .md/.txt slips (default: the example slip)")
+    parser.add_argument("--max-char-buffer", type = int, default = 1000, help = "lx.extract default chunk size")
+    parser.add_argument("--section-tokens", type = int, default = 512)
+    args = parser.parse_args()
+
+    if args.sources:
+        documents = {Path(p).name: Path(p).read_text(encoding="utf-8") for p in args.sources}
+    else:
+        documents = {"example slip": treaty_prompt.load_artifact().examples[0].text}
+
+    print(f"{'document':24} {'mode':10} {'calls':>6} {'tokens sent':>12} {'split sections':>15}")
+    for name, text in documents.items():
+        for mode, section_tokens in (("chars", None), ("sections", args.section_tokens)):
+            calls, tokens, split = measure(text, section_tokens, args.max_char_buffer)
+            print(f"{name[:24]:24} {mode:10} {calls:6} {tokens:12,} {split:15}")
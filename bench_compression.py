@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import langextract as lx
+
+from instrumentation import percentile
+from io_utils import JsonlWriter, read_extraction_output, read_extraction_outputs, write_markdown
+import synthetic_slips
+import zstd_io
+
+# Plain vs zstd-compressed outputs (zstd_io.py) on synthetic slips: bytes written and write time of the
+# results JSONL and the markdown side outputs, full read throughput (MB/s of JSON), and the latency of
+# reading single documents: a scan of the plain JSONL up to the document vs one frame of the .jsonl.zst.
+# Results carry one extraction per header/value pair of the slip, about what the treaty prompt returns.
+
+HEADER = re.compile(r"^([A-Z][A-Z &/]+):\n(.+)$", re.MULTILINE)
+
+
+def make_result(text: str, document_id: str) -> lx.data.AnnotatedDocument:
+    extractions = [
+        lx.data.Extraction(
+            extraction_class=match.group(1).lower(),
+            extraction_text=match.group(2),
+            char_interval=lx.data.CharInterval(start_pos=match.start(2), end_pos=match.end(2)),
+            alignment_status=lx.data.AlignmentStatus.MATCH_EXACT,
+            extraction_index=number,
+            attributes={"section": match.group(1)},
+        )
+        for number, match in enumerate(HEADER.finditer(text), start=1)
+    ]
+    return lx.data.AnnotatedDocument(document_id=document_id, text=text, extractions=extractions)
+
+
+def size_of(path: Path) -> int:
+    sidecar = zstd_io.index_path(path)
+    return path.stat().st_size + (sidecar.stat().st_size if sidecar.is_file() else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plain vs zstd-compressed results JSONL and markdown")
+    parser.add_argument("--documents", type = int, default = 2000)
+    parser.add_argument("--lookups", type = int, default = 50, help = "single documents read at random")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [synthetic_slips.make_slip(rng, i + 1) for i in range(args.documents)]
+    results = [make_result(text, f"slip_{i:05d}") for i, text in enumerate(texts)]
+    lookups = rng.sample([result.document_id for result in results], min(args.lookups, len(results)))
+
+    with tempfile.TemporaryDirectory(prefix = "bench_compression_") as work_dir:
+        work_dir = Path(work_dir)
+        print(f"{args.documents} slips, {sum(len(r.extractions) for r in results) // len(results)} extractions each")
+        print(f"{'':30} {'bytes':>12} {'ratio':>6} {'write s':>8} {'read MB/s':>10} {'one doc p50 ms':>15} {'p95 ms':>7}")
+        plain_bytes = None
+        for name in ("extraction_results.jsonl", "extraction_results.jsonl.zst"):
+            path = work_dir / name
+            start = time.perf_counter()
+            with JsonlWriter(path, append = False) as writer:
+                for result in results:
+                    writer.write(result)
+            write_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            lines = [len(line.encode("utf-8")) for line in zstd_io.iter_lines(path)]
+            documents, json_bytes = len(lines), sum(lines)
+            raw_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            parsed = sum(1 for _ in read_extraction_outputs(path))
+            parse_seconds = time.perf_counter() - start
+            assert documents == parsed == args.documents
+
+            latencies = []
+            for document_id in lookups:
+                start = time.perf_counter()
+                assert read_extraction_output(path, document_id).document_id == document_id
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            size = size_of(path)
+            plain_bytes = plain_bytes or size
+            print(
+                f"{name:30} {size:12,} {plain_bytes / size:6.1f} {write_seconds:8.2f} {json_bytes / 1e6 / parse_seconds:10.1f}"
+                f" {percentile(latencies, 50):15.2f} {percentile(latencies, 95):7.2f}"
+            )
+            print(f"{'':30} lines only, no JSON parsing: {json_bytes / 1e6 / raw_seconds:.0f} MB/s")
+
+        for compress in (False, True):
+            md_dir = work_dir / ("md_zst" if compress else "md")
+            md_dir.mkdir()
+            start = time.perf_counter()
+            paths = [write_markdown(md_dir / f"{result.document_id}.md", text, compress) for result, text in zip(results, texts)]
+            write_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            assert [zstd_io.read_text(path) for path in paths] == texts
+            read_seconds = time.perf_counter() - start
+            size = sum(os.path.getsize(path) for path in paths)
+            md_bytes = sum(len(text.encode("utf-8")) for text in texts)
+            print(f"{'markdown .md' + ('.zst' if compress else ''):30} {size:12,} {md_bytes / size:6.1f} {write_seconds:8.2f} {md_bytes / 1e6 / read_seconds:10.1f}")
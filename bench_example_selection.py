@@ -0,0 +1,77 @@
+import argparse
+import random
+
+import langextract as lx
+from langextract.core import format_handler as fh
+
+from model_utils import shared_model
+import synthetic_slips
+import treaty_chunking
+import treaty_prompt
+
+# Few-shot tokens per chunk, the whole example vs the sections example_selection picks for a budget, over
+# the section chunks of synthetic slips. Offline, recall is the share of classes a chunk needs an example of
+# (the classes of the example sections under the chunk's headers) that the picked sections still show.
+# With --model-url every chunk is also extracted with both prompts, and recall is the share of the
+# full-prompt (class, text) pairs the selected prompt finds too.
+
+
+def needed_classes(library, chunk_text: str) -> set[str]:
+    headers = {" ".join(match.group(0).upper().split()) for match in treaty_chunking.HEADER.finditer(chunk_text)}
+    return {e.extraction_class for section in library.sections if section.header in headers for e in section.extractions}
+
+
+def pairs(result) -> set[tuple[str, str]]:
+    return {(e.extraction_class, e.extraction_text) for e in result.extractions or []}
+
+
+def extract_all(texts: list[str], model, example_tokens: int | None) -> list[set]:
+    treaty_prompt.EXAMPLE_TOKENS = example_tokens
+    return [pairs(result) for result in treaty_prompt.extract_texts(texts, model, show_progress=False)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt tokens and recall: all few-shot examples vs BM25-selected example sections")
+    parser.add_argument("--documents", type = int, default = 50)
+    parser.add_argument("--section-tokens", type = int, default = 512)
+    parser.add_argument("--budgets", type = int, nargs = "+", default = [600, 1200, 2000], help = "example tokens per chunk to compare")
+    parser.add_argument("--model-url", default = None, help = "also extract every chunk with both prompts, e.g. http://127.0.0.1:11434")
+    parser.add_argument("--model-id", default = "gpt-oss:20b")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [
+        chunk.text
+        for i in range(args.documents)
+        for chunk in treaty_chunking.build_chunks(synthetic_slips.make_slip(rng, i + 1), args.section_tokens)
+    ]
+    artifact = treaty_prompt.load_artifact()
+    library = artifact.library
+    handler = fh.FormatHandler(format_type=lx.data.FormatType.JSON, use_wrapper=True, wrapper_key=lx.data.EXTRACTIONS_KEY, use_fences=True)
+    sizes = artifact.section_sizes(handler)
+    full_tokens = treaty_chunking.estimate_tokens(artifact.prefix(handler))
+    chunk_tokens = sum(treaty_chunking.estimate_tokens(text) for text in texts)
+
+    print(f"{len(texts)} chunks of {args.documents} slips, {chunk_tokens / len(texts):,.0f} chunk tokens per prompt")
+    print(f"{'examples':>10} {'prefix tokens/chunk':>20} {'prompt tokens':>14} {'saved':>7} {'class recall':>13}")
+    print(f"{'all':>10} {full_tokens:20,.0f} {full_tokens * len(texts) + chunk_tokens:14,} {'':>7} {1.0:13.3f}")
+    for budget in args.budgets:
+        prefix_tokens, needed, shown = 0, 0, 0
+        for text in texts:
+            picked = library.select(text, budget, sizes)
+            prefix_tokens += treaty_chunking.estimate_tokens(artifact.prefix(handler, picked))
+            classes = needed_classes(library, text)
+            needed += len(classes)
+            shown += len(classes & {e.extraction_class for i in picked for e in library.sections[i].extractions})
+        saved = 1 - prefix_tokens / (full_tokens * len(texts))
+        print(f"{budget:10} {prefix_tokens / len(texts):20,.0f} {prefix_tokens + chunk_tokens:14,} {saved:7.1%} {shown / needed if needed else 1.0:13.3f}")
+
+    if args.model_url:
+        model = shared_model(args.model_id, fence_output = True, use_schema_constraints = False, model_url = args.model_url)
+        expected = extract_all(texts, model, None)
+        for budget in args.budgets:
+            found = extract_all(texts, model, budget)
+            total = sum(len(full) for full in expected)
+            kept = sum(len(full & selected) for full, selected in zip(expected, found))
+            print(f"budget {budget}: model recall against the full prompt {kept / total if total else 1.0:.3f} ({kept}/{total} extractions)")
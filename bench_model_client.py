@@ -0,0 +1,60 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_model_server import FakeModelHandler, start_server
+from instrumentation import percentile
+from model_utils import build_model, shared_model
+
+PROMPT = "Q: UMR: B0507RE2500123\nTYPE: Excess of Loss\nA: " # short chunk, the answer time is not what we measure
+
+
+def run_documents(make_model, documents: int, chunks: int, threads: int) -> tuple[list[float], list[float]]:
+    """Extract `documents` documents of `chunks` prompts each; returns per-document setup and per-call latencies."""
+    setup_seconds, call_seconds = [], []
+
+    def document(_):
+        start = time.perf_counter()
+        model = make_model()
+        setup_seconds.append(time.perf_counter() - start)
+        for _ in range(chunks):
+            start = time.perf_counter()
+            next(iter(model.infer([PROMPT])))
+            call_seconds.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(document, range(documents)))
+    return setup_seconds, call_seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-call model overhead against a local stub server: provider per document vs shared pooled client")
+    parser.add_argument("--documents", type = int, default = 50)
+    parser.add_argument("--chunks", type = int, default = 8, help = "model calls per document")
+    parser.add_argument("--threads", type = int, default = 4, help = "documents extracted at the same time")
+    parser.add_argument("--pool-size", type = int, default = 16)
+    args = parser.parse_args()
+
+    server = start_server() # no latency, so every millisecond measured is client overhead
+    model_kwargs = {"fence_output": True, "use_schema_constraints": False, "model_url": f"http://127.0.0.1:{server.server_port}"}
+
+    modes = {
+        # before: what lx.extract(model_id=...) does, a fresh provider per document posting through requests.post
+        "provider per document": lambda: build_model("gpt-oss:20b", pool_size=None, **model_kwargs),
+        # after: one provider per process, keep-alive connections shared by all documents and threads
+        "shared pooled client": lambda: shared_model("gpt-oss:20b", pool_size=args.pool_size, **model_kwargs),
+    }
+    shared_model("gpt-oss:20b", pool_size=args.pool_size, **model_kwargs) # built once up front, like a warm process
+
+    print(f"{args.documents} documents x {args.chunks} calls, {args.threads} threads")
+    print(f"{'':24} {'setup/doc':>10} {'call p50':>10} {'call p95':>10} {'mean':>10} {'connections':>12}")
+    for name, make_model in modes.items():
+        connections_before = FakeModelHandler.connections_opened
+        setup_seconds, call_seconds = run_documents(make_model, args.documents, args.chunks, args.threads)
+        print(
+            f"{name:24} {sum(setup_seconds) / len(setup_seconds) * 1e3:8.2f}ms"
+            f" {percentile(call_seconds, 50) * 1e3:8.2f}ms {percentile(call_seconds, 95) * 1e3:8.2f}ms"
+            f" {sum(call_seconds) / len(call_seconds) * 1e3:8.2f}ms"
+            f" {FakeModelHandler.connections_opened - connections_before:12}"
+        )
+    server.shutdown()
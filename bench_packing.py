@@ -0,0 +1,64 @@
+import argparse
+import random
+import time
+
+from fake_model_server import FakeModelHandler, start_server
+from model_utils import DelegatingModel, shared_model
+import doc_packing
+import synthetic_slips
+import treaty_chunking
+import treaty_prompt
+
+# Short endorsements, one model call each vs packed into shared calls with doc_packing, against the local
+# fake model: model calls, prompt tokens sent, documents/sec, and whether every document gets the same
+# extractions (class, text and offsets in its own text) both ways.
+
+
+class CountingModel(DelegatingModel):
+    """Counts the prompt tokens sent to the wrapped model."""
+
+    def __init__(self, inner, model_id: str):
+        super().__init__(inner, model_id)
+        self.prompt_tokens = 0
+
+    def infer(self, batch_prompts, **kwargs):
+        self.prompt_tokens += sum(treaty_chunking.estimate_tokens(prompt) for prompt in batch_prompts)
+        yield from self.inner.infer(batch_prompts, **kwargs)
+
+
+def key(result) -> list[tuple]:
+    return [(e.extraction_class, e.extraction_text, e.char_interval.start_pos, e.char_interval.end_pos) for e in result.extractions if e.char_interval]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="One call per short document vs packed calls, against a fake model")
+    parser.add_argument("--documents", type = int, default = 200)
+    parser.add_argument("--pack-tokens", type = int, default = doc_packing.PACK_TOKENS)
+    parser.add_argument("--latency", type = float, default = 0.2, help = "fake model seconds per call")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    server = start_server(latency = args.latency)
+    model = CountingModel(shared_model("gpt-oss:20b", fence_output = True, use_schema_constraints = False, model_url = f"http://127.0.0.1:{server.server_port}"), "gpt-oss:20b")
+    rng = random.Random(args.seed)
+    texts = [synthetic_slips.make_endorsement(rng, i + 1) for i in range(args.documents)]
+    treaty_prompt.extract_texts(texts[:1], model, show_progress = False) # warm up: artifact, connection pool
+
+    modes = {
+        "one call per document": lambda: [treaty_prompt.extract(text, model, show_progress = False, section_tokens = 512) for text in texts],
+        "one call each, 10 at once": lambda: treaty_prompt.extract_texts(texts, model, show_progress = False),
+        "packed": lambda: doc_packing.extract_packed(texts, model, args.pack_tokens, show_progress = False),
+    }
+    outputs = {}
+    print(f"{args.documents} endorsements of ~{sum(map(len, texts)) // len(texts)} chars, fake model latency {args.latency}s")
+    print(f"{'':26} {'model calls':>12} {'prompt tokens':>14} {'docs/sec':>9}")
+    for mode, run in modes.items():
+        calls_before, tokens_before = FakeModelHandler.requests_served, model.prompt_tokens
+        start = time.perf_counter()
+        outputs[mode] = run()
+        seconds = time.perf_counter() - start
+        print(f"{mode:26} {FakeModelHandler.requests_served - calls_before:12} {model.prompt_tokens - tokens_before:14,} {args.documents / seconds:9.1f}")
+    server.shutdown()
+
+    same = sum(1 for alone, packed in zip(outputs["one call per document"], outputs["packed"]) if key(alone) == key(packed))
+    print(f"identical extractions: {same}/{args.documents} documents, packing: {doc_packing.summary()}")
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_model_server import FakeModelHandler, start_server
+from instrumentation import percentile
+
+# End to end benchmark of the batch pipeline (io_utils conversion -> treaty extraction -> JSONL) on
+# synthetic slips against the local fake model, e.g.
+#   python bench_pipeline.py --scales 10 1000 10000 --latency 0.05
+# Every scale runs in a fresh process inside its own temp directory (cold caches, own peak RSS).
+# Results go to out/bench_pipeline.json; --baseline <old json> fails on a regression.
+
+REPO_DIR = Path(__file__).resolve().parent
+REGRESSION_TOLERANCE = 0.10 # 10% fewer docs/sec or 10% higher p95 counts as a regression
+
+
+def peak_rss_mb() -> tuple[float | None, float | None]:
+    """Peak resident set size of this process and of its largest child (the conversion pool), in MB."""
+    try:
+        import resource
+    except ImportError: # Windows
+        return None, None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024 # ru_maxrss is bytes on macOS, KiB on Linux
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    )
+
+
+def run_scale(count: int, workers: int | None, pdf_share: float, seed: int) -> dict:
+    """Child process: generate count slips in the current directory and push them through the batch pipeline."""
+    import synthetic_slips
+    import treaty_pipeline
+    from checkpoint import Manifest, source_hash
+    from io_utils import JsonlWriter, convert_many
+
+    sources = synthetic_slips.generate("in", count, pdf_share=pdf_share, seed=seed)
+
+    start = time.perf_counter()
+    with JsonlWriter(treaty_pipeline.RESULTS_PATH, append=False) as writer:
+        run = treaty_pipeline.BatchRun(writer, Manifest(treaty_pipeline.MANIFEST_PATH), {source: source_hash(source) for source in sources})
+        for source, md_text, convert_seconds, error in convert_many(sources, max_workers=workers, cache_dir=treaty_pipeline.CACHE_DIR):
+            treaty_pipeline.process_converted(source, md_text, convert_seconds, error, run)
+    seconds = time.perf_counter() - start
+
+    latencies = [convert_seconds + extract_seconds for _, convert_seconds, extract_seconds, _ in run.timings]
+    done = sum(1 for *_, status in run.timings if status == "ok")
+    rss, children_rss = peak_rss_mb()
+    return {
+        "documents": count,
+        "ok": done,
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(done / seconds, 3) if seconds > 0 else 0.0,
+        "p50_seconds": round(percentile(latencies, 50), 4),
+        "p95_seconds": round(percentile(latencies, 95), 4),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "peak_rss_children_mb": round(children_rss, 1) if children_rss is not None else None,
+    }
+
+
+def regressions(results: list[dict], baseline: list[dict]) -> list[str]:
+    previous = {row["documents"]: row for row in baseline}
+    found = []
+    for row in results:
+        old = previous.get(row["documents"])
+        if old is None:
+            continue
+        if row["docs_per_sec"] < old["docs_per_sec"] * (1 - REGRESSION_TOLERANCE):
+            found.append(f"{row['documents']} docs: {old['docs_per_sec']} -> {row['docs_per_sec']} docs/sec")
+        if row["p95_seconds"] > old["p95_seconds"] * (1 + REGRESSION_TOLERANCE):
+            found.append(f"{row['documents']} docs: p95 {old['p95_seconds']} -> {row['p95_seconds']}s")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline throughput, latency and memory on synthetic slips against a fake model")
+    parser.add_argument("--scales", type = int, nargs = "+", default = [10, 1000, 10000], help = "document counts, one run each")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "fake model seconds per call")
+    parser.add_argument("--workers", type = int, default = None, help = "conversion processes (default: one per CPU)")
+    parser.add_argument("--pdf-share", type = float, default = 0.1, help = "share of slips generated as PDF")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--out", default = "out/bench_pipeline.json")
+    parser.add_argument("--baseline", default = None, help = "earlier --out file; exit 1 if docs/sec or p95 got >10% worse")
+    parser.add_argument("--child", type = int, default = None, help = argparse.SUPPRESS) # internal: run one scale in this process
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_scale(args.child, args.workers, args.pdf_share, args.seed)))
+        sys.exit(0)
+
+    server = start_server(latency = args.latency) # in this process, so the model's CPU is not charged to the pipeline
+    env = {**os.environ, "OLLAMA_BASE_URL": f"http://127.0.0.1:{server.server_port}", "PYTHONPATH": str(REPO_DIR)}
+    results = []
+    print(f"{'documents':>10} {'docs/sec':>10} {'p50 s':>8} {'p95 s':>8} {'peak RSS MB':>12} {'pool RSS MB':>12} {'model calls':>12}")
+    for count in args.scales:
+        calls_before = FakeModelHandler.requests_served
+        with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as work_dir:
+            command = [sys.executable, str(REPO_DIR / "bench_pipeline.py"), "--child", str(count), "--pdf-share", str(args.pdf_share), "--seed", str(args.seed)]
+            if args.workers:
+                command += ["--workers", str(args.workers)]
+            child = subprocess.run(command, cwd = work_dir, env = env, capture_output = True, text = True)
+        if child.returncode != 0:
+            sys.exit(f"{count} documents failed:\n{child.stderr[-2000:]}")
+        row = json.loads(child.stdout.strip().splitlines()[-1])
+        row["model_calls"] = FakeModelHandler.requests_served - calls_before
+        results.append(row)
+        print(
+            f"{count:10} {row['docs_per_sec']:10.2f} {row['p50_seconds']:8.3f} {row['p95_seconds']:8.3f}"
+            f" {row['peak_rss_mb'] or 'n/a':>12} {row['peak_rss_children_mb'] or 'n/a':>12} {row['model_calls']:12}"
+        )
+    server.shutdown()
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents = True, exist_ok = True)
+    out_path.write_text(json.dumps({"latency": args.latency, "pdf_share": args.pdf_share, "results": results}, indent = 2), encoding = "utf-8")
+    print(f"written to {out_path}")
+
+    if args.baseline:
+        found = regressions(results, json.loads(Path(args.baseline).read_text(encoding = "utf-8"))["results"])
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
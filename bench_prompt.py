@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import langextract as lx
+from langextract import prompt_validation as pv
+from langextract.core import format_handler as fh
+
+import treaty_prompt
+
+
+def per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-document and per-chunk prompt build cost, before and after the compiled artifact")
+    parser.add_argument("--chunks", type = int, default = 2000)
+    parser.add_argument("--documents", type = int, default = 20)
+    args = parser.parse_args()
+
+    handler = fh.FormatHandler(format_type=lx.data.FormatType.JSON, use_wrapper=True, wrapper_key=lx.data.EXTRACTIONS_KEY, use_fences=False)
+    chunk = "PREMIUM:\n1st Layer\nMinimum & Deposit: EUR 115,440" # typical chunk, its length does not matter here
+
+    # before: examples built in Python, validated by lx.extract for every document, re-rendered for every chunk
+    examples = treaty_prompt._build_examples()
+    template = lx.prompting.PromptTemplateStructured(description=treaty_prompt.PROMPT_DESCRIPTION)
+    template.examples.extend(examples)
+    before_generator = lx.prompting.QAPromptGenerator(template=template, format_handler=handler)
+    before_doc = per_call(lambda: pv.validate_prompt_alignment(examples=examples, aligner=lx.resolver.WordAligner(), policy=pv.AlignmentPolicy()), args.documents)
+    before_chunk = per_call(lambda: before_generator.render(chunk), args.chunks)
+
+    # after: artifact loaded once, validated at compile time, prefix rendered once
+    start = time.perf_counter()
+    artifact = treaty_prompt.load_artifact()
+    after_generator = treaty_prompt.PrefixCachedPromptGenerator(artifact, handler)
+    load_seconds = time.perf_counter() - start
+    after_chunk = per_call(lambda: after_generator.render(chunk), args.chunks)
+
+    assert after_generator.render(chunk) == before_generator.render(chunk), "prompts differ"
+    prompts = {after_generator.render(f"chunk {i}")[: len(artifact.prefix(handler))] for i in range(10)}
+    assert len(prompts) == 1, "prefix is not identical across chunks"
+
+    print(f"prompt prefix: {len(artifact.prefix(handler)):,} chars, identical for every chunk")
+    print(f"{'':28} {'before':>12} {'after':>12}")
+    print(f"{'per document (validation)':28} {before_doc * 1e3:10.3f}ms {0.0:10.3f}ms")
+    print(f"{'per chunk (prompt render)':28} {before_chunk * 1e6:10.1f}us {after_chunk * 1e6:10.1f}us")
+    print(f"one-off artifact load + prefix render: {load_seconds * 1e3:.1f}ms")
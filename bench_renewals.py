@@ -0,0 +1,67 @@
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from fake_model_server import FakeModelHandler, start_server
+from model_utils import shared_model
+import renewals
+import synthetic_slips
+import treaty_prompt
+
+# Model calls and time for a renewal quarter, full extraction vs renewals.extract_incremental, against the
+# local fake model: last year's slips are extracted and indexed, then this year's renewals (and some new
+# business) are extracted both ways. Also checks that both ways give the same extractions.
+
+
+def key(result) -> list[tuple]:
+    return [
+        (e.extraction_class, e.extraction_text, e.char_interval.start_pos if e.char_interval else None, e.char_interval.end_pos if e.char_interval else None)
+        for e in result.extractions
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full vs incremental extraction of synthetic renewal slips against a fake model")
+    parser.add_argument("--documents", type = int, default = 200)
+    parser.add_argument("--new-share", type = float, default = 0.2, help = "share of this year's slips that are new business")
+    parser.add_argument("--long-share", type = float, default = 0.05, help = "share of slips with pages of wording text")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "fake model seconds per call")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    server = start_server(latency = args.latency)
+    model = shared_model("gpt-oss:20b", fence_output = True, use_schema_constraints = False, model_url = f"http://127.0.0.1:{server.server_port}")
+    rng = random.Random(args.seed)
+    priors = [synthetic_slips.make_slip(rng, i, length_factor = 20 if rng.random() < args.long_share else 1) for i in range(args.documents)]
+    current = [
+        synthetic_slips.make_slip(rng, i) if rng.random() < args.new_share else synthetic_slips.renew(rng, prior)
+        for i, prior in enumerate(priors)
+    ]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        index = renewals.RenewalIndex(Path(work_dir) / "renewals.sqlite")
+        for i, text in enumerate(priors):
+            result = treaty_prompt.extract(text, model, show_progress = False, section_tokens = 512)
+            result.document_id = f"prior_{i}"
+            index.add(result)
+
+        timings, outputs = {}, {}
+        for mode in ("full", "incremental"):
+            calls_before = FakeModelHandler.requests_served
+            start = time.perf_counter()
+            if mode == "full":
+                outputs[mode] = [treaty_prompt.extract(text, model, show_progress = False, section_tokens = 512) for text in current]
+            else:
+                outputs[mode] = [renewals.extract_incremental(text, model, index, show_progress = False) for text in current]
+            timings[mode] = (time.perf_counter() - start, FakeModelHandler.requests_served - calls_before)
+        server.shutdown()
+
+    print(f"{args.documents} slips, {args.new_share:.0%} new business, fake model latency {args.latency}s")
+    print(f"{'':12} {'model calls':>12} {'seconds':>10}")
+    for mode, (seconds, calls) in timings.items():
+        print(f"{mode:12} {calls:12} {seconds:10.2f}")
+    print(f"index: {index.summary()}")
+    same = sum(1 for full, incremental in zip(outputs["full"], outputs["incremental"]) if key(full) == key(incremental))
+    print(f"identical extractions: {same}/{args.documents} slips")
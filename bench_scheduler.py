@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from fake_model_server import start_server
+from instrumentation import percentile
+
+# Turnaround of small slips in a batch mixed with long wordings: today's run_batch order (sources by name,
+# one extraction at a time) vs scheduler.LaneScheduler with one extraction worker (only the order changes)
+# and with several. Every mode runs in a fresh process inside its own temp directory (cold caches), against
+# the local fake model with a per-call latency, e.g.
+#   python bench_scheduler.py --small 60 --large 3 --latency 0.05
+
+REPO_DIR = Path(__file__).resolve().parent
+
+
+def generate(count_small: int, count_large: int, pages: int, seed: int) -> list[Path]:
+    """Slips and wordings (slips with `pages` repeats of wording text) in a random name order."""
+    import synthetic_slips
+
+    rng = random.Random(seed)
+    kinds = ["small"] * count_small + ["large"] * count_large
+    rng.shuffle(kinds)
+    Path("in").mkdir()
+    sources = []
+    for index, kind in enumerate(kinds):
+        path = Path("in") / f"doc_{index:04d}_{kind}.txt"
+        path.write_text(synthetic_slips.make_slip(rng, index + 1, length_factor = pages if kind == "large" else 1), encoding = "utf-8")
+        sources.append(path)
+    return sources
+
+
+def run_mode(mode: str, sources: list[Path], workers: int | None, extract_workers: int) -> dict:
+    """Child process: one batch through the pipeline, turnaround per document from the start of the batch."""
+    import treaty_pipeline
+    from checkpoint import Manifest, source_hash
+    from io_utils import JsonlWriter, convert_many
+
+    treaty_pipeline.EXTRACT_WORKERS = extract_workers
+    with JsonlWriter(treaty_pipeline.RESULTS_PATH, append = False) as writer:
+        run = treaty_pipeline.BatchRun(writer, Manifest(treaty_pipeline.MANIFEST_PATH), {source: source_hash(source) for source in sources}, bypass_cache = True)
+        if mode == "fifo":
+            for source, md_text, convert_seconds, error in convert_many(sources, max_workers = workers, cache_dir = treaty_pipeline.CACHE_DIR):
+                treaty_pipeline.process_converted(source, md_text, convert_seconds, error, run)
+            lanes = {}
+        else:
+            schedules = treaty_pipeline.run_scheduled(sources, workers, run)
+            lanes = schedules[1].report()
+
+    row = {"mode": mode, "lanes": lanes}
+    for kind in ("small", "large"):
+        turnaround = [finished - run.started for source, finished in run.finished.items() if source.stem.endswith(kind)]
+        row[kind] = {"documents": len(turnaround), "p50": round(percentile(turnaround, 50), 2), "p95": round(percentile(turnaround, 95), 2)}
+    row["seconds"] = round(max(run.finished.values()) - run.started, 2)
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FIFO vs size-aware scheduling of a batch mixing slips and long wordings")
+    parser.add_argument("--small", type = int, default = 60, help = "one-page slips")
+    parser.add_argument("--large", type = int, default = 3, help = "long wordings")
+    parser.add_argument("--pages", type = int, default = 300, help = "wording text repeats of a large document (~550 chars each)")
+    parser.add_argument("--latency", type = float, default = 0.05, help = "fake model seconds per call")
+    parser.add_argument("--workers", type = int, default = 2, help = "conversion processes")
+    parser.add_argument("--extract-workers", type = int, default = 4)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--child", default = None, help = argparse.SUPPRESS) # internal: run one mode in this process
+    args = parser.parse_args()
+
+    if args.child is not None:
+        mode, extract_workers = args.child.split(":")
+        sources = generate(args.small, args.large, args.pages, args.seed)
+        print(json.dumps(run_mode(mode, sources, args.workers, int(extract_workers))))
+        sys.exit(0)
+
+    server = start_server(latency = args.latency)
+    env = {**os.environ, "OLLAMA_BASE_URL": f"http://127.0.0.1:{server.server_port}", "PYTHONPATH": str(REPO_DIR)}
+    print(f"{'mode':26} {'small p50':>10} {'small p95':>10} {'large p50':>10} {'large p95':>10} {'batch s':>8}")
+    for mode, extract_workers in (("fifo", 1), ("schedule", 1), ("schedule", args.extract_workers)):
+        with tempfile.TemporaryDirectory(prefix = "bench_scheduler_") as work_dir:
+            command = [
+                sys.executable, str(REPO_DIR / "bench_scheduler.py"), "--child", f"{mode}:{extract_workers}",
+                "--small", str(args.small), "--large", str(args.large), "--pages", str(args.pages),
+                "--workers", str(args.workers), "--seed", str(args.seed),
+            ]
+            child = subprocess.run(command, cwd = work_dir, env = env, capture_output = True, text = True)
+        if child.returncode != 0:
+            sys.exit(f"{mode} failed:\n{child.stderr[-2000:]}")
+        row = json.loads(child.stdout.strip().splitlines()[-1])
+        name = f"{mode} ({extract_workers} extract worker{'s' if extract_workers > 1 else ''})"
+        print(f"{name:26} {row['small']['p50']:10.2f} {row['small']['p95']:10.2f} {row['large']['p50']:10.2f} {row['large']['p95']:10.2f} {row['seconds']:8.2f}")
+        if row["lanes"]:
+            print(f"{'':26} lanes: {row['lanes']}")
+    server.shutdown()
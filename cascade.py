@@ -0,0 +1,107 @@
+import functools
+import time
+from collections import Counter
+
+import langextract as lx
+
+from instrumentation import Tally
+import followup_passes
+import treaty_chunking
+import treaty_prompt
+
+# Small-to-large model cascade: every chunk goes to gpt-oss:20b first, its answer is checked and only the
+# chunks that fail go to gpt-oss:120b. The checks need no model: the answer must use the classes and
+# attributes of the prompt examples (schema), align to the chunk text (alignment) and contain the required
+# classes and layers of the sections in the chunk (expected classes, see followup_passes.REQUIRED).
+
+SMALL_MODEL_ID = "gpt-oss:20b-cloud" # the large model is the pipeline's own, treaty_pipeline.MODEL_ID
+MIN_EXACT_SHARE = 0.9 # at least this share of a chunk's extractions must match the text exactly, the rest may be fuzzy
+LARGE_COST_RATIO = 4.0 # assumed cost of a 120b call relative to a 20b call for the same chunk, set to your price list
+
+tally = Tally() # per process, updated from the extraction threads: chunks, escalated, reasons, seconds and chars per model
+
+
+@functools.cache
+def _schema() -> dict[str, set[str]]:
+    """Extraction class -> attribute names used by the prompt examples."""
+    schema: dict[str, set[str]] = {}
+    for example in treaty_prompt.load_artifact().examples:
+        for extraction in example.extractions:
+            schema.setdefault(extraction.extraction_class, set()).update((extraction.attributes or {}).keys())
+    return schema
+
+
+def check(result: lx.data.AnnotatedDocument, text: str) -> list[str]:
+    """Reasons to escalate a chunk's answer, empty if it passes: "empty", "schema", "alignment", "expected"."""
+    extractions = result.extractions or []
+    if not extractions:
+        return ["empty"] if text.strip() else [] # also what a parse error looks like, lx suppresses those
+    reasons = []
+    schema = _schema()
+    if any(e.extraction_class not in schema or not set(e.attributes or {}) <= schema[e.extraction_class] for e in extractions):
+        reasons.append("schema")
+    exact = sum(1 for e in extractions if e.char_interval is not None and e.alignment_status == lx.data.AlignmentStatus.MATCH_EXACT)
+    if exact < MIN_EXACT_SHARE * len(extractions):
+        reasons.append("alignment")
+    if followup_passes.missing(result, text, present_only=True):
+        reasons.append("expected")
+    return reasons
+
+
+def extract_texts(
+        texts: list[str],
+        small,
+        large,
+        show_progress: bool = True
+) -> list[lx.data.AnnotatedDocument]:
+    """Like treaty_prompt.extract_texts(): the small model first, failing texts again with the large one."""
+    start = time.perf_counter()
+    results = treaty_prompt.extract_texts(texts, small, show_progress=show_progress)
+    tally.add(small_seconds=time.perf_counter() - start, small_chars=sum(len(text) for text in texts), chunks=len(texts))
+
+    escalate = []
+    for i, (text, result) in enumerate(zip(texts, results)):
+        reasons = check(result, text)
+        for reason in reasons:
+            tally.add({f"reason_{reason}": 1})
+        if reasons:
+            escalate.append(i)
+    if escalate:
+        start = time.perf_counter()
+        retried = treaty_prompt.extract_texts([texts[i] for i in escalate], large, show_progress=show_progress)
+        tally.add(large_seconds=time.perf_counter() - start, large_chars=sum(len(texts[i]) for i in escalate), escalated=len(escalate))
+        for i, result in zip(escalate, retried):
+            results[i] = result # the large model's answer replaces the small one's, no merging of the two
+    return results
+
+
+def extract(text: str, small, large, section_tokens: int = 512, show_progress: bool = True) -> lx.data.AnnotatedDocument:
+    """treaty_prompt.extract() with section chunking, through the cascade."""
+    chunks = treaty_chunking.build_chunks(text, section_tokens)
+    results = extract_texts([chunk.text for chunk in chunks], small, large, show_progress)
+    return treaty_chunking.merge_chunk_results(text, chunks, results)
+
+
+def summary() -> dict:
+    """
+    Escalation rate, and the time and cost against sending every chunk to the large model. The large model's
+    time per chunk is measured on the escalated chunks, so the estimate needs at least one escalation.
+    """
+    counts = Counter(tally.snapshot())
+    chunks, escalated = counts["chunks"], counts["escalated"]
+    report = {
+        "chunks": chunks,
+        "escalated": escalated,
+        "escalation_rate": round(escalated / chunks, 3) if chunks else 0.0,
+        "reasons": {key.removeprefix("reason_"): value for key, value in counts.items() if key.startswith("reason_")},
+        "small_seconds": round(counts["small_seconds"], 2),
+        "large_seconds": round(counts["large_seconds"], 2),
+    }
+    if escalated:
+        all_large_seconds = counts["large_seconds"] / escalated * chunks
+        report["seconds_saved"] = round(all_large_seconds - counts["small_seconds"] - counts["large_seconds"], 2)
+    if counts["small_chars"]:
+        # cost in small-model units per character: the cascade pays for both passes of an escalated chunk
+        cascade_cost = counts["small_chars"] + LARGE_COST_RATIO * counts["large_chars"]
+        report["cost_saved_share"] = round(1 - cascade_cost / (LARGE_COST_RATIO * counts["small_chars"]), 3)
+    return report
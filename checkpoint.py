@@ -0,0 +1,100 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+import zstd_io
+
+
+def source_hash(source_path: str | Path) -> str:
+    """sha256 of the file bytes, so a renamed or moved slip is still recognised."""
+    digest = hashlib.sha256()
+    with open(source_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Checkpoint manifest of a batch run in SQLite: per source hash, whether conversion and
+    extraction are done, or the stage that failed and why. A rerun skips finished sources and
+    retries only the failed or missing ones.
+    """
+
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS sources (
+                source_hash TEXT PRIMARY KEY,
+                source_path TEXT NOT NULL,
+                document_id TEXT,
+                converted INTEGER NOT NULL DEFAULT 0,
+                extracted INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+    def reset(self):
+        self._db.execute("DELETE FROM sources")
+        self._db.commit()
+
+    def _upsert(self, key: str, source_path: str | Path, **fields):
+        self._db.execute(
+            "INSERT OR IGNORE INTO sources (source_hash, source_path, updated) VALUES (?, ?, ?)",
+            (key, str(source_path), time.time())
+        )
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(
+            f"UPDATE sources SET {assignments}, source_path = ?, updated = ? WHERE source_hash = ?",
+            (*fields.values(), str(source_path), time.time(), key)
+        )
+        self._db.commit() # one transaction per event, the manifest is never ahead of the outputs
+
+    def mark_converted(self, key: str, source_path: str | Path, document_id: str):
+        # document_id is recorded before the result is written, reconcile() relies on it
+        self._upsert(key, source_path, converted=1, document_id=document_id, error=None)
+
+    def mark_extracted(self, key: str, source_path: str | Path):
+        self._upsert(key, source_path, converted=1, extracted=1, error=None)
+
+    def mark_failed(self, key: str, source_path: str | Path, stage: str, error: Exception | str):
+        self._upsert(key, source_path, error=f"{stage}: {error}")
+
+    def is_extracted(self, key: str) -> bool:
+        row = self._db.execute("SELECT extracted FROM sources WHERE source_hash = ?", (key,)).fetchone()
+        return bool(row and row[0])
+
+    def extracted_sources(self) -> list[str]:
+        return [source_path for source_path, in self._db.execute("SELECT source_path FROM sources WHERE extracted = 1")]
+
+    def reconcile(self, jsonl_path: str | Path):
+        """
+        Mark sources whose document already made it into the JSONL as extracted. Covers a crash
+        between writing a result and recording it, so the rerun does not write it twice.
+        """
+        jsonl_path = Path(jsonl_path)
+        if not jsonl_path.is_file():
+            return
+        written = set()
+        for line in zstd_io.iter_lines(jsonl_path): # plain or .jsonl.zst
+            try:
+                written.add(json.loads(line).get("document_id"))
+            except json.JSONDecodeError:
+                continue # torn line from the crash, that document is redone
+        self._db.execute(
+            f"UPDATE sources SET extracted = 1, error = NULL WHERE document_id IN ({','.join('?' * len(written))})",
+            tuple(written)
+        )
+        self._db.commit()
+
+    def summary(self) -> dict:
+        extracted, converted, failed, total = self._db.execute(
+            "SELECT SUM(extracted), SUM(converted), SUM(error IS NOT NULL), COUNT(*) FROM sources"
+        ).fetchone()
+        return {"total": total, "converted": converted or 0, "extracted": extracted or 0, "failed": failed or 0}
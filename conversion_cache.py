@@ -0,0 +1,152 @@
+import hashlib
+import importlib.metadata
+import json
+import os
+import time
+from pathlib import Path
+
+# bump when the cached text format changes, so old entries are never reused
+CACHE_FORMAT = 1
+# read from the package metadata, importing markitdown itself takes over a second
+MARKITDOWN_VERSION = importlib.metadata.version("markitdown")
+
+
+class ConversionCache:
+    """
+    On-disk cache for PDF/TXT -> markdown conversions.
+
+    Entries are keyed by a hash of the source bytes plus the MarkItDown version, so a renamed
+    file still hits and a converter upgrade misses. The directory is kept under max_bytes by
+    evicting the least recently used entries (a hit refreshes the entry's mtime).
+    """
+
+    def __init__(
+            self,
+            cache_dir: str = ".cache/markdown",
+            max_bytes: int = 1024 ** 3 # 1 GiB default budget
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0 # markdown bytes returned from the cache instead of converted
+        self.convert_seconds = 0.0 # time spent converting on misses
+        self.seconds_saved = 0.0 # original conversion time of every entry served from the cache
+        self._total_bytes = None # lazily computed, then kept up to date on put/evict
+
+    def key_for(self, source_path: str | Path, variant: str = "") -> str:
+        """variant separates conversions of the same file that produce different text, e.g. "pages" for page-parallel PDFs."""
+        digest = hashlib.sha256()
+        digest.update(f"markitdown={MARKITDOWN_VERSION};format={CACHE_FORMAT}\n".encode("utf-8"))
+        if variant:
+            digest.update(f"variant={variant}\n".encode("utf-8"))
+        with open(source_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""): # hash in 1 MiB blocks, large PDFs never sit in memory
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.md"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json" # small sidecar holding the original conversion time
+
+    def get(self, key: str) -> str | None:
+        entry = self._entry_path(key)
+        try:
+            md_text = entry.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(entry) # mark as recently used for LRU eviction
+        self.hits += 1
+        self.bytes_served += len(md_text.encode("utf-8"))
+        try:
+            self.seconds_saved += json.loads(self._meta_path(key).read_text())["convert_seconds"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass # entry is still usable without its timing
+        return md_text
+
+    def meta(self, key: str) -> dict:
+        """The sidecar of an entry: convert_seconds plus whatever extra fields put() was given."""
+        try:
+            return json.loads(self._meta_path(key).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def put(self, key: str, md_text: str, convert_seconds: float = 0.0, **extra_meta):
+        entry = self._entry_path(key)
+        tmp_path = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(md_text, encoding="utf-8")
+        os.replace(tmp_path, entry) # atomic, readers never see a half written entry
+        self._meta_path(key).write_text(json.dumps({"convert_seconds": round(convert_seconds, 4), **extra_meta}))
+        self.convert_seconds += convert_seconds
+
+        if self._total_bytes is None:
+            self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*.md"))
+        else:
+            self._total_bytes += entry.stat().st_size
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def convert(self, converter, source_path: str | Path) -> str:
+        """
+        Return the markdown for source_path, converting with converter (a MarkItDown) only on a miss.
+        """
+        key = self.key_for(source_path)
+        md_text = self.get(key)
+        if md_text is None:
+            start = time.perf_counter()
+            md_text = converter.convert(str(source_path)).text_content
+            self.put(key, md_text, time.perf_counter() - start)
+        return md_text
+
+    def _evict(self):
+        entries = []
+        for p in self.cache_dir.glob("*.md"):
+            stat = p.stat()
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort() # oldest access first
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            p.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes_served": self.bytes_served,
+            "convert_seconds": round(self.convert_seconds, 3),
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
+
+    def log_stats(self) -> dict:
+        """
+        Append this run's counters to stats.jsonl in the cache directory, so nightly reruns can be compared.
+        """
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **self.stats()}
+        with open(self.cache_dir / "stats.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        return record
+
+
+_caches: dict[str, ConversionCache] = {}
+
+
+def get_cache(cache_dir: str) -> ConversionCache:
+    """Return the shared ConversionCache for cache_dir, creating it on first use."""
+    if cache_dir not in _caches:
+        _caches[cache_dir] = ConversionCache(cache_dir)
+    return _caches[cache_dir]
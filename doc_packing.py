@@ -0,0 +1,108 @@
+import bisect
+from collections import Counter
+
+import langextract as lx
+
+from instrumentation import Tally
+import treaty_chunking
+import treaty_prompt
+
+# Several short documents in one model call. An endorsement of a few hundred characters costs one call
+# carrying the whole ~2.5k token prompt prefix for ~100 tokens of text; packed up to PACK_TOKENS, the
+# prefix is paid once per pack. Documents are joined with DELIMITER lines and a note says they are
+# separate; every extraction is given back to the document its offsets fall in, relative to that
+# document's own text. Extractions that fall on a delimiter or could not be aligned are dropped.
+
+PACK_TOKENS = 1024 # text tokens per packed call
+SHORT_TOKENS = 256 # documents up to this size are packed, longer ones are extracted alone
+DELIMITER = "\n=== DOCUMENT {number} ===\n" # no colon, so neither a section header for chunking nor for the model
+CONTEXT = (
+    "The text below holds several separate short documents, each starting with a '=== DOCUMENT n ===' line. "
+    "Extract the fields of every document from its own text only."
+)
+
+tally = Tally() # per process, updated from the extraction threads: documents, packs, dropped (on a delimiter), unaligned
+
+
+def is_short(text: str, short_tokens: int = SHORT_TOKENS) -> bool:
+    return treaty_chunking.estimate_tokens(text) <= short_tokens
+
+
+def pack_documents(texts: list[str], max_tokens: int = PACK_TOKENS) -> list[list[int]]:
+    """Indexes of texts in groups of at most max_tokens (in order), a text over the budget alone in its group."""
+    groups, size = [], max_tokens
+    for i, text in enumerate(texts):
+        tokens = treaty_chunking.estimate_tokens(text) + treaty_chunking.estimate_tokens(DELIMITER)
+        if size + tokens > max_tokens:
+            groups.append([])
+            size = 0
+        groups[-1].append(i)
+        size += tokens
+    return groups
+
+
+def packed_text(texts: list[str], group: list[int]) -> tuple[str, list[int]]:
+    """The group's texts joined with delimiters, and the offset of every text in it."""
+    parts, starts, position = [], [], 0
+    for number, i in enumerate(group, start=1):
+        delimiter = DELIMITER.format(number=number)
+        parts += [delimiter, texts[i]]
+        position += len(delimiter)
+        starts.append(position)
+        position += len(texts[i])
+    return "".join(parts), starts
+
+
+def unpack(result: lx.data.AnnotatedDocument, texts: list[str], group: list[int], starts: list[int]) -> list[list[lx.data.Extraction]]:
+    """Split the extractions of a packed_text() per document, offsets relative to each document's text."""
+    per_document: list[list[lx.data.Extraction]] = [[] for _ in group]
+    for extraction in result.extractions or []:
+        interval = extraction.char_interval
+        if interval is None or interval.start_pos is None:
+            tally.add(unaligned=1) # nothing tells which document it came from
+            continue
+        piece = bisect.bisect_right(starts, interval.start_pos) - 1
+        start = starts[piece] if piece >= 0 else 0
+        length = len(texts[group[piece]]) if piece >= 0 else 0
+        if piece < 0 or interval.end_pos > start + length:
+            tally.add(dropped=1) # on a delimiter, or running into the next document
+            continue
+        extraction.char_interval = lx.data.CharInterval(start_pos=interval.start_pos - start, end_pos=interval.end_pos - start)
+        extraction.token_interval = None
+        per_document[piece].append(extraction)
+    return per_document
+
+
+def extract_packed(
+        texts: list[str],
+        model,
+        max_tokens: int = PACK_TOKENS,
+        batch_length: int = 10,
+        show_progress: bool = True
+) -> list[lx.data.AnnotatedDocument]:
+    """
+    One AnnotatedDocument per text, like treaty_prompt.extract() on each, with the texts packed into as few
+    model calls as max_tokens allows. Meant for short texts (is_short()); a longer one gets a call of its own.
+    """
+    groups = pack_documents(texts, max_tokens)
+    packed = [packed_text(texts, group) for group in groups]
+    results = treaty_prompt.extract_texts(
+        [text for text, _ in packed], model, batch_length, show_progress, contexts=[CONTEXT] * len(groups)
+    )
+    tally.add(documents=len(texts), packs=len(groups))
+
+    documents: list[lx.data.AnnotatedDocument | None] = [None] * len(texts)
+    for group, (_, starts), result in zip(groups, packed, results):
+        for i, extractions in zip(group, unpack(result, texts, group, starts)):
+            for number, extraction in enumerate(extractions, start=1):
+                extraction.extraction_index = number
+            documents[i] = lx.data.AnnotatedDocument(text=texts[i], extractions=extractions)
+    return documents
+
+
+def summary() -> dict:
+    counts = Counter(tally.snapshot())
+    return {
+        **counts,
+        "documents_per_call": round(counts["documents"] / counts["packs"], 2) if counts["packs"] else 0.0,
+    }
@@ -0,0 +1,134 @@
+import bisect
+import dataclasses
+import math
+import re
+from collections import Counter
+
+import langextract as lx
+
+from instrumentation import Tally
+import treaty_chunking
+
+# Per-chunk few-shot selection. The treaty example is a whole slip with ~50 extractions, sent with every
+# chunk; a chunk holding only the CONDITIONS list does not need the premium and limits examples. The
+# library splits every example into its sections, and BM25 over section headers (plus their text) picks
+# the sections relevant to a chunk until a token budget is spent.
+
+WORD = re.compile(r"[a-z]+")
+HEADER_WEIGHT = 3 # header words count this many times, "PREMIUM:" says more about a section than its body
+K1, B = 1.2, 0.75 # BM25 defaults
+
+tally = Tally() # per process, updated from the extraction threads: prompts, full_prefix_tokens (whole example), prefix_tokens (selected sections)
+
+
+@dataclasses.dataclass
+class ExampleSection:
+    example: int # index of the example it was cut from
+    start: int # offset in that example's text, keeps selected sections in slip order
+    header: str
+    text: str
+    extractions: list[lx.data.Extraction]
+
+
+def _words(text: str) -> list[str]:
+    return WORD.findall(text.lower())
+
+
+def _headers(text: str) -> list[str]:
+    return [" ".join(match.group(0).upper().split()) for match in treaty_chunking.HEADER.finditer(text)]
+
+
+class ExampleLibrary:
+    """The sections of the prompt examples, each with its own extractions, ranked against chunks with BM25."""
+
+    def __init__(self, examples: list[lx.data.ExampleData]):
+        self.sections: list[ExampleSection] = []
+        for number, example in enumerate(examples):
+            starts = treaty_chunking.section_starts(example.text)
+            # extractions are in order of appearance, each one is looked up after the previous one
+            by_section: list[list[lx.data.Extraction]] = [[] for _ in starts]
+            cursor = 0
+            for extraction in example.extractions:
+                position = example.text.find(extraction.extraction_text, cursor)
+                if position < 0:
+                    position = example.text.find(extraction.extraction_text)
+                if position < 0: # the example wraps a line inside the extraction text
+                    match = re.compile(r"\s+".join(map(re.escape, extraction.extraction_text.split()))).search(example.text)
+                    position = match.start() if match else -1
+                if position < 0:
+                    continue # not in the text, compile_artifact() already warned about it
+                cursor = position
+                by_section[bisect.bisect_right(starts, position) - 1].append(extraction)
+            for start, end, extractions in zip(starts, starts[1:] + [len(example.text)], by_section):
+                section_text = example.text[start:end]
+                headers = _headers(section_text)
+                self.sections.append(ExampleSection(number, start, headers[0] if headers else "", section_text, extractions))
+
+        self._terms = [
+            Counter(_words(section.header) * HEADER_WEIGHT + _words(section.text)) for section in self.sections
+        ]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 1.0
+        frequency = Counter(term for terms in self._terms for term in terms)
+        count = len(self.sections)
+        self._idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5)) for term, df in frequency.items()}
+
+    def scores(self, chunk_text: str) -> list[float]:
+        """BM25 of every section for the chunk, queried by the chunk's headers, or its words if it has none."""
+        headers = _headers(chunk_text)
+        query = Counter(_words(" ".join(headers)) if headers else _words(chunk_text))
+        scores = []
+        for terms, length in zip(self._terms, self._lengths):
+            score = 0.0
+            for term, weight in query.items():
+                tf = terms.get(term)
+                if tf:
+                    score += weight * self._idf[term] * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / self._average_length))
+            scores.append(score)
+        return scores
+
+    def select(self, chunk_text: str, budget: int, sizes: list[int]) -> tuple[int, ...]:
+        """
+        Indexes of the sections for a chunk: sections under a header of the chunk first, then the rest by BM25,
+        while their rendered sizes (tokens) fit the budget; returned in slip order. Sections without extractions
+        or any matching term are never picked; the best one is always picked, even over budget, so the model
+        sees at least one example of the output format.
+        """
+        scores = self.scores(chunk_text)
+        headers = set(_headers(chunk_text))
+        ranked = sorted(
+            (i for i, score in enumerate(scores) if score > 0 and self.sections[i].extractions),
+            key=lambda i: (self.sections[i].header not in headers, -scores[i]),
+        )
+        if not ranked: # no term in common, e.g. a page of wording text: fall back to the smallest section with extractions
+            ranked = [min((i for i, section in enumerate(self.sections) if section.extractions), key=lambda i: sizes[i])]
+        picked, spent = [], 0
+        for i in ranked:
+            if picked and spent + sizes[i] > budget:
+                continue
+            picked.append(i)
+            spent += sizes[i]
+        return tuple(sorted(picked, key=lambda i: (self.sections[i].example, self.sections[i].start)))
+
+    def examples_for(self, picked: tuple[int, ...]) -> list[lx.data.ExampleData]:
+        """The picked sections as examples, neighbouring sections of one example merged back into one."""
+        examples: list[lx.data.ExampleData] = []
+        previous = None
+        for i in picked:
+            section = self.sections[i]
+            if previous is not None and previous.example == section.example and previous.start + len(previous.text) == section.start:
+                last = examples[-1]
+                examples[-1] = lx.data.ExampleData(text=last.text + section.text, extractions=last.extractions + section.extractions)
+            else:
+                examples.append(lx.data.ExampleData(text=section.text, extractions=list(section.extractions)))
+            previous = section
+        return examples
+
+
+def summary() -> dict:
+    counts = tally.snapshot()
+    full = counts.get("full_prefix_tokens", 0)
+    return {
+        **counts,
+        "prefix_tokens_saved_share": round(1 - counts.get("prefix_tokens", 0) / full, 3) if full else 0.0,
+    }
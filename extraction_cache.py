@@ -0,0 +1,181 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from langextract.core import types as lx_types
+
+from instrumentation import TimedModel
+from model_utils import DelegatingModel, shared_model
+
+
+class ExtractionCache:
+    """
+    Persistent store of model responses in SQLite.
+
+    The key is a hash of the model_id, the generation kwargs and the full rendered prompt. The
+    prompt already contains the prompt description, the serialized examples and the chunk text,
+    so a change to any of them is a different key. Entries older than ttl_seconds are ignored
+    and removed, and the least recently used entries are dropped beyond max_entries.
+    """
+
+    def __init__(
+            self,
+            db_path: str = ".cache/extractions.sqlite",
+            ttl_seconds: float | None = 30 * 24 * 3600, # None keeps entries forever
+            max_entries: int | None = 200_000 # None means no size limit
+    ):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock() # one connection shared by all threads of this process
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL") # lets parallel runs read while one writes
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                output TEXT,
+                score REAL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    @staticmethod
+    def key_for(model_id: str, prompt: str, kwargs: dict | None = None) -> str:
+        payload = json.dumps(
+            {"model_id": model_id, "kwargs": kwargs or {}, "prompt": prompt},
+            sort_keys=True, default=str, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> lx_types.ScoredOutput | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT output, score, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[2] > self.ttl_seconds:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,)) # expired
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return lx_types.ScoredOutput(output=row[0], score=row[1])
+
+    def put(self, key: str, model_id: str, scored: lx_types.ScoredOutput):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_id, scored.output, scored.score, now, now)
+            )
+            if self.max_entries is not None:
+                # drop the least recently used rows beyond the limit
+                self._db.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,)
+                )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class CachedModel(DelegatingModel):
+    """
+    Wraps a language model so every prompt is answered from the ExtractionCache when possible.
+    Identical prompts in one batch, or in flight on another thread, reach the model only once.
+    With bypass=True the model is always called and the cache is refreshed with the new answer.
+    """
+
+    def __init__(self, inner, model_id: str, cache: ExtractionCache, bypass: bool = False):
+        super().__init__(inner, model_id)
+        self.cache = cache
+        self.bypass = bypass
+        self._inflight: dict[str, threading.Event] = {} # key -> set once another thread stored it
+        self._inflight_lock = threading.Lock()
+
+    def infer(self, batch_prompts, **kwargs):
+        keys = [self.cache.key_for(self.model_id, prompt, kwargs) for prompt in batch_prompts]
+        answers: dict[str, lx_types.ScoredOutput] = {}
+        to_call: dict[str, str] = {} # key -> prompt, this thread asks the model
+        to_wait: dict[str, threading.Event] = {} # key -> event, another thread is asking
+
+        for key, prompt in zip(keys, batch_prompts):
+            if key in answers or key in to_call or key in to_wait:
+                continue # duplicate inside this batch
+            if not self.bypass:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    answers[key] = cached
+                    continue
+            with self._inflight_lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    to_call[key] = prompt
+                else:
+                    to_wait[key] = event
+
+        try:
+            if to_call:
+                call_keys = list(to_call)
+                outputs = self.inner.infer([to_call[key] for key in call_keys], **kwargs)
+                for key, candidates in zip(call_keys, outputs):
+                    best = candidates[0] # langextract only reads the top candidate
+                    self.cache.put(key, self.model_id, best)
+                    answers[key] = best
+        finally:
+            with self._inflight_lock:
+                for key in to_call:
+                    self._inflight.pop(key).set()
+
+        for key, event in to_wait.items():
+            event.wait()
+            cached = self.cache.get(key)
+            if cached is None: # the other thread's call failed, ask the model ourselves
+                prompt = batch_prompts[keys.index(key)]
+                cached = next(iter(self.inner.infer([prompt], **kwargs)))[0]
+                self.cache.put(key, self.model_id, cached)
+            answers[key] = cached
+
+        for key in keys:
+            yield [answers[key]]
+
+
+def cached_model(
+        model_id: str,
+        examples=None,
+        bypass: bool = False,
+        db_path: str = ".cache/extractions.sqlite",
+        **model_kwargs
+) -> CachedModel:
+    """
+    The shared provider for model_id (see model_utils.shared_model) wrapped in a response cache.
+    Calling this per document is cheap, the provider and its connection pool are built once per process.
+    """
+    provider = TimedModel(shared_model(model_id, examples, **model_kwargs), model_id) # times the calls that reach the model
+    return CachedModel(provider, model_id, get_cache(db_path), bypass)
+
+
+_caches: dict[str, ExtractionCache] = {}
+
+
+def get_cache(db_path: str = ".cache/extractions.sqlite") -> ExtractionCache:
+    """Return the shared ExtractionCache for db_path, creating it on first use."""
+    if db_path not in _caches:
+        _caches[db_path] = ExtractionCache(db_path)
+    return _caches[db_path]
@@ -0,0 +1,252 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Indexed local store of extraction results, e.g. every slip of a cedent or the slip with a given UMR:
+#   python extraction_store.py --import extraction_results.jsonl
+#   python extraction_store.py --class umr_nr --text A661997MP00001
+#   python extraction_store.py --class company --attr role=cedent --search hydrobius
+
+
+class ExtractionStore:
+    """
+    Extraction results in SQLite, one row per extraction, with indexes on extraction class and text,
+    attribute name/value pairs and source document, and an FTS5 full text index on the extraction text.
+    Adding a document again replaces its previous extractions, so reruns keep the store current.
+    """
+
+    def __init__(self, db_path: str | Path = "out/extractions.sqlite"):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock() # one connection shared by all threads of this process
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL") # queries keep working while a batch run writes
+        self._db.execute("PRAGMA synchronous=NORMAL") # with WAL a crash can lose the last commits but never corrupts; the JSONL is the record
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                source TEXT, -- the slip the result was extracted from, NULL when only its results file is known
+                results_path TEXT, -- the JSONL holding the result line
+                text_length INTEGER,
+                added REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS extractions (
+                id INTEGER PRIMARY KEY,
+                document_id TEXT NOT NULL,
+                extraction_index INTEGER,
+                extraction_class TEXT NOT NULL,
+                extraction_text TEXT NOT NULL,
+                char_start INTEGER,
+                char_end INTEGER,
+                attributes TEXT
+            );
+            CREATE TABLE IF NOT EXISTS attributes (
+                extraction_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS extractions_class_text ON extractions (extraction_class, extraction_text COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS extractions_class_document ON extractions (extraction_class, document_id, extraction_index);
+            CREATE INDEX IF NOT EXISTS extractions_document ON extractions (document_id, extraction_index);
+            CREATE INDEX IF NOT EXISTS attributes_name_value ON attributes (name, value COLLATE NOCASE, extraction_id);
+            CREATE INDEX IF NOT EXISTS attributes_extraction ON attributes (extraction_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS extractions_fts USING fts5(extraction_text);
+            """
+        )
+        if "results_path" not in {row[1] for row in self._db.execute("PRAGMA table_info(documents)")}:
+            self._db.execute("ALTER TABLE documents ADD COLUMN results_path TEXT") # a store from before the column, its rows keep NULL
+        self._db.commit()
+
+    def add(self, result, source: str | Path | None = None, results_path: str | Path | None = None):
+        """Index one AnnotatedDocument, replacing whatever was stored for its document_id before."""
+        self.add_many([result], source, results_path)
+
+    def add_many(self, results, source: str | Path | None = None, results_path: str | Path | None = None):
+        """Index several documents in one transaction, far cheaper per document than add() when importing."""
+        with self._lock, self._db: # readers never see half of a document
+            for result in results:
+                self._insert(result, source, results_path)
+
+    def _insert(self, result, source: str | Path | None, results_path: str | Path | None):
+        document_id = result.document_id
+        self._delete(document_id)
+        self._db.execute(
+            "INSERT INTO documents (document_id, source, results_path, text_length, added) VALUES (?, ?, ?, ?, ?)",
+            (
+                document_id,
+                str(source) if source is not None else None,
+                str(results_path) if results_path is not None else None,
+                len(result.text or ""),
+                time.time(),
+            )
+        )
+        for extraction in result.extractions or []:
+            interval = extraction.char_interval
+            attributes = extraction.attributes or {}
+            extraction_id = self._db.execute(
+                "INSERT INTO extractions (document_id, extraction_index, extraction_class, extraction_text, char_start, char_end, attributes)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    document_id,
+                    extraction.extraction_index,
+                    extraction.extraction_class,
+                    extraction.extraction_text,
+                    interval.start_pos if interval is not None else None,
+                    interval.end_pos if interval is not None else None,
+                    json.dumps(attributes, ensure_ascii=False) if attributes else None,
+                )
+            ).lastrowid
+            self._db.execute("INSERT INTO extractions_fts (rowid, extraction_text) VALUES (?, ?)", (extraction_id, extraction.extraction_text))
+            self._db.executemany(
+                "INSERT INTO attributes VALUES (?, ?, ?)",
+                [(extraction_id, name, value) for name, values in attributes.items() for value in _values(values)]
+            )
+
+    def _delete(self, document_id: str):
+        ids = "SELECT id FROM extractions WHERE document_id = ?"
+        self._db.execute(f"DELETE FROM extractions_fts WHERE rowid IN ({ids})", (document_id,))
+        self._db.execute(f"DELETE FROM attributes WHERE extraction_id IN ({ids})", (document_id,))
+        self._db.execute("DELETE FROM extractions WHERE document_id = ?", (document_id,))
+        self._db.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+
+    def add_jsonl(self, jsonl_path: str | Path, batch_documents: int = 500) -> int:
+        """
+        Index every document of a results JSONL (e.g. a past run); returns the number of documents. The
+        JSONL does not record source paths, so source stays NULL and results_path is jsonl_path.
+        """
+        from io_utils import read_extraction_outputs # langextract, only needed for imports
+        batch = []
+        count = 0
+        for result in read_extraction_outputs(jsonl_path):
+            batch.append(result)
+            if len(batch) == batch_documents:
+                self.add_many(batch, results_path=jsonl_path)
+                count += len(batch)
+                batch = []
+        self.add_many(batch, results_path=jsonl_path)
+        count += len(batch)
+        with self._lock:
+            self._db.execute("PRAGMA optimize") # refresh the planner statistics after a bulk load
+        return count
+
+    def find(
+            self,
+            extraction_class: str | None = None,
+            text: str | None = None, # exact extraction text, case insensitive
+            attribute: tuple[str, str] | None = None, # (name, value), e.g. ("role", "cedent")
+            document_id: str | None = None,
+            search: str | None = None, # FTS5 query on the extraction text, e.g. "hydrobius" or "excess AND loss"
+            limit: int | None = 100
+    ) -> list[dict]:
+        """Extractions matching every given filter, in document order."""
+        joins, conditions, params = "", [], []
+        if attribute is not None:
+            # a join rather than IN (...), so SQLite can start from whichever index is more selective
+            joins = " JOIN attributes a ON a.extraction_id = e.id AND a.name = ? AND a.value = ? COLLATE NOCASE"
+            params.extend(attribute)
+        if extraction_class is not None:
+            conditions.append("e.extraction_class = ?")
+            params.append(extraction_class)
+        if text is not None:
+            conditions.append("e.extraction_text = ? COLLATE NOCASE")
+            params.append(text)
+        if document_id is not None:
+            conditions.append("e.document_id = ?")
+            params.append(document_id)
+        if search is not None:
+            conditions.append("e.id IN (SELECT rowid FROM extractions_fts WHERE extractions_fts MATCH ?)")
+            params.append(search)
+        sql = (
+            "SELECT e.document_id, e.extraction_index, e.extraction_class, e.extraction_text, e.char_start, e.char_end, e.attributes"
+            " FROM extractions e" + joins
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            + " ORDER BY e.document_id, e.extraction_index"
+            + (" LIMIT ?" if limit is not None else "")
+        )
+        if limit is not None:
+            params.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [
+            {
+                "document_id": document_id,
+                "extraction_index": index,
+                "extraction_class": extraction_class,
+                "extraction_text": text,
+                "char_start": start,
+                "char_end": end,
+                "attributes": json.loads(attributes) if attributes else {},
+            }
+            for document_id, index, extraction_class, text, start, end, attributes in rows
+        ]
+
+    def documents_for(self, **filters) -> list[str]:
+        """Ids of the documents with at least one extraction matching find(**filters), e.g. documents_for(extraction_class="umr_nr", text=umr)."""
+        return sorted({row["document_id"] for row in self.find(**filters, limit=None)})
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents, = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()
+            extractions, = self._db.execute("SELECT COUNT(*) FROM extractions").fetchone()
+        return {"documents": documents, "extractions": extractions}
+
+
+def _values(value) -> list[str]:
+    """Attribute values as indexed strings; a list attribute is indexed under each of its items."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+_stores: dict[str, ExtractionStore] = {}
+
+
+def get_store(db_path: str = "out/extractions.sqlite") -> ExtractionStore:
+    """Return the shared ExtractionStore for db_path, creating it on first use."""
+    if db_path not in _stores:
+        _stores[db_path] = ExtractionStore(db_path)
+    return _stores[db_path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index extraction results in SQLite and query them")
+    parser.add_argument("--db", default = "out/extractions.sqlite")
+    parser.add_argument("--import", dest = "import_paths", nargs = "+", default = None, metavar = "JSONL", help = "index these results files first")
+    parser.add_argument("--class", dest = "extraction_class", default = None, help = "extraction class, e.g. umr_nr, company, limits")
+    parser.add_argument("--text", default = None, help = "exact extraction text (case insensitive)")
+    parser.add_argument("--attr", default = None, metavar = "NAME=VALUE", help = "attribute filter, e.g. role=cedent or layer=1st")
+    parser.add_argument("--document", default = None, help = "only this document id")
+    parser.add_argument("--search", default = None, help = "full text query on the extraction text")
+    parser.add_argument("--documents-only", action = "store_true", help = "print the matching document ids only")
+    parser.add_argument("--limit", type = int, default = 100)
+    args = parser.parse_args()
+    if args.attr is not None and "=" not in args.attr:
+        parser.error("--attr expects NAME=VALUE")
+
+    store = ExtractionStore(args.db)
+    for path in args.import_paths or []:
+        start = time.perf_counter()
+        print(f"{path}: {store.add_jsonl(path)} documents indexed in {time.perf_counter() - start:.1f}s")
+
+    filters = {
+        "extraction_class": args.extraction_class,
+        "text": args.text,
+        "attribute": tuple(args.attr.split("=", 1)) if args.attr else None,
+        "document_id": args.document,
+        "search": args.search,
+    }
+    if any(value is not None for value in filters.values()):
+        start = time.perf_counter()
+        if args.documents_only:
+            for document_id in store.documents_for(**filters):
+                print(document_id)
+        else:
+            for row in store.find(**filters, limit = args.limit):
+                print(f"{row['document_id']}  {row['extraction_class']}: {row['extraction_text']}  {row['attributes'] or ''}")
+        print(f"({(time.perf_counter() - start) * 1e3:.1f}ms)")
+    print(f"store: {store.stats()}")
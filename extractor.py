@@ -1,59 +1,101 @@
-import textwrap
-import langextract as lx
-
-
-# 1. Define the prompt and extraction rules
-def build_prompt() -> str:
-    """
-    Base Prompt
-    """
-    return textwrap.dedent(
-        """\
-        Extract characters, emotions, and relationships in order of appearance.
-        Use exact text for extractions. Do not paraphrase or overlap entities.
-        Provide meaningful attributes for each entity to add context.
-        """
-    )
-
-# 2. Provide a high-quality example to guide the model
-def build_examples() -> list[lx.data.ExampleData]:
-    """
-    list of ExampleData
-    """
-    return [
-        lx.data.ExampleData(
-            text="ROMEO. But soft! What light through yonder window breaks? It is the east, and Juliet is the sun.",
-            extractions=[
-                lx.data.Extraction(
-                    extraction_class="character",
-                    extraction_text="ROMEO",
-                    attributes={"emotional_state": "wonder"}
-                ),
-                lx.data.Extraction(
-                    extraction_class="emotion",
-                    extraction_text="But soft!",
-                    attributes={"feeling": "gentle awe"}
-                ),
-                lx.data.Extraction(
-                    extraction_class="relationship",
-                    extraction_text="Juliet is the sun",
-                    attributes={"type": "metaphor"}
-                ),
-            ]
-        )
-    ]
-
-# Run the extraction
-def run_extractions(input_text: str):
-    prompt = build_prompt()
-    examples = build_examples()
-
-    result = lx.extract(
-        text_or_documents=input_text,
-        prompt_description=prompt,
-        examples=examples,
-        model_id="gpt-oss:20b-cloud",
-        fence_output=True,
-        use_schema_constraints=False
-    )
-    return result
\ No newline at end of file
+import textwrap
+import langextract as lx
+
+from async_engine import ThrottledModel, extract_documents
+from extraction_cache import CachedModel, cached_model, get_cache
+from instrumentation import TimedModel, metrics
+from model_utils import shared_model
+
+
+# 1. Define the prompt and extraction rules
+def build_prompt() -> str:
+    """
+    Base Prompt
+    """
+    return textwrap.dedent(
+        """\
+        Extract characters, emotions, and relationships in order of appearance.
+        Use exact text for extractions. Do not paraphrase or overlap entities.
+        Provide meaningful attributes for each entity to add context.
+        """
+    )
+
+# 2. Provide a high-quality example to guide the model
+def build_examples() -> list[lx.data.ExampleData]:
+    """
+    list of ExampleData
+    """
+    return [
+        lx.data.ExampleData(
+            text="ROMEO. But soft! What light through yonder window breaks? It is the east, and Juliet is the sun.",
+            extractions=[
+                lx.data.Extraction(
+                    extraction_class="character",
+                    extraction_text="ROMEO",
+                    attributes={"emotional_state": "wonder"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="emotion",
+                    extraction_text="But soft!",
+                    attributes={"feeling": "gentle awe"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="relationship",
+                    extraction_text="Juliet is the sun",
+                    attributes={"type": "metaphor"}
+                ),
+            ]
+        )
+    ]
+
+# Run the extraction
+def run_extractions(input_text: str, bypass_cache: bool = False):
+    prompt = build_prompt()
+    examples = build_examples()
+
+    # model responses are cached per (chunk, prompt, examples, model_id), bypass_cache=True forces fresh calls
+    model = cached_model("gpt-oss:20b-cloud", examples, bypass=bypass_cache, fence_output=True, use_schema_constraints=False)
+
+    with metrics.stage("extract", bytes_in=len(input_text)):
+        result = lx.extract(
+            text_or_documents=input_text,
+            prompt_description=prompt,
+            examples=examples,
+            model=model,
+            use_schema_constraints=False
+        )
+    return result
+
+
+# Run many extractions concurrently
+async def run_extractions_async(
+        input_texts: list[str],
+        max_in_flight: int = 16, # model requests running at the same time
+        requests_per_second: float | None = None, # token bucket limit, None for unlimited
+        max_documents: int = 4, # documents extracted at the same time
+        model_url: str | None = None, # e.g. a local fake model server for tests
+        bypass_cache: bool = False,
+        backoff_seconds: float = 1.0 # first retry delay of a 429/5xx answer, doubled on every further retry
+) -> list:
+    """
+    Async counterpart of run_extractions for a list of texts, e.g.
+    results = asyncio.run(run_extractions_async(texts, max_in_flight=32, requests_per_second=20))
+    Chunks of all documents share one in-flight limit and rate limiter, 429/5xx answers are retried.
+    """
+    model_id = "gpt-oss:20b-cloud"
+    examples = build_examples()
+    provider_kwargs = {"model_url": model_url} if model_url else {}
+    provider = TimedModel(shared_model(model_id, examples, fence_output=True, use_schema_constraints=False, pool_size=max_in_flight, **provider_kwargs), model_id)
+    throttled = ThrottledModel(provider, model_id, max_in_flight=max_in_flight, requests_per_second=requests_per_second, backoff_seconds=backoff_seconds)
+    model = CachedModel(throttled, model_id, get_cache(), bypass=bypass_cache) # cache in front, hits never wait for a slot
+
+    with throttled: # its max_in_flight pool threads end with this call, not with the process
+        return await extract_documents(
+            input_texts,
+            model,
+            max_documents=max_documents,
+            batch_length=max_in_flight,
+            prompt_description=build_prompt(),
+            examples=examples,
+            use_schema_constraints=False
+        )
\ No newline at end of file
@@ -0,0 +1,98 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# uppercase "KEY:" lines as they appear in treaty slips, e.g. "UMR:" or "LIMITS & RETENTIONS:"
+SECTION_HEADER = re.compile(r"^([A-Z][A-Z &/()'-]{1,60}):", re.MULTILINE)
+
+
+def fake_answer(prompt: str) -> str:
+    """
+    Deterministic stand-in for a model answer: every section header of the question becomes a
+    "section" extraction. Fenced like the examples in the prompt, so the resolver accepts it.
+    """
+    question = prompt.rsplit("Q: ", 1)[-1] # the chunk is the last question in the prompt
+    extractions = [
+        {"section": header, "section_attributes": {}}
+        for header in SECTION_HEADER.findall(question)
+    ]
+    answer = json.dumps({"extractions": extractions}, ensure_ascii=False)
+    return f"```json\n{answer}\n```" if "```" in prompt else answer
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    """Answers Ollama style /api/generate and /api/chat requests."""
+
+    protocol_version = "HTTP/1.1" # keep-alive like Ollama, so pooled clients can reuse their connections
+    disable_nagle_algorithm = True # TCP_NODELAY like Ollama's Go server, else headers and body on a kept-alive connection wait ~40ms for a delayed ACK
+    latency = 0.0 # seconds per request
+    fail_rate = 0.0 # share of requests answered with 429 or 503
+    requests_served = 0
+    connections_opened = 0
+    _counter_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeModelHandler._counter_lock:
+            FakeModelHandler.connections_opened += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with FakeModelHandler._counter_lock:
+            FakeModelHandler.requests_served += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            self._send(random.choice([429, 503]), {"error": "try again"})
+            return
+
+        if self.path.endswith("/api/chat"):
+            prompt = body["messages"][-1]["content"]
+            self._send(200, {"model": body.get("model"), "message": {"role": "assistant", "content": fake_answer(prompt)}, "done": True})
+        elif self.path.endswith("/api/generate"):
+            self._send(200, {"model": body.get("model"), "response": fake_answer(body.get("prompt", "")), "done": True})
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # keep benchmark output readable
+
+
+def start_server(port: int = 0, latency: float = 0.0, fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Start the fake server in a background thread and return it; the URL is
+    f"http://127.0.0.1:{server.server_port}". Stop it with server.shutdown().
+    """
+    FakeModelHandler.latency = latency
+    FakeModelHandler.fail_rate = fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeModelHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Ollama compatible fake model for tests and benchmarks")
+    parser.add_argument("--port", type = int, default = 11435)
+    parser.add_argument("--latency", type = float, default = 0.0, help = "seconds per request")
+    parser.add_argument("--fail-rate", type = float, default = 0.0, help = "share of 429/503 answers")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, args.fail_rate)
+    print(f"fake model listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
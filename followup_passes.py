@@ -0,0 +1,154 @@
+import re
+from collections import Counter
+
+import langextract as lx
+
+from instrumentation import Tally
+import treaty_chunking
+import treaty_prompt
+
+# Adaptive multi-pass extraction. lx.extract(extraction_passes=N) re-sends the whole document N times;
+# here the first pass is checked for the classes every slip must have (and for every layer the slip
+# defines), and only the sections those would be written under are sent again, with a note on what
+# is missing. A complete first pass costs no extra call at all.
+
+# required class -> section headers it is written under
+REQUIRED = {
+    "umr_nr": ("UMR",),
+    "reinsurance_type": ("TYPE",),
+    "company": ("REINSURED", "REASSURED", "CEDENT"),
+    "period": ("PERIOD",),
+    "limits": ("LIMITS & RETENTIONS", "LIMITS", "LIMIT"),
+    "retentions": ("LIMITS & RETENTIONS", "RETENTIONS", "RETENTION", "LIMITS"),
+    "premium": ("PREMIUM", "MINIMUM & DEPOSIT PREMIUM", "DEPOSIT PREMIUM"),
+}
+LAYERED = ("limits", "retentions", "premium") # each of these is expected once per layer, see the "layer" attribute
+LAYER = re.compile(r"^[ \t#*]*(\d+)(?:st|nd|rd|th)\s+Layer\b", re.MULTILINE | re.IGNORECASE)
+ORDINAL = re.compile(r"(\d+)")
+
+tally = Tally() # per process, updated from the extraction threads: documents, complete, followup_calls, full_pass_calls, recovered
+
+
+def _header(text: str, start: int, end: int) -> str:
+    """The uppercase header a section starts with, a wrapped two line header joined, e.g. "LIMITS & RETENTIONS"."""
+    colon = text.find(":", start, end)
+    if colon < 0:
+        return ""
+    return " ".join(text[start:colon].replace("#", " ").replace("*", " ").split()).upper()
+
+
+def sections(text: str) -> list[tuple[str, int, int]]:
+    """(header, start, end) of every section of a slip."""
+    starts = treaty_chunking.section_starts(text) + [len(text)]
+    return [(_header(text, start, end), start, end) for start, end in zip(starts, starts[1:]) if end > start]
+
+
+def _layer(value) -> str | None:
+    match = ORDINAL.search(str(value)) if value is not None else None
+    return match.group(1) if match else None
+
+
+def missing(result: lx.data.AnnotatedDocument, text: str, present_only: bool = False) -> list[tuple[str, str | None]]:
+    """
+    Required (class, layer) pairs the result lacks, layer None for classes without layers, e.g.
+    [("umr_nr", None), ("limits", "2")]. Layers are the "1st Layer", "2nd Layer", ... lines of the slip.
+    present_only=True only expects classes whose section header is in text, for checking a single chunk.
+    """
+    found = {(e.extraction_class, _layer((e.attributes or {}).get("layer"))) for e in result.extractions or []}
+    found_classes = {extraction_class for extraction_class, _ in found}
+    layers = sorted(set(LAYER.findall(text)), key=int)
+    headers = {header for header, _, _ in sections(text)}
+    gaps = []
+    for extraction_class, class_headers in REQUIRED.items():
+        if present_only and headers.isdisjoint(class_headers):
+            continue
+        if extraction_class not in found_classes:
+            gaps.append((extraction_class, None))
+        elif extraction_class in LAYERED:
+            gaps += [(extraction_class, layer) for layer in layers if (extraction_class, layer) not in found]
+    return gaps
+
+
+def _hint(gaps: list[tuple[str, str | None]]) -> str:
+    wanted = [extraction_class if layer is None else f"{extraction_class} of the layer {layer}" for extraction_class, layer in gaps]
+    return f"An earlier pass over this text missed these, extract them if they are present: {', '.join(wanted)}."
+
+
+def _overlaps(extraction: lx.data.Extraction, others: list[lx.data.Extraction]) -> bool:
+    interval = extraction.char_interval
+    if interval is None or interval.start_pos is None:
+        return any(other.extraction_class == extraction.extraction_class and other.extraction_text == extraction.extraction_text for other in others)
+    return any(
+        other.char_interval is not None and other.char_interval.start_pos is not None
+        and other.char_interval.start_pos < interval.end_pos and interval.start_pos < other.char_interval.end_pos
+        for other in others
+    )
+
+
+def follow_up(
+        result: lx.data.AnnotatedDocument,
+        model,
+        section_tokens: int = 512,
+        max_passes: int = 1,
+        show_progress: bool = True
+) -> lx.data.AnnotatedDocument:
+    """
+    Re-query only the sections of the slip where the missing required classes and layers belong, up to
+    max_passes times. New extractions are kept where they do not overlap an earlier one, like the
+    multi-pass merge of langextract: the first pass wins.
+    """
+    text = result.text or ""
+    tally.add(documents=1, full_pass_calls=max_passes * len(treaty_chunking.build_chunks(text, section_tokens))) # full_pass_calls: what extraction_passes would add
+    extractions = list(result.extractions or [])
+    slip_sections = sections(text)
+    gaps = missing(result, text)
+    if not gaps:
+        tally.add(complete=1)
+
+    for _ in range(max_passes):
+        if not gaps:
+            break
+        # a section is re-sent once, with the gaps of all classes that belong under its header
+        wanted: dict[tuple[int, int], list] = {}
+        for gap in gaps:
+            for header, start, end in slip_sections:
+                if header in REQUIRED[gap[0]]:
+                    wanted.setdefault((start, end), []).append(gap)
+        if not wanted: # the headers are not in this slip, nothing targeted left to try
+            break
+        groups = treaty_chunking.pack_spans(text, sorted(wanted), section_tokens)
+        contexts = []
+        for group in groups:
+            group_gaps = []
+            for (start, end), span_gaps in wanted.items():
+                if any(start <= piece_start < end for piece_start, _ in group):
+                    group_gaps += [gap for gap in span_gaps if gap not in group_gaps]
+            contexts.append(_hint(group_gaps))
+        results = treaty_prompt.extract_texts(
+            [treaty_chunking.packed_text(text, group) for group in groups], model, show_progress=show_progress, contexts=contexts
+        )
+        tally.add(followup_calls=len(groups))
+        for group, packed_result in zip(groups, results):
+            for extraction in treaty_chunking.unpack_extractions(packed_result, group):
+                if not _overlaps(extraction, extractions):
+                    extractions.append(extraction)
+
+        merged = lx.data.AnnotatedDocument(text=text, extractions=extractions, document_id=result.document_id)
+        still_missing = missing(merged, text)
+        tally.add(recovered=len(gaps) - len(still_missing))
+        if still_missing == gaps:
+            break # the same sections with the same note would get the same answer
+        gaps = still_missing
+
+    extractions.sort(key=lambda e: e.char_interval.start_pos if e.char_interval and e.char_interval.start_pos is not None else len(text))
+    for number, extraction in enumerate(extractions, start=1):
+        extraction.extraction_index = number
+    return lx.data.AnnotatedDocument(text=text, extractions=extractions, document_id=result.document_id)
+
+
+def summary() -> dict:
+    counts = Counter(tally.snapshot())
+    return {
+        **counts,
+        "calls_saved_share": round(1 - counts["followup_calls"] / counts["full_pass_calls"], 3) if counts["full_pass_calls"] else 0.0,
+    }
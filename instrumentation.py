@@ -0,0 +1,189 @@
+import contextlib
+import cProfile
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import langextract as lx
+
+from model_utils import DelegatingModel
+
+# opt-in profiling of one stage, e.g. PIPELINE_PROFILE_STAGE=convert python main2.py --source in/
+# writes one cProfile file per stage call to PIPELINE_PROFILE_DIR (view with snakeviz or pstats).
+# For py-spy, attach to the running pid: py-spy record --pid <pid> -o profile.svg
+PROFILE_STAGE = os.environ.get("PIPELINE_PROFILE_STAGE")
+PROFILE_DIR = Path(os.environ.get("PIPELINE_PROFILE_DIR", "out/profiles"))
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Tally(Counter):
+    """
+    Counter of a module's per-process report, safe to update from the extraction threads: `x[key] += n`
+    on a plain Counter is a read-modify-write that loses counts when two threads interleave. Update with
+    add(), read with snapshot().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def add(self, counts: dict | None = None, **named):
+        """Add counts, e.g. tally.add(chunks=3) or tally.add({f"reason_{reason}": 1})."""
+        with self._lock:
+            self.update(counts or {}, **named)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self)
+
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.chunks = 0
+        self.latencies: list[float] = [] # wall time of every call, for percentiles
+
+
+class Span:
+    """Handle of a running stage, the caller fills in what it knows about the work."""
+
+    def __init__(self, bytes_in: int = 0):
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.chunks = 0
+
+
+class Metrics:
+    """
+    Per-run timing of the pipeline stages: wall and CPU time, bytes in and out, chunk counts
+    and latency percentiles, exported as JSON or Prometheus text.
+    """
+
+    def __init__(self):
+        self._stages: dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def add(self, name: str, wall: float, cpu: float = 0.0, bytes_in: int = 0, bytes_out: int = 0, chunks: int = 0):
+        """Record one finished call of a stage, e.g. timings reported back by a worker process."""
+        with self._lock:
+            stats = self._stages.setdefault(name, StageStats())
+            stats.calls += 1
+            stats.wall_seconds += wall
+            stats.cpu_seconds += cpu
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.chunks += chunks
+            stats.latencies.append(wall)
+
+    @contextlib.contextmanager
+    def stage(self, name: str, bytes_in: int = 0):
+        """
+        Time the block as one call of stage `name`, e.g.
+        with metrics.stage("convert", bytes_in=size) as span:
+            ...
+            span.bytes_out = len(md_text)
+        """
+        span = Span(bytes_in)
+        profiler = cProfile.Profile() if name == PROFILE_STAGE else None
+        wall_start, cpu_start = time.perf_counter(), time.thread_time() # CPU of this thread only, other stages may run in parallel
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield span
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(PROFILE_DIR / f"{name}-{os.getpid()}-{time.time_ns()}.prof")
+            self.add(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start, span.bytes_in, span.bytes_out, span.chunks)
+
+    def report(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {
+                    "calls": stats.calls,
+                    "wall_seconds": round(stats.wall_seconds, 4),
+                    "cpu_seconds": round(stats.cpu_seconds, 4),
+                    "bytes_in": stats.bytes_in,
+                    "bytes_out": stats.bytes_out,
+                    "chunks": stats.chunks,
+                    "p50_seconds": round(percentile(stats.latencies, 50), 4),
+                    "p95_seconds": round(percentile(stats.latencies, 95), 4),
+                    "p99_seconds": round(percentile(stats.latencies, 99), 4),
+                }
+                for name, stats in self._stages.items()
+            }
+        return {"run_started": self.started, "run_seconds": round(time.time() - self.started, 3), "stages": stages}
+
+    def to_prometheus(self) -> str:
+        report = self.report()
+        lines = []
+        for field in ("calls", "wall_seconds", "cpu_seconds", "bytes_in", "bytes_out", "chunks"):
+            metric = f"pipeline_stage_{field}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for name, stats in report["stages"].items():
+                lines.append(f'{metric}{{stage="{name}"}} {stats[field]}')
+        lines.append("# TYPE pipeline_stage_latency_seconds summary")
+        for name, stats in report["stages"].items():
+            for quantile in ("50", "95", "99"):
+                lines.append(f'pipeline_stage_latency_seconds{{stage="{name}",quantile="0.{quantile}"}} {stats[f"p{quantile}_seconds"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path_stem: str | Path = "out/run_metrics") -> tuple[Path, Path]:
+        """Write <path_stem>.json and <path_stem>.prom (Prometheus text format, e.g. for the node exporter textfile collector)."""
+        path_stem = Path(path_stem)
+        path_stem.parent.mkdir(parents=True, exist_ok=True)
+        json_path = path_stem.with_suffix(".json")
+        prom_path = path_stem.with_suffix(".prom")
+        json_path.write_text(json.dumps(self.report(), indent=2), encoding="utf-8")
+        prom_path.write_text(self.to_prometheus(), encoding="utf-8")
+        return json_path, prom_path
+
+
+metrics = Metrics() # process wide, every stage records here
+
+
+class TimedModel(DelegatingModel):
+    """
+    Records every model call (one per chunk prompt) as stage "model_call" with its latency.
+    Prompts are passed on one at a time; the Ollama provider used here answers them one by one anyway.
+    """
+
+    def infer(self, batch_prompts, **kwargs):
+        for prompt in batch_prompts:
+            with metrics.stage("model_call", bytes_in=len(prompt.encode("utf-8"))) as span:
+                outputs = next(iter(self.inner.infer([prompt], **kwargs)))
+                span.chunks = 1
+                span.bytes_out = len((outputs[0].output or "").encode("utf-8"))
+            yield outputs
+
+
+class TimedResolver(lx.resolver.Resolver):
+    """Resolver that records parsing the model output ("parse") and grounding it in the text ("align")."""
+
+    def resolve(self, input_text, **kwargs):
+        with metrics.stage("parse", bytes_in=len(input_text)):
+            return super().resolve(input_text, **kwargs)
+
+    def align(self, extractions, source_text, *args, **kwargs):
+        with metrics.stage("align", bytes_in=len(source_text)) as span:
+            aligned = list(super().align(extractions, source_text, *args, **kwargs))
+            span.chunks = 1
+        yield from aligned
@@ -1,74 +1,509 @@
-from markitdown import MarkItDown
-from pathlib import Path
-import langextract as lx
-
-md = MarkItDown()
-
-def load_text_from_source(
-        source_name: str, # provide the source file name, no default
-        in_dir: str = "in", # optional, no default
-        md_out_dir: str | None = "out" # optional, default to None, e.g. load_text_from_source("source_name", md_out_dir=None)
-):
-    """
-    Load text from source files, supporting .pdf or .txt formats. Convert to markdown. Save in output directory.
-    """
-
-    source_path = Path(in_dir) / source_name # Converts the string in_dir (e.g. "in") into a Path object, / is the join operator
-
-    # check if file exists
-    if not source_path.is_file(): # defensive validation check, is_file method of pathlib checks if the path points to a file
-        raise FileNotFoundError(f"Source file not found: {source_path}") # raising exception if file not found, f-string
-    
-    # get suffix 
-    suffix = source_path.suffix.lower() # get the file extension, e.g. .pdf or .txt, convert to lowercase for consistency
-
-    # check suffix and convert
-    if suffix == ".pdf" or suffix == ".txt":
-        result = md.convert(str(source_path)) # conversion to markdown, str() converts Path object to string
-        md_text = result.text_content # get text content from the conversion result
-
-        # save markdown text if output directory
-        if md_out_dir is not None:
-            out_dir = Path(md_out_dir) # convert md_out_dir string to Path object
-            out_dir.mkdir(parents=True, exist_ok=True) # create output directory if it doesn't exist, parents=True creates any necessary parent directories, exist_ok=True avoids error if directory exists
-            out_path = out_dir / f"{source_path.stem}.md" # create output file path with .md extension"
-            out_path.write_text(md_text, encoding = "utf-8") # write markdown text to file with utf-8 encoding
-       
-        return md_text
-    
-    # return source_path.read_text(encoding = "utf-8") # if not pdf or txt, read as plain text file
-
-
-def save_extraction_outputs(
-        result, # required parameter
-        out_name: str | None = None, # optional parameter, string or None, default = None
-        out_dir: str = "out"
-) -> tuple[Path, Path]: # returns a tuple (immutable) of Path objects
-    """
-    Save extraction results in out directory to JSONL and generate HTML visualization.
-    """
-
-    out_dir_path = Path(out_dir)
-    out_dir_path.mkdir(parents=True, exist_ok=True) # create output directory if it doesn't exist
-    
-    out_name = Path(out_name).stem if out_name is not None else "extraction_results" # get stem of out_name or default name
-
-    jsonl_path = out_dir_path / f"{out_name}.jsonl"
-    html_path = out_dir_path / f"{out_name}.html"
-
-    # Save the results to a JSONL file
-    lx.io.save_annotated_documents(
-        [result], 
-        output_name=jsonl_path.name, #.name important not to only save path
-        output_dir=out_dir)
-
-    # Generate the visualization from the file
-    html_content = lx.visualize(jsonl_path)
-    with open(html_path, "w", encoding="utf-8") as f:
-        if hasattr(html_content, 'data'):
-            f.write(html_content.data)  # For Jupyter/Colab
-        else:
-            f.write(html_content)
-
-    return jsonl_path, html_path
-
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import bisect
+import dataclasses
+import glob
+import io
+import json
+import os
+import time
+import langextract as lx
+
+from conversion_cache import get_cache
+from instrumentation import metrics
+import zstd_io
+
+_md = None # one MarkItDown per process, created on first use; pool workers each get their own and reuse it for every file
+
+
+def get_markitdown():
+    """The process-wide MarkItDown. markitdown[all] takes over a second to import, so only converting code pays for it."""
+    global _md
+    if _md is None:
+        from markitdown import MarkItDown
+        _md = MarkItDown()
+    return _md
+
+def load_text_from_source(
+        source_name: str, # provide the source file name, no default
+        in_dir: str = "in", # optional, no default
+        md_out_dir: str | None = "out", # optional, default to None, e.g. load_text_from_source("source_name", md_out_dir=None)
+        cache_dir: str | None = ".cache/markdown", # optional, None always re-converts
+        page_workers: int | None = None, # optional, convert a PDF's pages in this many processes, None converts it in one call
+        compress: bool = False # optional, save the markdown zstd-compressed as <name>.md.zst (needs zstandard)
+):
+    """
+    Load text from source files, supporting .pdf or .txt formats. Convert to markdown. Save in output directory.
+    Unchanged sources are served from the conversion cache instead of being converted again.
+    With page_workers, a PDF is converted page-parallel and its page ranges with their offsets are saved next to the markdown as <name>.pages.json.
+    """
+
+    source_path = Path(in_dir) / source_name # Converts the string in_dir (e.g. "in") into a Path object, / is the join operator
+
+    # check if file exists
+    if not source_path.is_file(): # defensive validation check, is_file method of pathlib checks if the path points to a file
+        raise FileNotFoundError(f"Source file not found: {source_path}") # raising exception if file not found, f-string
+    
+    # get suffix 
+    suffix = source_path.suffix.lower() # get the file extension, e.g. .pdf or .txt, convert to lowercase for consistency
+
+    # check suffix and convert
+    if suffix == ".pdf" and page_workers:
+        md_text, page_ranges = load_pdf_pages(source_path, max_workers=page_workers, cache_dir=cache_dir)
+        if md_out_dir is not None:
+            out_dir = Path(md_out_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            write_markdown(out_dir / f"{source_path.stem}.md", md_text, compress)
+            (out_dir / f"{source_path.stem}.pages.json").write_text(json.dumps(page_ranges), encoding = "utf-8") # [first page, last page, offset] per range
+        return md_text
+
+    if suffix == ".pdf" or suffix == ".txt":
+        with metrics.stage("convert", bytes_in=source_path.stat().st_size) as span: # timing for the run report
+            if cache_dir is not None:
+                md_text = get_cache(cache_dir).convert(get_markitdown(), source_path) # cached by content hash, converts only on a miss
+            else:
+                result = get_markitdown().convert(str(source_path)) # conversion to markdown, str() converts Path object to string
+                md_text = result.text_content # get text content from the conversion result
+            span.bytes_out = len(md_text.encode("utf-8"))
+
+        # save markdown text if output directory
+        if md_out_dir is not None:
+            out_dir = Path(md_out_dir) # convert md_out_dir string to Path object
+            out_dir.mkdir(parents=True, exist_ok=True) # create output directory if it doesn't exist, parents=True creates any necessary parent directories, exist_ok=True avoids error if directory exists
+            out_path = out_dir / f"{source_path.stem}.md" # create output file path with .md extension"
+            write_markdown(out_path, md_text, compress) # write markdown text to file with utf-8 encoding, or to out_path.md.zst
+       
+        return md_text
+    
+    # return source_path.read_text(encoding = "utf-8") # if not pdf or txt, read as plain text file
+
+
+def cut_torn_line(path: str | Path, block_size: int = 64 * 1024) -> int:
+    """
+    Truncate a JSONL back to its last complete line, dropping a half written last line left by a crash.
+    Reads backwards from the end, so a big file costs one block. Returns the number of bytes cut.
+    """
+    with open(path, "r+b") as f:
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+        return size - end
+
+
+def write_markdown(md_path: str | Path, md_text: str, compress: bool = False) -> Path:
+    """Write converted markdown to md_path, or zstd-compressed to md_path + .zst; read it back with zstd_io.read_text."""
+    if compress:
+        return zstd_io.write_text(f"{md_path}{zstd_io.SUFFIX}", md_text)
+    Path(md_path).write_text(md_text, encoding = "utf-8")
+    return Path(md_path)
+
+
+class JsonlWriter:
+    """
+    Append extraction results to one JSONL file as each document finishes, one line per document.
+    Nothing is kept in memory after a write. Lines are flushed to the OS every flush_every documents
+    and fsynced to disk every fsync_every documents, so a crash leaves every completed document on disk.
+    A path ending in .zst is written zstd-compressed in frames with a document index, see zstd_io.py.
+    """
+
+    def __init__(
+            self,
+            path: str | Path,
+            append: bool = True, # False starts a fresh file
+            flush_every: int = 1, # survive a crash of this process
+            fsync_every: int | None = 50 # survive a crash of the machine, None only fsyncs on close
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self.fsync_every = fsync_every
+        self.count = 0
+        if zstd_io.is_compressed(self.path):
+            self._file = zstd_io.FrameWriter(self.path, append=append)
+        else:
+            if append and self.path.is_file():
+                cut_torn_line(self.path) # else the next line is glued onto a crashed run's half line
+            self._file = open(self.path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, result):
+        with metrics.stage("save_jsonl") as span:
+            doc_dict = lx.data_lib.annotated_document_to_dict(result)
+            line = json.dumps(doc_dict, ensure_ascii=False) + "\n"
+            if isinstance(self._file, zstd_io.FrameWriter):
+                self._file.write(line, doc_dict.get("document_id"))
+            else:
+                self._file.write(line)
+            span.bytes_out = len(line.encode("utf-8"))
+            self.count += 1
+            if self.fsync_every and self.count % self.fsync_every == 0:
+                self.flush(fsync=True)
+            elif self.count % self.flush_every == 0:
+                self.flush()
+
+    def flush(self, fsync: bool = False):
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush(fsync=True)
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_extraction_outputs(jsonl_path: str | Path):
+    """
+    Stream AnnotatedDocuments back from a JSONL file (or .jsonl.zst, a frame at a time), one at a time.
+    A half written last line (the process died mid-write) is skipped.
+    """
+    for line in zstd_io.iter_lines(jsonl_path):
+        if not line.strip():
+            continue
+        try:
+            doc_dict = json.loads(line)
+        except json.JSONDecodeError:
+            if not line.endswith("\n"):
+                break # torn final line
+            raise
+        yield lx.data_lib.dict_to_annotated_document(doc_dict)
+
+
+def read_extraction_output(jsonl_path: str | Path, document_id: str):
+    """
+    One AnnotatedDocument by document_id, None if it is not in the file. A .jsonl.zst only decompresses
+    the frame holding it (found with its .idx sidecar); a plain JSONL is scanned up to it.
+    """
+    if zstd_io.is_compressed(jsonl_path):
+        line = zstd_io.read_line(jsonl_path, document_id)
+        return lx.data_lib.dict_to_annotated_document(json.loads(line)) if line else None
+    for result in read_extraction_outputs(jsonl_path):
+        if result.document_id == document_id:
+            return result
+    return None
+
+
+def save_html(
+        result, # an AnnotatedDocument
+        html_path: str | Path
+) -> Path:
+    """
+    Render the langextract HTML visualization of one result and write it to html_path.
+    """
+    html_path = Path(html_path)
+    html_path.parent.mkdir(parents=True, exist_ok=True)
+    with metrics.stage("visualize") as span:
+        html_content = lx.visualize(result)
+        if hasattr(html_content, 'data'):
+            html_content = html_content.data  # For Jupyter/Colab
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write(html_content)
+        span.bytes_out = len(html_content.encode("utf-8"))
+    return html_path
+
+
+def save_extraction_outputs(
+        result, # required parameter
+        out_name: str | None = None, # optional parameter, string or None, default = None
+        out_dir: str = "out",
+        writer: JsonlWriter | None = None, # optional, append to this batch JSONL instead of writing out_name.jsonl
+        visualize: bool = False, # optional, HTML is rendered on demand with visualize_results.py
+        store = None, # optional extraction_store.ExtractionStore, the result is also indexed there for queries
+        source: str | Path | None = None # optional, the slip the result came from, recorded in the store
+) -> tuple[Path, Path | None]: # returns a tuple (immutable) of Path objects, html path is None unless visualize=True
+    """
+    Save extraction results in out directory to JSONL, and optionally generate the HTML visualization.
+    """
+
+    out_dir_path = Path(out_dir)
+    out_dir_path.mkdir(parents=True, exist_ok=True) # create output directory if it doesn't exist
+    
+    out_name = Path(out_name).stem if out_name is not None else "extraction_results" # get stem of out_name or default name
+
+    # Save the results to a JSONL file
+    if writer is not None:
+        writer.write(result) # streamed, the line is on disk before the next document starts
+        jsonl_path = writer.path
+    else:
+        jsonl_path = out_dir_path / f"{out_name}.jsonl"
+        with JsonlWriter(jsonl_path, append=False) as single_writer:
+            single_writer.write(result)
+
+    if store is not None:
+        store.add(result, source, jsonl_path)
+
+    # Generate the visualization from the result in memory, no need to read the JSONL back
+    html_path = save_html(result, out_dir_path / f"{out_name}.html") if visualize else None
+
+    return jsonl_path, html_path
+
+
+def _render_line(line: str, out_dir: str) -> str:
+    """Runs in a pool worker: render one JSONL line to out_dir/<document_id>.html."""
+    result = lx.data_lib.dict_to_annotated_document(json.loads(line))
+    return str(save_html(result, Path(out_dir) / f"{result.document_id}.html"))
+
+
+def render_html_from_jsonl(
+        jsonl_path: str | Path,
+        out_dir: str = "out/html",
+        document_ids: set[str] | None = None, # None renders every document
+        workers: int = 1 # > 1 renders in a process pool
+) -> list[Path]:
+    """
+    Render HTML for selected documents of a results JSONL (or .jsonl.zst), streaming the file line by line.
+    """
+    def selected_lines():
+        if document_ids is not None and zstd_io.is_compressed(jsonl_path):
+            index = zstd_io.load_index(jsonl_path) # only the frames holding the selected documents
+            for document_id in document_ids:
+                if document_id in index:
+                    yield zstd_io.read_line(jsonl_path, document_id, index)
+            return
+        for line in zstd_io.iter_lines(jsonl_path):
+            if not line.strip():
+                continue
+            if document_ids is None or json.loads(line).get("document_id") in document_ids:
+                yield line
+
+    if workers <= 1:
+        return [Path(_render_line(line, out_dir)) for line in selected_lines()]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_line, line, out_dir) for line in selected_lines()]
+        return [Path(future.result()) for future in futures]
+
+
+
+SOURCE_SUFFIXES = (".pdf", ".txt")
+
+
+def collect_sources(
+        source: str # a single file, a directory or a glob pattern, e.g. "in/*.pdf"
+) -> list[Path]:
+    """
+    Resolve a file, directory or glob pattern into a sorted list of .pdf/.txt source files.
+    Raises ValueError if two sources share a name stem, e.g. slip.pdf and slip.txt: the stem is the
+    document_id of the result and names the <stem>.md beside the source, so one would overwrite the other.
+    """
+
+    source_path = Path(source)
+    if source_path.is_file():
+        return [source_path]
+
+    if source_path.is_dir():
+        candidates = source_path.iterdir() # all entries directly in the directory
+    else:
+        candidates = (Path(p) for p in glob.glob(source, recursive=True)) # treat the string as a glob pattern
+
+    sources = sorted(p for p in candidates if p.is_file() and p.suffix.lower() in SOURCE_SUFFIXES)
+    if not sources:
+        raise FileNotFoundError(f"No .pdf or .txt sources found for: {source}")
+
+    by_stem: dict[str, list[Path]] = {}
+    for p in sources:
+        by_stem.setdefault(p.stem, []).append(p)
+    duplicates = [paths for paths in by_stem.values() if len(paths) > 1]
+    if duplicates:
+        listed = "; ".join(", ".join(str(p) for p in paths) for paths in duplicates)
+        raise ValueError(f"Sources with the same name stem would share a document_id, rename or remove one of: {listed}")
+    return sources
+
+
+def _convert_in_worker(source_path: str) -> tuple[str, float, float]:
+    """
+    Runs inside a pool worker: convert one file with the worker's MarkItDown, return wall and CPU seconds.
+    """
+    start, cpu_start = time.perf_counter(), time.process_time()
+    md_text = get_markitdown().convert(source_path).text_content
+    return md_text, time.perf_counter() - start, time.process_time() - cpu_start
+
+
+def convert_many(
+        source_paths: list[Path],
+        max_workers: int | None = None, # None lets the pool use one process per CPU
+        max_pending: int | None = None, # cap on submitted-but-unconsumed files, bounds memory on big batches
+        cache_dir: str | None = ".cache/markdown", # optional, None always re-converts
+        scheduler = None # a scheduler.LaneScheduler: submit by estimated size instead of in the given order
+):
+    """
+    Convert many sources to markdown in a process pool.
+    Yields (source_path, md_text, seconds, error) as each file finishes, so callers can start
+    extracting while the remaining files are still being converted.
+    Cache hits are yielded straight away without going through the pool.
+    """
+
+    cache = get_cache(cache_dir) if cache_dir is not None else None
+    to_convert = [] # (source_path, cache key) for the misses
+    for source_path in source_paths:
+        key = cache.key_for(source_path) if cache is not None else None
+        md_text = cache.get(key) if cache is not None else None
+        if md_text is not None:
+            yield source_path, md_text, 0.0, None
+        else:
+            to_convert.append((source_path, key))
+    if not to_convert:
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = max_workers * 2 # keep every worker busy with one file queued behind it
+    if scheduler is not None:
+        from scheduler import estimate_tokens
+        origin = time.perf_counter()
+        for item in to_convert:
+            scheduler.push(item, estimate_tokens(item[0]), origin)
+        scheduler.close()
+        max_pending = scheduler.slots # nothing waits in the pool's FIFO, the scheduler picks every next file
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+
+        queued = iter(to_convert)
+        pending = {} # future -> (source path, cache key), scheduler job
+
+        def submit_next():
+            if scheduler is not None:
+                job = scheduler.take(block=False)
+                item = job.item if job is not None else None
+            else:
+                job, item = None, next(queued, None)
+            if item is not None:
+                pending[pool.submit(_convert_in_worker, str(item[0]))] = item, job
+
+        for _ in range(max_pending):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                (source_path, key), job = pending.pop(future)
+                if job is not None:
+                    scheduler.finish(job)
+                submit_next() # refill the window before handing the result to the caller
+                try:
+                    md_text, seconds, cpu_seconds = future.result()
+                except Exception as e: # one broken file should not stop the whole batch
+                    yield source_path, None, 0.0, e
+                else:
+                    metrics.add("convert", seconds, cpu_seconds, source_path.stat().st_size, len(md_text.encode("utf-8")))
+                    if cache is not None:
+                        cache.put(key, md_text, seconds) # the parent owns the cache, workers only convert
+                    yield source_path, md_text, seconds, None
+
+
+PAGE_SEPARATOR = "\n\n" # between the markdown of consecutive page ranges of a page-parallel conversion
+
+
+@dataclasses.dataclass
+class PagePart:
+    first_page: int # 1-based, inclusive
+    last_page: int
+    start: int # offset of the part's text in the stitched document
+    text: str
+
+
+def pdf_page_count(source_path: str | Path) -> int:
+    import pypdfium2 as pdfium # installed with markitdown[all] (pdfplumber depends on it)
+    pdf = pdfium.PdfDocument(str(source_path))
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _convert_pages_in_worker(source_path: str, first_page: int, last_page: int) -> tuple[str, float, float]:
+    """
+    Runs inside a pool worker: copy the page range into a new in-memory PDF and convert it with the
+    worker's MarkItDown. Returns the markdown, wall and CPU seconds.
+    """
+    import pypdfium2 as pdfium
+    start, cpu_start = time.perf_counter(), time.process_time()
+    source = pdfium.PdfDocument(source_path)
+    part = pdfium.PdfDocument.new()
+    try:
+        part.import_pages(source, list(range(first_page - 1, last_page)))
+        buffer = io.BytesIO()
+        part.save(buffer)
+    finally:
+        part.close()
+        source.close()
+    buffer.seek(0)
+    md_text = get_markitdown().convert_stream(buffer, file_extension=".pdf").text_content.strip()
+    return md_text, time.perf_counter() - start, time.process_time() - cpu_start
+
+
+def convert_pdf_pages(
+        source_path: str | Path,
+        pages_per_part: int = 4, # pages per worker task; 1 gives exact page offsets, more pages convert with less overhead
+        max_workers: int | None = None, # None lets the pool use one process per CPU
+        cache_dir: str | None = ".cache/markdown" # optional, None always re-converts
+):
+    """
+    Convert a long PDF in page ranges on a process pool.
+    Yields PageParts in page order, each as soon as it and every part before it are converted, so
+    extraction can start on the first pages while the rest of the document is still converting.
+    The parts joined with PAGE_SEPARATOR are the whole document.
+    """
+    source_path = Path(source_path)
+    cache = get_cache(cache_dir) if cache_dir is not None else None
+    # keyed per part size, page-range text differs slightly from a whole-file conversion
+    key = cache.key_for(source_path, variant=f"pages={pages_per_part}") if cache is not None else None
+    md_text = cache.get(key) if cache is not None else None
+    if md_text is not None:
+        ranges = cache.meta(key).get("page_ranges", [])
+        ends = [start - len(PAGE_SEPARATOR) for _, _, start in ranges[1:]] + [len(md_text)]
+        for (first, last, start), end in zip(ranges, ends):
+            yield PagePart(first, last, start, md_text[start:end])
+        return
+
+    convert_start = time.perf_counter()
+    page_count = pdf_page_count(source_path)
+    ranges = [(first, min(first + pages_per_part - 1, page_count)) for first in range(1, page_count + 1, pages_per_part)]
+    parts = []
+    offset = 0
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(_convert_pages_in_worker, str(source_path), first, last) for first, last in ranges]
+        for (first, last), future in zip(ranges, futures): # in page order, later ranges keep converting while the caller works on this one
+            md_text, seconds, cpu_seconds = future.result()
+            metrics.add("convert", seconds, cpu_seconds, bytes_out=len(md_text.encode("utf-8")), chunks=1)
+            part = PagePart(first, last, offset, md_text)
+            offset += len(md_text) + len(PAGE_SEPARATOR)
+            parts.append(part)
+            yield part
+
+    if cache is not None:
+        cache.put(
+            key,
+            PAGE_SEPARATOR.join(part.text for part in parts),
+            time.perf_counter() - convert_start,
+            page_ranges=[(part.first_page, part.last_page, part.start) for part in parts]
+        )
+
+
+def load_pdf_pages(source_path: str | Path, **kwargs) -> tuple[str, list[tuple[int, int, int]]]:
+    """
+    Page-parallel conversion of a whole PDF. Returns the markdown and its page ranges as
+    (first page, last page, offset where the range starts).
+    """
+    parts = list(convert_pdf_pages(source_path, **kwargs))
+    return PAGE_SEPARATOR.join(part.text for part in parts), [(part.first_page, part.last_page, part.start) for part in parts]
+
+
+def pages_for_offset(page_ranges: list[tuple[int, int, int]], position: int) -> tuple[int, int]:
+    """(first, last) page of the range holding a character offset, e.g. an extraction's char_interval.start_pos."""
+    index = bisect.bisect_right([start for _, _, start in page_ranges], position) - 1
+    first, last, _ = page_ranges[max(index, 0)]
+    return first, last
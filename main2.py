@@ -1,397 +1,148 @@
-import langextract as lx
-import textwrap
-
-import argparse
-from markitdown import MarkItDown
-from pathlib import Path
-
-# add CLI
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "--source",
-    required = True
-)
-args = parser.parse_args()
-
-# 1. Define the prompt and extraction rules
-prompt = textwrap.dedent(
-    """\
-    You are a senior underwriter in a reinsurance company and an excellent linguist.  
-    You extract structured fields from treaty documents in markdown format within non-life reinsurance.
-    Use exact substrings from the source (no paraphrasing). 
-    If a value is missing, omit it.
-    Use only the categories defined within examples.
-    """
-)
-
-# 2. Provide a high-quality example to guide the model
-examples = [
-    lx.data.ExampleData(
-        text=textwrap.dedent(
-            """
-            Slip 1
-            Risk Details
-            UMR:
-            A661997MP00001
-            TYPE:
-            Motor Excess of Loss Reinsurance
-            REINSURED:
-            HYDROBIUS INSURANCE AND REINSURANCE S.A., Athens, Greece
-            PERIOD:
-            Losses occurring during the period commencing 12 months from 1st January 2024 to 31st December
-            2024 both days inclusive Local Standard Time at place where loss occurs.
-            CLASS OF BUSINESS:
-            Business in respect of Motor Insurances covering Third Party Bodily Injury, Third Party Material
-            Damage, Passengers Liability, including Green Cards and losses resulting from Presidential Decree
-            1019.
-            TERRITORIAL SCOPE:
-            Business underwritten in the territory of Greece but extended to cover European Union countries,
-            Switzerland, Green Cards and Presidential Decree 1019.
-            LIMITS & RETENTIONS:
-            1st Layer
-            EUR 3,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
-            arising out of one event in excess of:
-            EUR 2,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
-            arising out of one event.
-            2nd Layer
-            EUR 45,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
-            arising out of one event in excess of:
-            EUR 5,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
-            arising out of one event.
-            3rd Layer
-            Unlimited Ultimate Net Loss each and every accident or loss or series of accidents or losses arising
-            out of one event in excess of:
-            EUR 50,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
-            arising out of one event.
-            PREMIUM:
-            1st Layer
-            Minimum & Deposit: EUR 115,440
-            Premium payable in four equal instalments of EUR 28,860 each at 1st January 2024, 1st April 2024,
-            1st July 2024 and 1st October 2024 subject to LSW3000 (60 days) per each instalment.
-            2nd Layer
-            Minimum & Deposit: EUR 88,800
-            Premium payable in four equal instalments of EUR 22,200 each at 1st January 2024, 1st April 2024,
-            1st July 2024 and 1st October 2024 subject to LSW3000 (60 days) per each instalment.
-            3rd Layer
-            Minimum & Deposit: EUR 47,360
-            Premium payable in four equal instalments of EUR 11,840 each at 1st January 2024, 1st April 2024,
-            1st July 2024 and 1st October 2024 subject to LSW3000 (60 days) per each instalment.
-            The term ‘Gross Net Premium Income’ shall mean the original gross premium written by the
-            Reinsured, in respect of the business covered hereunder, less return premiums and less the premiums
-            for outwards reinsurance, recoveries under which inure to the benefit of reinsurers hereon.
-            PREMIUM PAYMENT TERMS:
-            The (Re)Insured undertakes that premium will be paid in full to Reinsurers within 60 days of inception
-            of this policy (or, in respect of instalment premiums, when due).
-            ESTIMATED PREMIUM INCOME:
-            Estimated Premium Income for the period 01/01/2024 - 31/12/2024:
-            EUR 36,000,000
-            TAXES PAYABLE BY THE REINSURED & ADMINISTERED BY
-            UNDERWRITERS:
-            None
-            CONDITIONS:
-            •  Reinsurance Clause
-            •  Ultimate Net Loss Clause
-            •  Net Retained Lines Clause
-            •  Premium Clause
-            •  Premium Processing Clause LSW3003 - 14/12/09
-            •  Claims Reporting and Co-Operation Clause
-            •  Loss Settlements Clause
-            •  Currency Conversion Clause
-            •  Apportionment Clause
-            •  Change In Law Clause
-            •  Local Jurisdiction Clause
-            •  Special Cancellation Clause
-            •  Limits and Retentions Clause
-            •  Extended Expiration Clause
-            •  Amendments and Alterations Clause
-            """
-        ).strip(),
-        extractions=[
-            # umr
-            lx.data.Extraction(
-                extraction_class="umr_nr",
-                extraction_text="A661997MP00001"
-            ),
-            # type
-            lx.data.Extraction(
-                extraction_class="reinsurance_type",
-                extraction_text="Motor Excess of Loss Reinsurance"
-            ),
-            # reinsured
-            lx.data.Extraction(
-                extraction_class="company",
-                extraction_text="HYDROBIUS INSURANCE AND REINSURANCE S.A., Athens, Greece",
-                attributes={"role": "cedent"}
-            ),
-            # period
-            lx.data.Extraction(
-                extraction_class="period",
-                extraction_text="12 months",
-                attributes={"type": "duration"}
-            ),
-            lx.data.Extraction(
-                extraction_class="period",
-                extraction_text="1st January 2024",
-                attributes={"type": "start"}
-            ),
-            lx.data.Extraction(
-                extraction_class="period",
-                extraction_text="31st December 2024",
-                attributes={"type": "end"}
-            ),
-            # class of business
-            lx.data.Extraction(
-                extraction_class="class_of_business",
-                extraction_text="Motor Insurances",
-                attributes={"type": "business"}
-            ),
-            lx.data.Extraction(
-                extraction_class="class_of_business",
-                extraction_text="Third Party Bodily Injury, Third Party Material Damage, Passengers Liability, including Green Cards and losses resulting from Presidential Decree 1019",
-                attributes={"type": "coverage"}
-            ),
-            # territorial scope
-            lx.data.Extraction(
-                extraction_class="territory",
-                extraction_text="Greece",
-                attributes={"type": "main"}
-            ),
-            lx.data.Extraction(
-                extraction_class="territory",
-                extraction_text="European Union countries, Switzerland, Green Cards and Presidential Decree 1019",
-                attributes={"type": "extended"}
-            ),
-            # limits & retentions
-            lx.data.Extraction(
-                extraction_class="limits",
-                extraction_text="EUR 3,000,000",
-                attributes={"layer": "1st"}
-            ),
-            lx.data.Extraction(
-                extraction_class="retentions",
-                extraction_text="EUR 2,000,000",
-                attributes={"layer": "1st"}
-            ),
-            lx.data.Extraction(
-                extraction_class="limits",
-                extraction_text="EUR 45,000,000",
-                attributes={"layer": "2nd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="retentions",
-                extraction_text="EUR 5,000,000",
-                attributes={"layer": "2nd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="limits",
-                extraction_text="Unlimited",
-                attributes={"layer": "3rd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="retentions",
-                extraction_text="EUR 50,000,000",
-                attributes={"layer": "3rd"}
-            ),
-            # 1st layer premium
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="EUR 115,440",
-                attributes={"part": "minimum & deposit amount", "layer": "1st"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="four",
-                attributes={"part": "instalments", "layer": "1st"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="EUR 28,860",
-                attributes={"part": "instalment amount", "layer": "1st"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="1st January 2024, 1st April 2024, 1st July 2024 and 1st October 2024",
-                attributes={"part": "instalment dates", "layer": "1st"}
-            ),
-            # 2nd layer premium
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="EUR 88,800",
-                attributes={"part": "minimum & deposit amount", "layer": "2nd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="four",
-                attributes={"part": "instalments", "layer": "2nd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="EUR 22,200",
-                attributes={"part": "instalment amount", "layer": "2nd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="1st January 2024, 1st April 2024, 1st July 2024 and 1st October 2024",
-                attributes={"part": "instalment dates", "layer": "2nd"}
-            ),
-            # 3rd layer premium
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="EUR 47,360",
-                attributes={"part": "minimum & deposit amount", "layer": "3rd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="four",
-                attributes={"part": "instalments", "layer": "3rd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="EUR 11,840",
-                attributes={"part": "instalment amount", "layer": "3rd"}
-            ),
-            lx.data.Extraction(
-                extraction_class="premium",
-                extraction_text="1st January 2024, 1st April 2024, 1st July 2024 and 1st October 2024",
-                attributes={"part": "instalment dates", "layer": "3rd"}
-            ),
-            # premium payment terms
-            lx.data.Extraction(
-                extraction_class="premium_terms",
-                extraction_text="within 60 days of inception of this policy"
-            ),
-            # estimated premium income
-            lx.data.Extraction(
-                extraction_class="estimated_premium_income",
-                extraction_text="01/01/2024",
-                attributes={"part": "start"}
-            ),
-            lx.data.Extraction(
-                extraction_class="estimated_premium_income",
-                extraction_text="31/12/2024",
-                attributes={"part": "end"}
-            ),
-            lx.data.Extraction(
-                extraction_class="estimated_premium_income",
-                extraction_text="EUR 36,000,000",
-                attributes={"part": "amount"}
-            ),
-            # taxes
-            lx.data.Extraction(
-                extraction_class="taxes",
-                extraction_text="None"
-            ),
-            # conditions
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Reinsurance Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Ultimate Net Loss Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Net Retained Lines Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Premium Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Premium Processing Clause LSW3003 - 14/12/09",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Claims Reporting and Co-Operation Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Loss Settlements Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Currency Conversion Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Apportionment Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Change In Law Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Local Jurisdiction Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Special Cancellation Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Limits and Retentions Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Extended Expiration Clause",
-                attributes={"type": "clause"}
-            ),
-            lx.data.Extraction(
-                extraction_class="conditions",
-                extraction_text="Amendments and Alterations Clause",
-                attributes={"type": "clause"}
-            ),
-        ]
-    )
-]
-
-# add source upload, convert and save
-def load_from_source(source_path: str) -> str:
-    md = MarkItDown() # calling a class, creating an instance, is an object
-    source = Path(str(source_path))
-
-    result = md.convert(source)
-    md_text = result.text_content
-
-    output_path = source.with_suffix('.md')
-    output_path.write_text(md_text, encoding = 'utf-8')
-
-    return md_text
-
-# The input text to be processed
-input_text = load_from_source(args.source)
-
-# Run the extraction
-result = lx.extract(
-    text_or_documents=input_text,
-    prompt_description=prompt,
-    examples=examples,
-    model_id="gpt-oss:120b-cloud",
-)
-
-# Save the results to a JSONL file
-lx.io.save_annotated_documents([result], output_name="extraction_results.jsonl", output_dir=".")
-
-# Generate the visualization from the file
-html_content = lx.visualize("extraction_results.jsonl")
-with open("visualization.html", "w", encoding = "utf-8") as f:
-    if hasattr(html_content, 'data'):
-        f.write(html_content.data)  # For Jupyter/Colab
-    else:
-        f.write(html_content)
+import argparse
+import glob
+from pathlib import Path
+
+# only the standard library up here: --help and a bad --source answer straight away,
+# langextract and markitdown (seconds to import) are loaded by treaty_pipeline once the arguments are valid
+
+if __name__ == "__main__":
+    # add CLI
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--source",
+        required = True,
+        help = "a .pdf/.txt file, or a directory or glob pattern for batch mode"
+    )
+    parser.add_argument(
+        "--workers",
+        type = int,
+        default = None,
+        help = "conversion processes in batch mode (default: one per CPU)"
+    )
+    parser.add_argument(
+        "--page-workers",
+        type = int,
+        default = None,
+        help = "single PDF mode: convert page ranges in this many processes and extract them as they finish"
+    )
+    parser.add_argument(
+        "--section-tokens",
+        type = int,
+        default = 512,
+        help = "token budget per chunk when chunking on slip section headers"
+    )
+    parser.add_argument(
+        "--example-tokens",
+        type = int,
+        default = None,
+        help = "few-shot budget per chunk: send only the example sections relevant to the chunk (default: the whole example)"
+    )
+    parser.add_argument(
+        "--cascade",
+        action = "store_true",
+        help = "send chunks to gpt-oss:20b first and escalate only those failing the schema, alignment and class checks to 120b"
+    )
+    parser.add_argument(
+        "--followup-passes",
+        type = int,
+        default = 0,
+        help = "after the first pass, re-query only the sections of missing required classes or layers, up to this many times"
+    )
+    parser.add_argument(
+        "--char-chunking",
+        action = "store_true",
+        help = "use langextract's generic character chunking instead of section headers"
+    )
+    parser.add_argument(
+        "--schedule",
+        action = "store_true",
+        help = "batch mode: convert and extract small documents first, large ones (by pages/size) in their own lane"
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type = int,
+        default = 4,
+        help = "batch mode with --schedule: documents extracted at the same time"
+    )
+    parser.add_argument(
+        "--pack-tokens",
+        type = int,
+        nargs = "?",
+        const = 1024,
+        default = None,
+        help = "batch mode: pack short documents (endorsements) into shared model calls of up to this many tokens"
+    )
+    parser.add_argument(
+        "--compress",
+        action = "store_true",
+        help = "write extraction_results.jsonl.zst and <name>.md.zst, zstd-compressed (needs zstandard)"
+    )
+    parser.add_argument(
+        "--resume",
+        action = "store_true",
+        help = "batch mode: skip sources already extracted by a previous run and append to its results"
+    )
+    parser.add_argument(
+        "--html",
+        action = "store_true",
+        help = "single file mode: also write visualization.html (batch: use visualize_results.py)"
+    )
+    parser.add_argument(
+        "--parquet",
+        nargs = "?",
+        const = "out/extractions.parquet",
+        default = None,
+        help = "batch mode: also export all results to Parquet (or .arrow) with normalized amounts and dates"
+    )
+    parser.add_argument(
+        "--store",
+        nargs = "?",
+        const = "out/extractions.sqlite",
+        default = None,
+        help = "batch mode: also index every result in this SQLite store, query it with extraction_store.py"
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs = "?",
+        const = "out/renewals.sqlite",
+        default = None,
+        help = "match renewals to their prior slip (UMR or near duplicate) in this index and only extract the changed sections; not with --cascade, --pack-tokens or --page-workers on a PDF"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action = "store_true",
+        help = "always call the model, refreshing the cached responses"
+    )
+    args = parser.parse_args()
+    if not Path(args.source).exists() and not glob.glob(args.source):
+        parser.error(f"--source not found: {args.source}")
+    if args.incremental and args.cascade:
+        parser.error("--incremental and --cascade cannot be combined: the changed sections of a renewal go to the large model only")
+    if args.incremental and args.pack_tokens:
+        parser.error("--incremental and --pack-tokens cannot be combined: packed documents would skip the renewal diff")
+    if args.incremental and args.page_workers and Path(args.source).suffix.lower() == ".pdf":
+        parser.error("--incremental and --page-workers cannot be combined: page ranges are extracted in full, not against a prior")
+
+    import treaty_pipeline
+    import treaty_prompt
+    from io_utils import collect_sources
+
+    treaty_pipeline.SECTION_TOKENS = None if args.char_chunking else args.section_tokens
+    treaty_pipeline.FOLLOWUP_PASSES = args.followup_passes
+    treaty_pipeline.CASCADE = args.cascade
+    treaty_pipeline.SCHEDULE = args.schedule
+    treaty_pipeline.EXTRACT_WORKERS = args.extract_workers
+    treaty_pipeline.PACK_TOKENS = args.pack_tokens
+    treaty_prompt.EXAMPLE_TOKENS = args.example_tokens
+    if args.compress:
+        treaty_pipeline.COMPRESS = True
+        treaty_pipeline.RESULTS_PATH = "extraction_results.jsonl.zst"
+
+    if Path(args.source).is_file():
+        treaty_pipeline.run_single(args.source, args.no_cache, args.html, args.page_workers, args.incremental)
+    else:
+        try:
+            sources = collect_sources(args.source)
+        except ValueError as e:
+            parser.error(str(e))
+        treaty_pipeline.run_batch(sources, args.workers, args.no_cache, args.resume, args.parquet, args.store, args.incremental)
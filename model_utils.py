@@ -0,0 +1,127 @@
+import threading
+
+import langextract as lx
+import requests
+from langextract.core import base_model
+
+
+DEFAULT_POOL_SIZE = 16 # keep-alive connections per host, match the number of threads calling the model
+
+
+class PooledHttp:
+    """
+    Stands in for the requests module inside langextract's Ollama provider, which calls
+    requests.post once per prompt and so opens a new connection for every chunk. Posts go
+    through one requests.Session instead, reusing up to pool_size keep-alive connections per host.
+    """
+
+    exceptions = requests.exceptions # the provider catches self._requests.exceptions.*
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        # pool_block: with more threads than connections, callers wait for a free one instead of opening throwaway connections
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+
+_http_pools: dict[int, PooledHttp] = {}
+_models: dict[tuple, base_model.BaseLanguageModel] = {}
+_shared_lock = threading.Lock()
+
+
+def get_http_pool(pool_size: int = DEFAULT_POOL_SIZE) -> PooledHttp:
+    """Return the process wide connection pool of that size, creating it on first use."""
+    with _shared_lock:
+        if pool_size not in _http_pools:
+            _http_pools[pool_size] = PooledHttp(pool_size)
+        return _http_pools[pool_size]
+
+
+def build_model(
+        model_id: str,
+        examples: list[lx.data.ExampleData] | None = None,
+        fence_output: bool | None = None,
+        use_schema_constraints: bool = True,
+        pool_size: int | None = DEFAULT_POOL_SIZE, # None keeps langextract's one connection per call
+        **provider_kwargs
+) -> base_model.BaseLanguageModel:
+    """
+    Create the provider for model_id the same way lx.extract does when it only gets a model_id.
+    Pass the result (or a wrapper around it) as lx.extract(model=...) together with
+    use_schema_constraints=False, the schema is already applied here.
+    HTTP providers send their requests through the shared keep-alive pool of pool_size connections.
+    """
+    provider_kwargs.setdefault("format_type", lx.data.FormatType.JSON) # lx.extract default
+    config = lx.factory.ModelConfig(model_id=model_id, provider_kwargs=provider_kwargs)
+    provider = lx.factory.create_model(
+        config=config,
+        examples=examples if use_schema_constraints else None,
+        use_schema_constraints=use_schema_constraints,
+        fence_output=fence_output,
+    )
+    if pool_size is not None and hasattr(provider, "_requests"): # the Ollama provider, other providers bring their own clients
+        provider._requests = get_http_pool(pool_size)
+    return provider
+
+
+def shared_model(
+        model_id: str,
+        examples: list[lx.data.ExampleData] | None = None,
+        fence_output: bool | None = None,
+        use_schema_constraints: bool = True,
+        pool_size: int | None = DEFAULT_POOL_SIZE,
+        **provider_kwargs
+) -> base_model.BaseLanguageModel:
+    """
+    build_model, but built once per process for the same arguments and then reused by every
+    document and thread, instead of resolving model_id into a fresh provider per document.
+    """
+    key = (
+        model_id,
+        repr(examples) if use_schema_constraints else None, # the examples only matter for the schema
+        fence_output,
+        use_schema_constraints,
+        pool_size,
+        repr(sorted(provider_kwargs.items())),
+    )
+    with _shared_lock:
+        model = _models.get(key)
+    if model is None:
+        model = build_model(model_id, examples, fence_output, use_schema_constraints, pool_size, **provider_kwargs)
+        with _shared_lock:
+            model = _models.setdefault(key, model) # another thread may have built it meanwhile
+    return model
+
+
+class DelegatingModel(base_model.BaseLanguageModel):
+    """
+    Base for wrappers around another language model: schema and fence settings live on the
+    wrapped model, subclasses only change how infer() reaches it.
+    """
+
+    def __init__(self, inner: base_model.BaseLanguageModel, model_id: str):
+        super().__init__()
+        self.inner = inner
+        self.model_id = model_id
+
+    @property
+    def schema(self):
+        return self.inner.schema
+
+    def apply_schema(self, schema_instance):
+        self.inner.apply_schema(schema_instance)
+
+    def set_fence_output(self, fence_output: bool | None):
+        self.inner.set_fence_output(fence_output)
+
+    @property
+    def requires_fence_output(self) -> bool:
+        return self.inner.requires_fence_output
+
+    def infer(self, batch_prompts, **kwargs):
+        yield from self.inner.infer(batch_prompts, **kwargs)
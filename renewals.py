@@ -0,0 +1,260 @@
+import argparse
+import array
+import copy
+import dataclasses
+import difflib
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import langextract as lx
+
+from instrumentation import Tally
+import treaty_chunking
+import treaty_prompt
+
+# Incremental extraction of renewal slips. Most slips renew last year's slip under the same UMR with a new
+# period, new premiums and a few changed clauses, so only the sections that differ from the prior slip go
+# to the model; the extractions of unchanged sections are carried forward with their offsets moved.
+#   python renewals.py --import last_year/extraction_results.jsonl
+#   python main2.py --source in/ --incremental
+
+UMR = re.compile(r"^[ \t#*]*UMR[^:\n]{0,10}:[\s*]*([A-Z0-9]{6,})", re.MULTILINE | re.IGNORECASE)
+
+SHINGLE_WORDS = 3 # MinHash over word 3-grams of the slip
+NUM_PERM = 64
+BANDS = 16 # LSH: 16 bands of 4 rows, slips with Jaccard >= 0.7 share a band with probability ~0.99
+ROWS = NUM_PERM // BANDS
+MIN_SIMILARITY = 0.7 # below this a slip is new business; synthetic renewals score ~0.85, unrelated slips of the same template ~0.4
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101) # fixed, signatures must stay comparable across runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def umr_of(text: str) -> str | None:
+    """The UMR written under the "UMR:" header, read without the model."""
+    match = UMR.search(text)
+    return match.group(1).upper() if match else None
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def minhash(text: str) -> list[int]:
+    """MinHash signature of the word shingles of text; matching positions estimate the Jaccard similarity."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = {_hash64(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8")) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    return [min((a * shingle + b) % _PRIME for shingle in shingles) for a, b in _PERMUTATIONS]
+
+
+def similarity(signature: list[int], other: list[int]) -> float:
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERM
+
+
+def _band_keys(signature: list[int]) -> list[int]:
+    keys = []
+    for band in range(BANDS):
+        rows = array.array("Q", signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        keys.append(_hash64(bytes([band]) + rows) >> 1) # 63 bits, fits a SQLite INTEGER
+    return keys
+
+
+class RenewalIndex:
+    """
+    Prior results in SQLite, looked up by UMR or, failing that, by MinHash/LSH near-duplicate search.
+    Every extracted slip is added, so this year's slips are next year's priors.
+    A wrong match only costs model calls: extractions are carried forward for identical section text only.
+    """
+
+    def __init__(self, db_path: str | Path = "out/renewals.sqlite"):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                umr TEXT,
+                signature BLOB NOT NULL,
+                result TEXT NOT NULL,
+                added REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                key INTEGER NOT NULL,
+                document_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_umr ON documents (umr, added);
+            CREATE INDEX IF NOT EXISTS bands_key ON bands (key);
+            CREATE INDEX IF NOT EXISTS bands_document ON bands (document_id);
+            """
+        )
+        self._db.commit()
+        self.tally = Tally() # per process, updated from the extraction threads: documents, new_business, matched_umr/_minhash, sections(_reused), calls(_full), chars(_full)
+
+    def add(self, result: lx.data.AnnotatedDocument):
+        """Index an extracted slip as a prior for later renewals, replacing an earlier result of the same document_id."""
+        text = result.text or ""
+        umr = umr_of(text) or next((e.extraction_text.upper() for e in result.extractions or [] if e.extraction_class == "umr_nr"), None)
+        signature = minhash(text)
+        row = (result.document_id, umr, array.array("Q", signature).tobytes(), json.dumps(lx.data_lib.annotated_document_to_dict(result), ensure_ascii=False), time.time())
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM bands WHERE document_id = ?", (result.document_id,))
+            self._db.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)", row)
+            self._db.executemany("INSERT INTO bands VALUES (?, ?)", [(key, result.document_id) for key in _band_keys(signature)])
+
+    def add_jsonl(self, jsonl_path: str | Path) -> int:
+        """Index every document of a results JSONL, e.g. last year's run; returns the number of documents."""
+        from io_utils import read_extraction_outputs
+        count = 0
+        for result in read_extraction_outputs(jsonl_path):
+            self.add(result)
+            count += 1
+        return count
+
+    def find_prior(self, text: str) -> tuple[lx.data.AnnotatedDocument, str] | None:
+        """The prior result of a slip and how it was found ("umr" or "minhash 0.87"), None for new business."""
+        umr = umr_of(text)
+        if umr is not None:
+            with self._lock:
+                row = self._db.execute("SELECT result FROM documents WHERE umr = ? ORDER BY added DESC LIMIT 1", (umr,)).fetchone()
+            if row is not None:
+                return lx.data_lib.dict_to_annotated_document(json.loads(row[0])), "umr"
+
+        signature = minhash(text) # only without a known UMR, the signature costs a few ms per slip
+        keys = _band_keys(signature)
+        with self._lock:
+            candidates = self._db.execute(
+                f"SELECT document_id, signature FROM documents WHERE document_id IN"
+                f" (SELECT document_id FROM bands WHERE key IN ({', '.join('?' * len(keys))}))",
+                keys
+            ).fetchall()
+            best, best_similarity = None, MIN_SIMILARITY
+            for document_id, blob in candidates:
+                score = similarity(signature, array.array("Q", blob).tolist())
+                if score >= best_similarity:
+                    best, best_similarity = document_id, score
+            if best is None:
+                return None
+            row = self._db.execute("SELECT result FROM documents WHERE document_id = ?", (best,)).fetchone()
+        return lx.data_lib.dict_to_annotated_document(json.loads(row[0])), f"minhash {best_similarity:.2f}"
+
+    def summary(self) -> dict:
+        tally = Counter(self.tally.snapshot())
+        return {
+            **tally,
+            "sections_reused_share": round(tally["sections_reused"] / tally["sections"], 3) if tally["sections"] else 0.0,
+            "calls_saved_share": round(1 - tally["calls"] / tally["calls_full"], 3) if tally["calls_full"] else 0.0,
+            "chars_saved_share": round(1 - tally["chars"] / tally["chars_full"], 3) if tally["chars_full"] else 0.0,
+        }
+
+
+@dataclasses.dataclass
+class SectionDiff:
+    unchanged: list[tuple[int, int, int]] # (new start, new end, old start) of sections with identical text
+    changed: list[tuple[int, int]] # (start, end) of new or edited sections
+    sections: int
+
+
+def _sections(text: str) -> list[tuple[int, int]]:
+    starts = treaty_chunking.section_starts(text) + [len(text)]
+    return [(start, end) for start, end in zip(starts, starts[1:]) if end > start]
+
+
+def diff_sections(old_text: str, new_text: str) -> SectionDiff:
+    """Align the sections of two slips (difflib over whole section texts) into unchanged and changed ones."""
+    old, new = _sections(old_text), _sections(new_text)
+    matcher = difflib.SequenceMatcher(None, [old_text[s:e] for s, e in old], [new_text[s:e] for s, e in new], autojunk=False)
+    unchanged, changed = [], []
+    for tag, old_from, old_to, new_from, new_to in matcher.get_opcodes():
+        if tag == "equal":
+            unchanged += [(new[j][0], new[j][1], old[i][0]) for i, j in zip(range(old_from, old_to), range(new_from, new_to))]
+        else:
+            changed += new[new_from:new_to] # "delete" has none: a removed section simply leaves nothing behind
+    return SectionDiff(unchanged, changed, len(new))
+
+
+def _carry_forward(prior: lx.data.AnnotatedDocument, diff: SectionDiff) -> list[lx.data.Extraction]:
+    """Prior extractions lying inside an unchanged section, moved to where that section is now."""
+    carried = []
+    for extraction in prior.extractions or []:
+        interval = extraction.char_interval
+        if interval is None or interval.start_pos is None:
+            continue # unaligned, no way to tell which section it came from; the changed sections are extracted anyway
+        for new_start, new_end, old_start in diff.unchanged:
+            if old_start <= interval.start_pos and interval.end_pos <= old_start + (new_end - new_start):
+                shift = new_start - old_start
+                extraction = copy.copy(extraction)
+                extraction.char_interval = lx.data.CharInterval(start_pos=interval.start_pos + shift, end_pos=interval.end_pos + shift)
+                extraction.token_interval = None # token positions were relative to the prior's chunk
+                carried.append(extraction)
+                break
+    return carried
+
+
+def extract_incremental(
+        text: str,
+        model,
+        index: RenewalIndex,
+        section_tokens: int = 512,
+        show_progress: bool = True
+) -> lx.data.AnnotatedDocument:
+    """
+    Extract a slip, re-using its prior's extractions for every section whose text did not change.
+    Slips without a prior are extracted in full with section chunking. index.tally counts model calls
+    against what a full extraction would have made.
+    """
+    full_calls = len(treaty_chunking.build_chunks(text, section_tokens))
+    found = index.find_prior(text)
+    index.tally.add(documents=1, calls_full=full_calls, chars_full=len(text))
+    if found is None:
+        index.tally.add(new_business=1, calls=full_calls, chars=len(text))
+        return treaty_prompt.extract(text, model, show_progress=show_progress, section_tokens=section_tokens)
+
+    prior, how = found
+    index.tally.add({"matched_umr" if how == "umr" else "matched_minhash": 1})
+    diff = diff_sections(prior.text or "", text)
+    groups = treaty_chunking.pack_spans(text, diff.changed, section_tokens)
+    texts = [treaty_chunking.packed_text(text, group) for group in groups]
+    results = treaty_prompt.extract_texts(texts, model, show_progress=show_progress)
+    index.tally.add(sections=diff.sections, sections_reused=len(diff.unchanged), calls=len(groups), chars=sum(len(packed) for packed in texts))
+
+    extractions = _carry_forward(prior, diff)
+    for group, result in zip(groups, results):
+        extractions += treaty_chunking.unpack_extractions(result, group)
+    extractions.sort(key=lambda e: e.char_interval.start_pos if e.char_interval and e.char_interval.start_pos is not None else len(text))
+    for number, extraction in enumerate(extractions, start=1):
+        extraction.extraction_index = number
+    return lx.data.AnnotatedDocument(text=text, extractions=extractions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index prior results for incremental renewal extraction, or show how a slip would be diffed")
+    parser.add_argument("--db", default = "out/renewals.sqlite")
+    parser.add_argument("--import", dest = "import_paths", nargs = "+", default = None, metavar = "JSONL", help = "index these results files as priors")
+    parser.add_argument("--match", nargs = "+", default = None, metavar = "MD", help = "converted slips to look up and diff against their prior")
+    args = parser.parse_args()
+
+    index = RenewalIndex(args.db)
+    for path in args.import_paths or []:
+        start = time.perf_counter()
+        print(f"{path}: {index.add_jsonl(path)} priors indexed in {time.perf_counter() - start:.1f}s")
+
+    for path in args.match or []:
+        text = Path(path).read_text(encoding = "utf-8")
+        found = index.find_prior(text)
+        if found is None:
+            print(f"{path}: no prior, full extraction")
+            continue
+        prior, how = found
+        diff = diff_sections(prior.text or "", text)
+        print(f"{path}: prior {prior.document_id} ({how}), {len(diff.unchanged)}/{diff.sections} sections unchanged, {len(treaty_chunking.pack_spans(text, diff.changed, 512))} model calls")
+        for start, end in diff.changed:
+            print(f"  changed: {text[start:end].splitlines()[0][:80] if text[start:end].strip() else '(blank)'}")
@@ -0,0 +1,145 @@
+import dataclasses
+import heapq
+import itertools
+import threading
+import time
+from pathlib import Path
+
+from instrumentation import percentile
+
+# Size-aware scheduling of batch work. A batch mixes one-page slips with 300-page wordings; in FIFO order
+# one wording holds dozens of slips behind it. Jobs are costed in estimated tokens and split into two
+# lanes: the large lane has LARGE_SLOTS of the workers to itself, the small lane gets the rest, so small
+# jobs keep flowing while the wordings run. Within a lane the shortest job goes first, with aging: the
+# priority is cost - AGING_TOKENS_PER_SECOND * seconds waited, so nothing waits forever behind a stream
+# of shorter jobs. Aging at one rate for every job keeps the order fixed over time, so the heap key is
+# simply cost + AGING_TOKENS_PER_SECOND * submit time.
+
+LARGE_TOKENS = 25_000 # estimated tokens above which a job goes to the large lane, ~30 pages of wording
+LARGE_SLOTS = 1 # workers reserved for the large lane
+AGING_TOKENS_PER_SECOND = 500 # a job that waited 10s is ranked like one 5,000 tokens shorter
+CHARS_PER_TOKEN = 4 # as treaty_chunking.estimate_tokens
+CHARS_PER_PDF_PAGE = 3_000 # before conversion, a PDF's size is estimated from its page count
+
+
+def estimate_tokens(source: str | Path, md_text: str | None = None) -> int:
+    """
+    Cost of a document in tokens: from its markdown once converted, else from the page count of a PDF, else
+    from the file size: one char per byte for text sources, one per 20 bytes for a PDF pypdfium2 cannot open.
+    """
+    if md_text is not None:
+        return len(md_text) // CHARS_PER_TOKEN
+    source = Path(source)
+    size = source.stat().st_size
+    if source.suffix.lower() != ".pdf":
+        return size // CHARS_PER_TOKEN
+    try:
+        from io_utils import pdf_page_count
+        return pdf_page_count(source) * CHARS_PER_PDF_PAGE // CHARS_PER_TOKEN
+    except Exception: # broken or encrypted PDF, the conversion will report it
+        return size // 20 // CHARS_PER_TOKEN
+
+
+@dataclasses.dataclass
+class Job:
+    item: object
+    cost: int
+    lane: str # "small" or "large"
+    submitted: float # when it was pushed, for aging
+    origin: float # when its document entered the batch, for turnaround
+    started: float = 0.0
+    finished: float = 0.0
+
+
+class LaneScheduler:
+    """
+    Jobs in two lanes, shortest first with aging; take() hands out a job when a worker slot is free for its
+    lane. Thread safe: producers push(), workers take() and finish().
+    """
+
+    def __init__(self, slots: int, large_slots: int = LARGE_SLOTS, large_tokens: int = LARGE_TOKENS, aging: float = AGING_TOKENS_PER_SECOND):
+        self.slots = max(1, slots)
+        self.large_slots = min(large_slots, self.slots - 1) # a single worker reserves nothing, lanes only order its queue
+        self.large_tokens = large_tokens
+        self.aging = aging
+        self._queues: dict[str, list] = {"small": [], "large": []}
+        self._running = {"small": 0, "large": 0}
+        self._order = itertools.count() # tie breaker, equal keys keep push order
+        self._closed = False
+        self._finished: list[Job] = []
+        self._condition = threading.Condition()
+
+    def push(self, item, cost: int, origin: float | None = None) -> Job:
+        now = time.perf_counter()
+        job = Job(item, cost, "large" if cost > self.large_tokens else "small", now, origin if origin is not None else now)
+        with self._condition:
+            heapq.heappush(self._queues[job.lane], (cost + self.aging * now, next(self._order), job))
+            self._condition.notify()
+        return job
+
+    def close(self):
+        """No more pushes: once the small lane is empty, the large lane may use every free slot."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _pick(self) -> Job | None:
+        small, large = self._queues["small"], self._queues["large"]
+        running = self._running["small"] + self._running["large"]
+        if running >= self.slots:
+            return None
+        if large and self._running["large"] < self.large_slots:
+            lane = "large"
+        elif small and (self._running["small"] < self.slots - self.large_slots or not large):
+            lane = "small" # small jobs may also take a large slot nobody is waiting for
+        elif large and not small and (self._closed or running < self.slots - 1 or not self.large_slots):
+            lane = "large" # idle slots, but one stays free for a small job that may still arrive
+        else:
+            return None
+        job = heapq.heappop(self._queues[lane])[2]
+        self._running[lane] += 1
+        job.started = time.perf_counter()
+        return job
+
+    def take(self, block: bool = True) -> Job | None:
+        """The next job for a free slot; None when nothing fits now (block=False) or all work is done (closed)."""
+        with self._condition:
+            while True:
+                job = self._pick()
+                if job is not None or not block:
+                    return job
+                if self._closed and not self._queues["small"] and not self._queues["large"]:
+                    return None
+                self._condition.wait()
+
+    def finish(self, job: Job):
+        with self._condition:
+            job.finished = time.perf_counter()
+            self._running[job.lane] -= 1
+            self._finished.append(job)
+            self._condition.notify_all()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._queues["small"]) + len(self._queues["large"]) + self._running["small"] + self._running["large"]
+
+    def report(self) -> dict:
+        """Per lane: jobs, tokens, throughput over the lane's active span, and p50/p95 turnaround from origin."""
+        with self._condition:
+            finished = list(self._finished)
+        lanes = {}
+        for lane in ("small", "large"):
+            jobs = [job for job in finished if job.lane == lane]
+            if not jobs:
+                continue
+            span = max(job.finished for job in jobs) - min(job.started for job in jobs)
+            turnaround = [job.finished - job.origin for job in jobs]
+            lanes[lane] = {
+                "jobs": len(jobs),
+                "tokens": sum(job.cost for job in jobs),
+                "jobs_per_minute": round(len(jobs) / span * 60, 1) if span > 0 else None,
+                "tokens_per_second": round(sum(job.cost for job in jobs) / span) if span > 0 else None,
+                "p50_turnaround_seconds": round(percentile(turnaround, 50), 3),
+                "p95_turnaround_seconds": round(percentile(turnaround, 95), 3),
+            }
+        return lanes
@@ -0,0 +1,223 @@
+import argparse
+import random
+import re
+import textwrap
+from pathlib import Path
+
+# Synthetic treaty slips with the structure of the example slip in treaty_prompt.py: same section
+# headers in the same order, with varying layers, premiums, clause lists and lengths. For benchmarks
+# only, the companies and numbers are made up.
+
+TYPES = [
+    "Motor Excess of Loss Reinsurance",
+    "Property Catastrophe Excess of Loss Reinsurance",
+    "Casualty Excess of Loss Reinsurance",
+    "Marine Cargo Excess of Loss Reinsurance",
+    "Property Per Risk Excess of Loss Reinsurance",
+]
+COMPANIES = ["HYDROBIUS", "ALCYONE", "PERSEPHONE", "TRITON", "KASTALIA", "EURYALE", "MELIBOEA", "AKTAION"]
+PLACES = [("Athens", "Greece"), ("Lisbon", "Portugal"), ("Valletta", "Malta"), ("Nicosia", "Cyprus"), ("Zagreb", "Croatia")]
+CURRENCIES = ["EUR", "USD", "GBP"]
+CLASSES = [
+    "Motor Insurances covering Third Party Bodily Injury, Third Party Material Damage and Passengers Liability",
+    "Property Insurances covering Fire, Allied Perils and Natural Catastrophes",
+    "General Third Party Liability and Employers Liability Insurances",
+    "Marine Cargo Insurances including Inland Transit",
+]
+CLAUSES = [
+    "Reinsurance Clause", "Ultimate Net Loss Clause", "Net Retained Lines Clause", "Premium Clause",
+    "Premium Processing Clause LSW3003 - 14/12/09", "Claims Reporting and Co-Operation Clause",
+    "Loss Settlements Clause", "Currency Conversion Clause", "Apportionment Clause", "Change In Law Clause",
+    "Local Jurisdiction Clause", "Special Cancellation Clause", "Limits and Retentions Clause",
+    "Extended Expiration Clause", "Amendments and Alterations Clause", "Hours Clause", "Sanctions Clause LMA3100",
+    "Cyber Exclusion LMA5403", "Communicable Disease Exclusion LMA5394", "Nuclear Incident Exclusion Clause",
+    "War and Civil War Exclusion Clause", "Errors and Omissions Clause", "Access to Records Clause",
+    "Arbitration Clause", "Insolvency Clause", "Reinstatement Clause", "Loss Occurring Basis Clause",
+    "Terrorism Exclusion Clause", "Pools, Associations and Syndicates Exclusion", "Seepage and Pollution Exclusion",
+]
+ORDINALS = ["1st", "2nd", "3rd", "4th", "5th"]
+WORDING = (
+    "The Reinsurer shall be liable only for the Ultimate Net Loss sustained by the Reinsured in excess of "
+    "the retention stated herein, and the liability of the Reinsurer shall not exceed the limit stated "
+    "herein in respect of any one loss occurrence. "
+)
+
+
+def amount(rng: random.Random, low: int, high: int, step: int = 5_000) -> int:
+    return rng.randrange(low // step, high // step + 1) * step
+
+
+def make_slip(rng: random.Random, index: int, length_factor: int = 1) -> str:
+    """One slip: 1-5 layers, instalment premiums per layer, 8-30 clauses, length_factor repeats of wording text."""
+    year = rng.randint(2019, 2026)
+    currency = rng.choice(CURRENCIES)
+    city, country = rng.choice(PLACES)
+    layers = rng.randint(1, 5)
+    instalments = rng.choice([1, 2, 4])
+
+    lines = [
+        f"Slip {index}",
+        "Risk Details",
+        "UMR:",
+        f"B{rng.randint(1000, 9999)}{rng.choice('ABCDEFGHJK')}{year % 100:02d}{rng.randint(0, 99999):05d}",
+        "TYPE:",
+        rng.choice(TYPES),
+        "REINSURED:",
+        f"{rng.choice(COMPANIES)} INSURANCE AND REINSURANCE S.A., {city}, {country}",
+        "PERIOD:",
+        f"Losses occurring during the period commencing 12 months from 1st January {year} to 31st December",
+        f"{year} both days inclusive Local Standard Time at place where loss occurs.",
+        "CLASS OF BUSINESS:",
+        f"Business in respect of {rng.choice(CLASSES)}.",
+        "TERRITORIAL SCOPE:",
+        f"Business underwritten in the territory of {country} but extended to cover European Union countries.",
+        "LIMITS & RETENTIONS:",
+    ]
+    retention = amount(rng, 500_000, 5_000_000, 100_000)
+    deposits = []
+    for layer in range(layers):
+        limit = amount(rng, 1_000_000, 50_000_000, 500_000)
+        lines += [
+            f"{ORDINALS[layer]} Layer",
+            f"{currency} {limit:,} Ultimate Net Loss each and every accident or loss or series of accidents or losses",
+            "arising out of one event in excess of:",
+            f"{currency} {retention:,} Ultimate Net Loss each and every accident or loss or series of accidents or losses",
+            "arising out of one event.",
+        ]
+        deposits.append(amount(rng, 20_000, 400_000, 40 * instalments))
+        retention += limit
+
+    lines.append("PREMIUM:")
+    dates = [f"1st {month} {year}" for month in ["January", "April", "July", "October"][:instalments]]
+    for layer, deposit in enumerate(deposits):
+        lines += [
+            f"{ORDINALS[layer]} Layer",
+            f"Minimum & Deposit: {currency} {deposit:,}",
+            f"Premium payable in {instalments} equal instalments of {currency} {deposit // instalments:,} each at {', '.join(dates)}",
+            "subject to LSW3000 (60 days) per each instalment.",
+        ]
+    lines += [
+        "PREMIUM PAYMENT TERMS:",
+        f"The (Re)Insured undertakes that premium will be paid in full to Reinsurers within {rng.choice([30, 60, 90])} days of inception",
+        "of this policy (or, in respect of instalment premiums, when due).",
+        "ESTIMATED PREMIUM INCOME:",
+        f"Estimated Premium Income for the period 01/01/{year} - 31/12/{year}:",
+        f"{currency} {amount(rng, 5_000_000, 200_000_000, 1_000_000):,}",
+        "TAXES PAYABLE BY THE REINSURED & ADMINISTERED BY",
+        "UNDERWRITERS:",
+        rng.choice(["None", "Insurance Premium Tax as applicable"]),
+        "CONDITIONS:",
+    ]
+    lines += [f"•  {clause}" for clause in rng.sample(CLAUSES, rng.randint(8, len(CLAUSES)))]
+    if length_factor > 1: # long wordings: the same structure with pages of clause text behind it
+        lines.append("WORDING:")
+        lines += textwrap.wrap(WORDING * rng.randint(length_factor, 4 * length_factor), 100)
+    return "\n".join(lines) + "\n"
+
+
+def make_endorsement(rng: random.Random, index: int) -> str:
+    """A short endorsement to a slip, a few hundred characters: UMR, cedent, effective date and one change."""
+    year = rng.randint(2019, 2026)
+    currency = rng.choice(CURRENCIES)
+    city, country = rng.choice(PLACES)
+    old_clause, new_clause = rng.sample(CLAUSES, 2)
+    change = rng.choice([
+        f"the {old_clause} is deleted and replaced by the {new_clause}.",
+        f"the Estimated Premium Income is amended to {currency} {amount(rng, 5_000_000, 200_000_000, 1_000_000):,}.",
+        f"the Reinsured's address is amended to {city}, {country}.",
+    ])
+    lines = [
+        f"Endorsement {index}",
+        "UMR:",
+        f"B{rng.randint(1000, 9999)}{rng.choice('ABCDEFGHJK')}{year % 100:02d}{rng.randint(0, 99999):05d}",
+        "REINSURED:",
+        f"{rng.choice(COMPANIES)} INSURANCE AND REINSURANCE S.A., {city}, {country}",
+        "EFFECTIVE DATE:",
+        f"1st {rng.choice(['February', 'March', 'June', 'September'])} {year}",
+        "ENDORSEMENT:",
+        f"It is hereby noted and agreed that with effect from the effective date {change}",
+        "All other terms and conditions remain unchanged.",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def renew(rng: random.Random, slip: str, changed_clauses: int = 2) -> str:
+    """
+    Next year's renewal of a slip: same UMR, cedent, layers and wording, one year later, new deposit
+    premiums and estimated premium income, and changed_clauses conditions swapped for others.
+    """
+    lines = re.sub(r"\b(20\d\d)\b", lambda m: str(int(m.group(1)) + 1), slip).splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("Minimum & Deposit:") or lines[i - 1].startswith("Estimated Premium Income"):
+            lines[i] = re.sub(r"[\d,]{5,}", lambda m: f"{int(int(m.group(0).replace(',', '')) * rng.uniform(1.0, 1.15)):,}", line)
+    clause_lines = [i for i, line in enumerate(lines) if line.startswith("•  ")]
+    unused = [clause for clause in CLAUSES if f"•  {clause}" not in lines]
+    for i in rng.sample(clause_lines, min(changed_clauses, len(clause_lines), len(unused))):
+        lines[i] = f"•  {unused.pop(rng.randrange(len(unused)))}"
+    return "\n".join(lines) + "\n"
+
+
+def _pdf_string(line: str) -> str:
+    line = line.encode("cp1252", errors="replace").decode("latin-1") # WinAnsiEncoding of the standard font
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(text: str, path: str | Path, lines_per_page: int = 60):
+    """Minimal text-only PDF (Helvetica, one line per text line), enough for MarkItDown to convert."""
+    lines = [wrapped for line in text.splitlines() for wrapped in (textwrap.wrap(line, 110) or [""])]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, page in enumerate(pages):
+        stream = "BT /F1 9 Tf 12 TL 50 760 Td\n" + "\n".join(f"({_pdf_string(line)}) '" for line in page) + "\nET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>")
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    Path(path).write_bytes(bytes(out))
+
+
+def generate(out_dir: str | Path, count: int, pdf_share: float = 0.1, long_share: float = 0.05, seed: int = 0) -> list[Path]:
+    """
+    Write count slips to out_dir as slip_00000.txt/.pdf; pdf_share of them as PDF, long_share of them
+    with pages of wording text. The same seed always gives the same slips.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        text = make_slip(rng, index + 1, length_factor=20 if rng.random() < long_share else 1)
+        if rng.random() < pdf_share:
+            path = out_dir / f"slip_{index:05d}.pdf"
+            write_pdf(text, path)
+        else:
+            path = out_dir / f"slip_{index:05d}.txt"
+            path.write_text(text, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic treaty slips for benchmarks")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type = int, default = 100)
+    parser.add_argument("--pdf-share", type = float, default = 0.1, help = "share of slips written as PDF")
+    parser.add_argument("--long-share", type = float, default = 0.05, help = "share of slips with pages of wording text")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    paths = generate(args.out_dir, args.count, args.pdf_share, args.long_share, args.seed)
+    print(f"{len(paths)} slips in {args.out_dir}")
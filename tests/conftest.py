@@ -0,0 +1,36 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# the modules live flat at the repo root, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def rng():
+    return random.Random(0)
+
+
+@pytest.fixture
+def slip(rng):
+    """A synthetic slip with three layers, as bench_*.py use them."""
+    import synthetic_slips
+
+    return synthetic_slips.make_slip(rng, 1)
+
+
+@pytest.fixture
+def fake_model(monkeypatch, tmp_path):
+    """treaty_pipeline talking to fake_model_server.py, with its caches and results in tmp_path."""
+    import treaty_pipeline
+    from fake_model_server import start_server
+
+    server = start_server()
+    monkeypatch.setattr(treaty_pipeline, "MODEL_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.chdir(tmp_path) # conversion and extraction caches, results
+    treaty_pipeline.get_model.cache_clear()
+    yield server
+    server.shutdown()
+    treaty_pipeline.get_model.cache_clear()
@@ -0,0 +1,53 @@
+import langextract as lx
+import pytest
+
+from alignment_index import AhoCorasick, IndexedResolver, align_exact, mask_spans
+
+TEXT = "four and four and FOUR\nthen 1st July 2024 and\n1st  July 2024"
+
+
+def aligned(resolver, texts: list[str], text: str) -> list[tuple[int, int] | None]:
+    extractions = [lx.data.Extraction(extraction_class="value", extraction_text=t) for t in texts]
+    return [
+        (e.char_interval.start_pos, e.char_interval.end_pos) if e.char_interval else None
+        for e in resolver.align(extractions, text, 0, 0)
+    ]
+
+
+@pytest.mark.parametrize("texts", [
+    ["four", "four", "four"], # more extractions than verbatim occurrences, the last differs in case
+    ["1st July 2024", "1st July 2024"], # the second occurrence differs in whitespace
+    ["four", "four", "four", "1st July 2024", "1st July 2024"],
+    ["FOUR", "1st July  2024"], # no verbatim occurrence at all
+])
+def test_same_offsets_as_lx_resolver(texts):
+    assert aligned(IndexedResolver(), texts, TEXT) == aligned(lx.resolver.Resolver(), texts, TEXT)
+
+
+def test_repeated_strings_take_distinct_occurrences_in_order():
+    assert aligned(IndexedResolver(), ["four", "four", "four"], TEXT) == [(0, 4), (9, 13), (18, 22)]
+
+
+def test_char_offset_is_added():
+    extractions = [lx.data.Extraction(extraction_class="value", extraction_text="July 2024")]
+    assert align_exact(extractions, TEXT, char_offset=100) == []
+    assert (extractions[0].char_interval.start_pos, extractions[0].char_interval.end_pos) == (132, 141)
+
+
+def test_leftovers_do_not_reuse_taken_spans():
+    text = "Premium EUR 100,000 payable in four instalments"
+    texts = ["EUR 100,000", "premium eur 100 000"] # the second is no substring, WordAligner aligns it
+    spans = aligned(IndexedResolver(), texts, text)
+    assert spans[0] == (8, 19)
+    assert spans[1] is None or spans[1] != spans[0]
+
+
+def test_mask_keeps_length_and_symbols():
+    masked = mask_spans("EUR 1,000.50 due", [(0, 12)])
+    assert len(masked) == len("EUR 1,000.50 due")
+    assert masked[3:] == " 0,000.00 due"
+    assert "EUR" not in masked
+
+
+def test_aho_corasick_finds_overlapping_occurrences():
+    assert AhoCorasick(["aa", "a", "ab"]).find_all("aab") == {"a": [0, 1], "aa": [0], "ab": [1]}
@@ -0,0 +1,45 @@
+import asyncio
+import itertools
+import random
+import threading
+
+import pytest
+
+import extractor
+from async_engine import ThrottledModel
+from fake_model_server import FakeModelHandler, start_server
+
+HEADERS = ["ALPHA", "BRAVO", "CHARLIE", "DELTA", "ECHO", "FOXTROT", "GOLF", "HOTEL", "INDIA", "JULIETT", "KILO", "LIMA"]
+
+
+@pytest.fixture
+def flaky_server(monkeypatch):
+    draws = itertools.cycle([0.0, 0.9, 0.9]) # fail_rate draws: every third call is answered with 429 or 503
+    monkeypatch.setattr(random, "random", lambda: next(draws))
+    server = start_server(fail_rate=0.3)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    FakeModelHandler.fail_rate = 0.0
+
+
+def test_retries_and_keeps_order(flaky_server, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path) # extraction cache
+    models = []
+
+    class RecordingThrottledModel(ThrottledModel):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            models.append(self)
+
+    monkeypatch.setattr(extractor, "ThrottledModel", RecordingThrottledModel)
+    texts = [f"{header}:\nclause number {number} of the slip." for number, header in enumerate(HEADERS)]
+
+    results = asyncio.run(extractor.run_extractions_async(
+        texts, max_in_flight=4, max_documents=3, model_url=flaky_server, bypass_cache=True, backoff_seconds=0.01
+    ))
+
+    assert [result.text for result in results] == texts
+    assert [[e.extraction_text for e in result.extractions] for result in results] == [[header] for header in HEADERS]
+    [model] = models
+    assert model.retries > 0 # the 429/503 answers were retried, not returned as failures
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("model-call")] # the pool ended with the call
@@ -0,0 +1,33 @@
+import langextract as lx
+
+import cascade
+
+CHUNK = "UMR:\nB0507RE2500123\nTYPE:\nProperty Excess of Loss\n"
+
+
+def extraction(extraction_class: str, text: str, attributes: dict | None = None, aligned: bool = True) -> lx.data.Extraction:
+    start = CHUNK.index(text)
+    return lx.data.Extraction(
+        extraction_class,
+        text,
+        char_interval=lx.data.CharInterval(start_pos=start, end_pos=start + len(text)) if aligned else None,
+        alignment_status=lx.data.AlignmentStatus.MATCH_EXACT if aligned else None,
+        attributes=attributes,
+    )
+
+
+def check(*extractions) -> list[str]:
+    return cascade.check(lx.data.AnnotatedDocument(text=CHUNK, extractions=list(extractions)), CHUNK)
+
+
+def test_complete_answer_passes():
+    assert check(extraction("umr_nr", "B0507RE2500123"), extraction("reinsurance_type", "Property Excess of Loss")) == []
+
+
+def test_escalation_reasons():
+    assert check() == ["empty"]
+    assert cascade.check(lx.data.AnnotatedDocument(text="\n", extractions=[]), "\n") == [] # nothing to extract
+    assert check(extraction("umr_nr", "B0507RE2500123"), extraction("reinsurance_type", "Property Excess of Loss", {"colour": "red"})) == ["schema"]
+    assert check(extraction("umr_nr", "B0507RE2500123", aligned=False), extraction("reinsurance_type", "Property Excess of Loss")) == ["alignment"]
+    assert check(extraction("umr_nr", "B0507RE2500123")) == ["expected"] # the TYPE section has no reinsurance_type
+    assert check(extraction("umr", "B0507RE2500123", aligned=False)) == ["schema", "alignment", "expected"]
@@ -0,0 +1,16 @@
+import pytest
+
+from io_utils import collect_sources
+
+
+def test_rejects_sources_sharing_a_stem(tmp_path):
+    for name in ("slip.pdf", "slip.txt", "other.txt"):
+        (tmp_path / name).write_text("UMR:\nB0000", encoding="utf-8")
+    with pytest.raises(ValueError, match="slip.pdf, .*slip.txt"):
+        collect_sources(str(tmp_path))
+
+
+def test_distinct_stems(tmp_path):
+    for name in ("b.txt", "a.pdf", "notes.md"):
+        (tmp_path / name).write_text("UMR:\nB0000", encoding="utf-8")
+    assert [p.name for p in collect_sources(str(tmp_path))] == ["a.pdf", "b.txt"]
@@ -0,0 +1,77 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from columnar_export import _flatten, export_parquet, normalize
+
+
+def row(document_id: str, index: int, extraction_class: str, text: str, **attributes) -> dict:
+    return {"extraction_class": extraction_class, "extraction_text": text, "extraction_index": index, "attributes": attributes}
+
+
+def normalized(extractions: list[dict], document_id: str = "slip_1") -> list[dict]:
+    table = normalize(_flatten([{"document_id": document_id, "extractions": extractions}]))
+    return table.to_pylist()
+
+
+@pytest.mark.parametrize("text, currency, amount", [
+    ("USD 3,000,000 each and every loss", "USD", 3_000_000.0),
+    ("USD 3,000,000.50", "USD", 3_000_000.5),
+    ("EUR 3.000.000", "EUR", 3_000_000.0), # continental thousands, not 3.0
+    ("EUR 1.000,50", "EUR", 1000.5),
+    ("EUR 3 000 000", "EUR", 3_000_000.0),
+    ("EUR3000000", "EUR", 3_000_000.0), # code directly followed by the digits
+    ("£2,500,000", "GBP", 2_500_000.0),
+    ("USD 12.5", "USD", 12.5),
+    ("EUR 3.000", "EUR", None), # three thousand or three: null rather than a guess
+    ("USD 5 2024", "USD", 5.0), # a year is no thousands group
+    ("Unlimited", None, None),
+    ("100,000 tonnes", None, None), # no currency, no amount
+])
+def test_amounts(text, currency, amount):
+    [parsed] = normalized([row("slip_1", 1, "limit", text)])
+    assert (parsed["currency"], parsed["amount"]) == (currency, amount)
+
+
+def test_unlimited_and_dates():
+    parsed = normalized([
+        row("slip_1", 1, "limit", "Unlimited in the aggregate"),
+        row("slip_1", 2, "period", "from 1st January 2024 to 31st December 2024"),
+        row("slip_1", 3, "period", "31/12/2024"),
+        row("slip_1", 4, "period", "32/13/2024"),
+    ])
+    assert [p["unlimited"] for p in parsed] == [True, False, False, False]
+    assert [p["date"] for p in parsed] == [None, datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), None]
+
+
+def test_cedent_is_the_role_cedent_company_before_any_other():
+    parsed = normalized([
+        row("slip_1", 1, "company", "Broker Ltd", role="broker"),
+        row("slip_1", 2, "company", "Reinsurer AG", role="reinsurer"),
+        row("slip_1", 3, "company", "Cedent SA", role="cedent"),
+    ])
+    assert {p["cedent"] for p in parsed} == {"Cedent SA"}
+
+
+def test_cedent_falls_back_to_the_first_company():
+    parsed = normalized([row("slip_2", 1, "umr", "B1234"), row("slip_2", 2, "company", "Only Co", role="reinsurer")], "slip_2")
+    assert {p["cedent"] for p in parsed} == {"Only Co"}
+
+
+def test_export_keeps_every_row(tmp_path):
+    import json
+
+    jsonl = tmp_path / "extraction_results.jsonl"
+    documents = [
+        {"document_id": f"slip_{n}", "extractions": [row(f"slip_{n}", i, "limit", f"USD {i},000,000") for i in range(1, 4)]}
+        for n in range(5)
+    ]
+    jsonl.write_text("".join(json.dumps(d) + "\n" for d in documents), encoding="utf-8")
+    out_path, rows = export_parquet(jsonl, tmp_path / "extractions.parquet", batch_rows=4)
+    assert rows == 15
+
+    import pyarrow.parquet as pq
+    table = pq.read_table(out_path)
+    assert table["amount"].to_pylist() == [1e6, 2e6, 3e6] * 5
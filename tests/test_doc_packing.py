@@ -0,0 +1,45 @@
+import langextract as lx
+
+import doc_packing
+from instrumentation import Tally
+
+
+def extraction(text: str, start: int | None, end: int | None = None) -> lx.data.Extraction:
+    interval = lx.data.CharInterval(start_pos=start, end_pos=end) if start is not None else None
+    return lx.data.Extraction(extraction_class="umr_nr", extraction_text=text, char_interval=interval)
+
+
+def test_pack_documents_respects_budget():
+    texts = ["a" * 400, "b" * 400, "c" * 400, "d" * 4000] # 100 tokens each plus the delimiter, the last over budget
+    groups = doc_packing.pack_documents(texts, max_tokens=250)
+    assert groups == [[0, 1], [2], [3]]
+    assert [i for group in groups for i in group] == list(range(len(texts)))
+
+
+def test_packed_text_starts():
+    texts = ["UMR: A1", "UMR: B22", "UMR: C333"]
+    packed, starts = doc_packing.packed_text(texts, [0, 2])
+    assert [packed[start:start + len(texts[i])] for start, i in zip(starts, [0, 2])] == [texts[0], texts[2]]
+    assert "=== DOCUMENT 2 ===" in packed and texts[1] not in packed
+
+
+def test_unpack_offsets_relative_to_each_document(monkeypatch):
+    monkeypatch.setattr(doc_packing, "tally", Tally())
+    texts = ["UMR: A1", "UMR: B22"]
+    group = [0, 1]
+    packed, starts = doc_packing.packed_text(texts, group)
+    b_start = packed.index("B22")
+    result = lx.data.AnnotatedDocument(text=packed, extractions=[
+        extraction("A1", packed.index("A1"), packed.index("A1") + 2),
+        extraction("B22", b_start, b_start + 3),
+        extraction("DOCUMENT", packed.index("DOCUMENT 2"), packed.index("DOCUMENT 2") + 8), # on a delimiter
+        extraction("A1\n=== DOCUMENT 2 ===\nUMR", packed.index("A1"), b_start - 1), # runs into the next document
+        extraction("lost", None), # unaligned
+    ])
+
+    first, second = doc_packing.unpack(result, texts, group, starts)
+
+    assert [(e.extraction_text, e.char_interval.start_pos, e.char_interval.end_pos) for e in first] == [("A1", 5, 7)]
+    assert [(e.extraction_text, e.char_interval.start_pos, e.char_interval.end_pos) for e in second] == [("B22", 5, 8)]
+    assert texts[1][5:8] == "B22"
+    assert doc_packing.tally.snapshot() == {"dropped": 2, "unaligned": 1}
@@ -0,0 +1,54 @@
+import sqlite3
+
+import langextract as lx
+import pytest
+
+from extraction_store import ExtractionStore
+from io_utils import JsonlWriter
+
+
+def document(document_id: str, cedent: str, umr: str) -> lx.data.AnnotatedDocument:
+    text = f"UMR:\n{umr}\nREINSURED:\n{cedent}\n"
+    return lx.data.AnnotatedDocument(document_id=document_id, text=text, extractions=[
+        lx.data.Extraction("umr_nr", umr, char_interval=lx.data.CharInterval(start_pos=5, end_pos=5 + len(umr)), extraction_index=1),
+        lx.data.Extraction("company", cedent, extraction_index=2, attributes={"role": ["cedent", "insured"]}),
+    ])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExtractionStore(tmp_path / "extractions.sqlite")
+    store.add_many([
+        document("slip_2", "Hydrobius Re", "B0507RE2500123"),
+        document("slip_1", "Euryale Insurance", "A661997MP00001"),
+    ])
+    return store
+
+
+def test_find_filters(store):
+    assert [row["document_id"] for row in store.find(extraction_class="company")] == ["slip_1", "slip_2"] # document order
+    assert store.find(extraction_class="umr_nr", text="b0507re2500123")[0]["document_id"] == "slip_2" # case insensitive
+    assert store.documents_for(extraction_class="company", attribute=("role", "INSURED")) == ["slip_1", "slip_2"] # each list item indexed
+    assert [row["extraction_text"] for row in store.find(search="hydrobius")] == ["Hydrobius Re"]
+    row, = store.find(document_id="slip_1", extraction_class="umr_nr")
+    assert (row["char_start"], row["char_end"], row["attributes"]) == (5, 19, {})
+    assert len(store.find(limit=1)) == 1
+
+
+def test_add_replaces_document(store):
+    store.add(document("slip_1", "Pelagos Re", "A661997MP00001"))
+    assert store.find(search="euryale") == []
+    assert store.find(document_id="slip_1", extraction_class="company")[0]["extraction_text"] == "Pelagos Re"
+    assert store.stats() == {"documents": 2, "extractions": 4}
+
+
+def test_source_and_results_path(tmp_path):
+    store = ExtractionStore(tmp_path / "extractions.sqlite")
+    results = tmp_path / "extraction_results.jsonl"
+    with JsonlWriter(results, append=False) as writer:
+        writer.write(document("slip_1", "Euryale Insurance", "A661997MP00001"))
+    store.add(document("slip_2", "Hydrobius Re", "B0507RE2500123"), "in/slip_2.pdf", results)
+    store.add_jsonl(results)
+
+    rows = sqlite3.connect(tmp_path / "extractions.sqlite").execute("SELECT document_id, source, results_path FROM documents ORDER BY 1").fetchall()
+    assert rows == [("slip_1", None, str(results)), ("slip_2", "in/slip_2.pdf", str(results))]
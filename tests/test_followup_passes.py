@@ -0,0 +1,32 @@
+import langextract as lx
+
+import followup_passes
+
+
+def result(*extractions: tuple[str, str | None]) -> lx.data.AnnotatedDocument:
+    return lx.data.AnnotatedDocument(text="", extractions=[
+        lx.data.Extraction(extraction_class, "x", attributes={"layer": layer} if layer else None) for extraction_class, layer in extractions
+    ])
+
+
+def test_missing_classes_and_layers(slip):
+    complete = [("umr_nr", None), ("reinsurance_type", None), ("company", None), ("period", None)]
+    complete += [(extraction_class, f"{n}{suffix} Layer") for extraction_class in followup_passes.LAYERED for n, suffix in ((1, "st"), (2, "nd"), (3, "rd"))]
+    assert followup_passes.missing(result(*complete), slip) == []
+
+    gaps = followup_passes.missing(result(*[pair for pair in complete if pair not in (("umr_nr", None), ("limits", "2nd Layer"))]), slip)
+    assert gaps == [("umr_nr", None), ("limits", "2")]
+    assert followup_passes.missing(result(*complete[1:4]), slip)[-3:] == [("limits", None), ("retentions", None), ("premium", None)]
+
+
+def test_missing_present_only_checks_the_chunk():
+    chunk = "UMR:\nB0507RE2500123\nPERIOD:\n1st January 2025 to 31st December 2025\n"
+    assert followup_passes.missing(result(), chunk, present_only=True) == [("umr_nr", None), ("period", None)]
+    assert followup_passes.missing(result(("umr_nr", None), ("period", None)), chunk, present_only=True) == []
+
+
+def test_sections_join_wrapped_headers():
+    text = "TAXES PAYABLE BY THE REINSURED & ADMINISTERED BY\nUNDERWRITERS:\nNone\nLIMITS & RETENTIONS:\n1st Layer\n"
+    assert [header for header, _, _ in followup_passes.sections(text)] == [
+        "TAXES PAYABLE BY THE REINSURED & ADMINISTERED BY UNDERWRITERS", "LIMITS & RETENTIONS",
+    ]
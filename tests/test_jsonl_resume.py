@@ -0,0 +1,43 @@
+import langextract as lx
+
+from checkpoint import Manifest
+from io_utils import JsonlWriter, cut_torn_line, read_extraction_outputs
+
+
+def make_result(document_id: str) -> lx.data.AnnotatedDocument:
+    text = f"UMR:\nB0000{document_id}"
+    extraction = lx.data.Extraction(extraction_class="umr", extraction_text=f"B0000{document_id}", extraction_index=1)
+    return lx.data.AnnotatedDocument(document_id=document_id, text=text, extractions=[extraction])
+
+
+def test_resume_after_torn_line(tmp_path):
+    results = tmp_path / "extraction_results.jsonl"
+    manifest = Manifest(tmp_path / "manifest.sqlite")
+    for number, document_id in enumerate(("slip_a", "slip_b", "slip_c"), start=1):
+        manifest.mark_converted(str(number), f"in/{document_id}.txt", document_id)
+
+    with JsonlWriter(results, append=False) as writer:
+        writer.write(make_result("slip_a"))
+        writer.write(make_result("slip_b"))
+    with open(results, "a", encoding="utf-8") as f:
+        f.write('{"extractions": [{"extraction_cl') # the process died mid-write of slip_c
+
+    manifest.reconcile(results)
+    assert [manifest.is_extracted(key) for key in ("1", "2", "3")] == [True, True, False]
+
+    with JsonlWriter(results, append=True) as writer: # the resumed run redoes slip_c
+        writer.write(make_result("slip_c"))
+
+    assert [result.document_id for result in read_extraction_outputs(results)] == ["slip_a", "slip_b", "slip_c"]
+
+
+def test_cut_torn_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_bytes(b'{"a": 1}\n' * 10_000 + b'{"b"')
+    assert cut_torn_line(path, block_size=3) == 4
+    assert path.read_bytes() == b'{"a": 1}\n' * 10_000
+    assert cut_torn_line(path) == 0 # a complete file is left alone
+
+    path.write_bytes(b'{"only torn')
+    assert cut_torn_line(path) == 11
+    assert path.read_bytes() == b""
@@ -0,0 +1,47 @@
+import langextract as lx
+
+import synthetic_slips
+from renewals import RenewalIndex, _carry_forward, diff_sections
+
+
+def extraction(text: str, source: str, extraction_class: str = "conditions") -> lx.data.Extraction:
+    start = source.index(text)
+    return lx.data.Extraction(extraction_class, text, char_interval=lx.data.CharInterval(start_pos=start, end_pos=start + len(text)))
+
+
+def test_diff_sections_finds_changed_sections(slip):
+    renewal = slip.replace("TYPE:\n", "NEW SECTION:\nadded\nTYPE:\n").replace("Cyber Exclusion LMA5403", "Sanctions Clause")
+    diff = diff_sections(slip, renewal)
+    changed = [renewal[start:end] for start, end in diff.changed]
+    assert changed == ["NEW SECTION:\nadded\n", renewal[renewal.index("CONDITIONS:"):]]
+    assert all(renewal[new_start:new_end] == slip[old_start:old_start + new_end - new_start] for new_start, new_end, old_start in diff.unchanged)
+    assert len(diff.unchanged) + len(diff.changed) == diff.sections
+
+
+def test_carry_forward_moves_unchanged_and_drops_changed(slip):
+    renewal = slip.replace("TYPE:\n", "NEW SECTION:\nadded\nTYPE:\n").replace("Cyber Exclusion LMA5403", "Sanctions Clause")
+    umr = slip[slip.index("UMR:\n") + 5:slip.index("\nTYPE:")]
+    prior = lx.data.AnnotatedDocument(text=slip, extractions=[
+        extraction(umr, slip, "umr_nr"),
+        extraction("Cyber Exclusion LMA5403", slip), # in the edited CONDITIONS section
+        lx.data.Extraction("taxes", "None"), # unaligned
+    ])
+
+    carried = _carry_forward(prior, diff_sections(slip, renewal))
+
+    assert [(e.extraction_class, renewal[e.char_interval.start_pos:e.char_interval.end_pos]) for e in carried] == [("umr_nr", umr)]
+    assert prior.extractions[0].char_interval.start_pos == slip.index(umr) # the prior is left as it was
+
+
+def test_find_prior_by_umr_and_minhash(tmp_path, rng, slip):
+    index = RenewalIndex(tmp_path / "renewals.sqlite")
+    index.add(lx.data.AnnotatedDocument(document_id="slip_1", text=slip, extractions=[]))
+    renewal = synthetic_slips.renew(rng, slip)
+
+    prior, how = index.find_prior(renewal)
+    assert (prior.document_id, how) == ("slip_1", "umr")
+
+    umr = slip[slip.index("UMR:\n") + 5:slip.index("\nTYPE:")]
+    prior, how = index.find_prior(renewal.replace(umr, "NEWUMR00001"))
+    assert prior.document_id == "slip_1" and how.startswith("minhash")
+    assert index.find_prior(synthetic_slips.make_slip(rng, 2)) is None # another cedent's slip is new business
@@ -0,0 +1,24 @@
+from scheduler import LaneScheduler
+
+
+def test_scheduler_shortest_first_and_large_lane():
+    scheduler = LaneScheduler(slots=2, large_slots=1, large_tokens=1000, aging=0)
+    for name, cost in [("wording", 5000), ("long slip", 800), ("slip", 100)]:
+        scheduler.push(name, cost)
+    first, second = scheduler.take(), scheduler.take()
+    assert (first.item, first.lane) == ("wording", "large")
+    assert (second.item, second.lane) == ("slip", "small") # shortest first within the lane
+    assert scheduler.take(block=False) is None # both slots busy
+    scheduler.finish(second)
+    assert scheduler.take(block=False).item == "long slip"
+
+
+def test_scheduler_large_jobs_use_free_slots_once_closed():
+    scheduler = LaneScheduler(slots=2, large_slots=1, large_tokens=1000, aging=0)
+    scheduler.push("wording 1", 5000)
+    scheduler.push("wording 2", 6000)
+    assert scheduler.take().item == "wording 1"
+    assert scheduler.take(block=False) is None # the other slot waits for a small job that may still come
+    scheduler.close()
+    assert scheduler.take(block=False).item == "wording 2"
+    assert scheduler.pending() == 2
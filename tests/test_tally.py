@@ -0,0 +1,24 @@
+import sys
+import threading
+
+from instrumentation import Tally
+
+
+def test_add_from_threads_loses_nothing():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6) # switch threads as often as possible, a lost update would show
+    tally = Tally()
+
+    def count():
+        for _ in range(20_000):
+            tally.add(prompts=1, prefix_tokens=3)
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert tally.snapshot() == {"prompts": 160_000, "prefix_tokens": 480_000}
@@ -0,0 +1,30 @@
+import langextract as lx
+
+import treaty_chunking
+
+
+def test_pack_spans_groups_within_budget(slip):
+    starts = treaty_chunking.section_starts(slip) + [len(slip)]
+    sections = list(zip(starts, starts[1:]))
+    spans = [sections[1], sections[4], sections[8]] # TYPE, PERIOD and PREMIUM, the last one over budget on its own
+    groups = treaty_chunking.pack_spans(slip, spans, max_tokens=64)
+    assert groups[0] == [sections[1], sections[4]] # scattered sections share a call
+    assert all(len(treaty_chunking.packed_text(slip, group)) <= 64 * treaty_chunking.CHARS_PER_TOKEN for group in groups)
+    assert "".join(slip[start:end] for group in groups for start, end in group) == "".join(slip[start:end] for start, end in spans)
+
+
+def test_unpack_extractions_maps_back_to_full_text(slip):
+    umr = slip.index("UMR:")
+    period = slip.index("PERIOD:")
+    group = [(umr, slip.index("\n", umr + 5)), (period, period + len("PERIOD:"))]
+    packed = treaty_chunking.packed_text(slip, group)
+    extractions = [
+        lx.data.Extraction("umr_nr", "UMR", char_interval=lx.data.CharInterval(start_pos=0, end_pos=3)),
+        lx.data.Extraction("period", "PERIOD", char_interval=lx.data.CharInterval(start_pos=packed.index("PERIOD"), end_pos=packed.index("PERIOD") + 6)),
+        lx.data.Extraction("period", "PERIOD:\nmore", char_interval=lx.data.CharInterval(start_pos=packed.index("PERIOD"), end_pos=len(packed) + 5)),
+    ]
+    result = lx.data.AnnotatedDocument(text=packed, extractions=extractions)
+
+    unpacked = treaty_chunking.unpack_extractions(result, group)
+
+    assert [slip[e.char_interval.start_pos:e.char_interval.end_pos] for e in unpacked] == ["UMR", "PERIOD", "PERIOD:"] # the last one cut at its piece
@@ -0,0 +1,40 @@
+import watch_folder
+from checkpoint import Manifest
+
+
+class RecordingWorker:
+    def __init__(self):
+        self.jobs = []
+
+    def run_job(self, job: dict) -> dict:
+        self.jobs.append(job)
+        return {**job, "status": "ok"}
+
+
+def settle(service: watch_folder.IngestService, now: float = 0.0):
+    service.rescan(now)
+    service.promote(now) # first look at the files
+    service.promote(now + 1) # unchanged since, queued
+
+
+def test_same_stem_is_refused(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(watch_folder, "DEBOUNCE_SECONDS", 0.5)
+    monkeypatch.setattr(watch_folder, "STATUS_PATH", str(tmp_path / "watch_status"))
+    directory = tmp_path / "in"
+    directory.mkdir()
+    (directory / "slip.pdf").write_text("a pdf", encoding="utf-8")
+    manifest = Manifest(tmp_path / "manifest.sqlite")
+    service = watch_folder.IngestService(directory, RecordingWorker(), manifest, workers=1, poll=True)
+    settle(service)
+    service.close()
+    assert [job["document_id"] for job in service.worker.jobs] == ["slip"]
+
+    (directory / "slip.txt").write_text("same stem", encoding="utf-8")
+    (directory / "other.txt").write_text("another slip", encoding="utf-8")
+    service = watch_folder.IngestService(directory, RecordingWorker(), manifest, workers=1, poll=True) # restarted, stems from the manifest
+    settle(service)
+    service.close()
+
+    assert [job["source"] for job in service.worker.jobs] == [str(directory / "other.txt")]
+    assert service.tally["refused"] == 1 and service.tally["skipped"] == 1
+    assert "refused: same name stem as slip.pdf" in capsys.readouterr().out
@@ -0,0 +1,28 @@
+import synthetic_slips
+from io_utils import read_extraction_outputs
+
+
+def test_restarted_worker_appends_after_torn_line(fake_model, rng, tmp_path):
+    from worker import Worker
+
+    sources = []
+    for number in range(1, 4):
+        source = tmp_path / f"slip_{number}.txt"
+        source.write_text(synthetic_slips.make_slip(rng, number), encoding="utf-8")
+        sources.append(source)
+    results = tmp_path / "extraction_results.jsonl"
+
+    worker = Worker(str(results))
+    assert worker.run_job({"source": str(sources[0])})["status"] == "ok"
+    worker.close()
+    with open(results, "a", encoding="utf-8") as f:
+        f.write('{"extractions": [{"extraction_cl') # killed mid-write of the next job
+
+    worker = Worker(str(results)) # e.g. watch_folder.py restarted on the same results file
+    for source in sources[1:]:
+        assert worker.run_job({"source": str(source)})["status"] == "ok"
+    worker.close()
+
+    documents = list(read_extraction_outputs(results))
+    assert [document.document_id for document in documents] == ["slip_1", "slip_2", "slip_3"]
+    assert all(document.extractions for document in documents)
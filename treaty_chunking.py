@@ -0,0 +1,145 @@
+import bisect
+import dataclasses
+import re
+
+import langextract as lx
+
+# uppercase "KEY:" section headers of a treaty slip, e.g. "UMR:", "LIMITS & RETENTIONS:", "PREMIUM PAYMENT TERMS:"
+HEADER = re.compile(r"^[ \t#*]*[A-Z][A-Z0-9 &/()',.-]{1,60}:", re.MULTILINE)
+# an all-caps line without a colon right above a header is the first half of a wrapped header,
+# e.g. "TAXES PAYABLE BY THE REINSURED & ADMINISTERED BY" / "UNDERWRITERS:"
+WRAPPED_HEADER_LINE = re.compile(r"^[ \t#*]*[A-Z][A-Z &/()'-]+[ \t]*$")
+
+CHARS_PER_TOKEN = 4 # rough average for English/markdown, good enough for budgeting
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclasses.dataclass
+class Chunk:
+    start: int # offset of the chunk in the document
+    end: int
+    text: str
+
+
+def section_starts(text: str) -> list[int]:
+    """Offsets where a section begins; 0 is always included for any preamble before the first header."""
+    starts = [0]
+    for match in HEADER.finditer(text):
+        start = match.start()
+        line_before_end = start - 1
+        if line_before_end > 0:
+            line_before_start = text.rfind("\n", 0, line_before_end) + 1
+            if WRAPPED_HEADER_LINE.match(text, line_before_start, line_before_end):
+                start = line_before_start
+        if start > starts[-1]:
+            starts.append(start)
+    return starts
+
+
+def _split_long(text: str, start: int, end: int, max_chars: int) -> list[tuple[int, int]]:
+    """Split an oversized section on line breaks, or hard at max_chars if a single line is longer."""
+    pieces = []
+    while end - start > max_chars:
+        cut = text.rfind("\n", start + 1, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        else:
+            cut += 1 # keep the newline with the first piece
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def build_chunks(text: str, max_tokens: int = 512) -> list[Chunk]:
+    """
+    Chunk a slip on its section headers: consecutive sections are packed into one chunk while they fit
+    in max_tokens, so a field never straddles two chunks unless its section alone exceeds the budget.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    starts = section_starts(text) + [len(text)]
+    spans = []
+    for start, end in zip(starts, starts[1:]):
+        spans.extend(_split_long(text, start, end, max_chars))
+
+    chunks = []
+    chunk_start, chunk_end = spans[0]
+    for start, end in spans[1:]:
+        if end - chunk_start <= max_chars:
+            chunk_end = end # section still fits, pack it into the current chunk
+        else:
+            chunks.append(Chunk(chunk_start, chunk_end, text[chunk_start:chunk_end]))
+            chunk_start, chunk_end = start, end
+    chunks.append(Chunk(chunk_start, chunk_end, text[chunk_start:chunk_end]))
+    return [chunk for chunk in chunks if chunk.text.strip()]
+
+
+def merge_chunk_results(
+        text: str,
+        chunks: list[Chunk],
+        results: list[lx.data.AnnotatedDocument]
+) -> lx.data.AnnotatedDocument:
+    """
+    Combine per-chunk AnnotatedDocuments into one document over the full text, shifting
+    character offsets by each chunk's start.
+    """
+    extractions = []
+    for chunk, result in zip(chunks, results):
+        for extraction in result.extractions or []:
+            if extraction.char_interval is not None and extraction.char_interval.start_pos is not None:
+                extraction.char_interval = lx.data.CharInterval(
+                    start_pos=extraction.char_interval.start_pos + chunk.start,
+                    end_pos=extraction.char_interval.end_pos + chunk.start,
+                )
+            extraction.token_interval = None # token positions were relative to the chunk
+            extractions.append(extraction)
+    for index, extraction in enumerate(extractions):
+        extraction.extraction_index = index + 1
+    return lx.data.AnnotatedDocument(text=text, extractions=extractions)
+
+
+def pack_spans(text: str, spans: list[tuple[int, int]], max_tokens: int) -> list[list[tuple[int, int]]]:
+    """
+    Pack spans (e.g. the sections that changed since last year), wherever they are in the text, into groups
+    of at most max_tokens, so a few scattered sections are one model call instead of one per section.
+    Oversized spans are split like build_chunks() does; join a group with packed_text().
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for start, end in spans:
+        pieces += [(start + chunk.start, start + chunk.end) for chunk in build_chunks(text[start:end], max_tokens)]
+    groups, size = [], max_chars
+    for start, end in pieces:
+        if size + end - start > max_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append((start, end))
+        size += end - start + 1
+    return groups
+
+
+def packed_text(text: str, group: list[tuple[int, int]]) -> str:
+    return "\n".join(text[start:end] for start, end in group)
+
+
+def unpack_extractions(result: lx.data.AnnotatedDocument, group: list[tuple[int, int]]) -> list[lx.data.Extraction]:
+    """Map the extractions of a packed_text() back to offsets in the full text."""
+    packed_starts, position = [], 0
+    for start, end in group:
+        packed_starts.append(position)
+        position += end - start + 1
+    extractions = []
+    for extraction in result.extractions or []:
+        interval = extraction.char_interval
+        if interval is not None and interval.start_pos is not None:
+            piece = bisect.bisect_right(packed_starts, interval.start_pos) - 1
+            start, end = group[piece]
+            packed_start = packed_starts[piece]
+            end_pos = min(interval.end_pos, packed_start + end - start) # never runs on into the next piece
+            extraction.char_interval = lx.data.CharInterval(start_pos=interval.start_pos - packed_start + start, end_pos=end_pos - packed_start + start)
+        extraction.token_interval = None
+        extractions.append(extraction)
+    return extractions
@@ -0,0 +1,393 @@
+# The treaty slip pipeline behind main2.py and worker.py: convert, extract, save.
+# Importing it loads langextract and markitdown, so the command line scripts only import it once their arguments are valid.
+import langextract as lx
+
+import dataclasses
+import functools
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from io_utils import PAGE_SEPARATOR, JsonlWriter, convert_many, convert_pdf_pages, get_markitdown, save_html, write_markdown
+from checkpoint import Manifest, source_hash
+from instrumentation import metrics
+from conversion_cache import get_cache
+from extraction_cache import cached_model, get_cache as get_extraction_cache
+from extraction_store import ExtractionStore, get_store
+from renewals import RenewalIndex, extract_incremental
+from scheduler import LaneScheduler, estimate_tokens
+import doc_packing
+import example_selection
+import followup_passes
+import cascade
+import treaty_chunking
+import treaty_prompt
+
+CACHE_DIR = ".cache/markdown"
+RESULTS_PATH = "extraction_results.jsonl" # batch results, one line per document
+MANIFEST_PATH = "extraction_results.manifest.sqlite" # checkpoint of the batch, next to the results
+METRICS_PATH = "run_metrics" # per-stage timing report, written as run_metrics.json and run_metrics.prom
+SECTION_TOKENS = 512 # token budget per section-aligned chunk, None falls back to langextract's char chunking
+CASCADE = False # chunks go to cascade.SMALL_MODEL_ID first and only escalate to MODEL_ID when its answer fails the checks
+SCHEDULE = False # batch mode: size-aware order, small documents first and large ones in their own lane, see scheduler.py
+EXTRACT_WORKERS = 4 # documents extracted at the same time when SCHEDULE is on
+PACK_TOKENS = None # batch mode: short documents share model calls up to this many text tokens, see doc_packing.py
+COMPRESS = False # markdown side outputs as <name>.md.zst; main2 --compress also sets RESULTS_PATH to a .jsonl.zst, see zstd_io.py
+FOLLOWUP_PASSES = 0 # re-query only the sections of missing required classes/layers up to this many times, see followup_passes.py
+MODEL_ID = "gpt-oss:120b-cloud"
+MODEL_URL = os.environ.get("OLLAMA_BASE_URL") # e.g. a local fake model server, None uses langextract's default http://localhost:11434
+
+# add source upload, convert and save
+def load_from_source(source_path: str) -> str:
+    source = Path(str(source_path))
+
+    md_text = get_cache(CACHE_DIR).convert(get_markitdown(), source) # skips the conversion if this exact file was converted before
+
+    write_markdown(source.with_suffix('.md'), md_text, COMPRESS) # <name>.md, or <name>.md.zst with COMPRESS
+
+    return md_text
+
+@functools.cache
+def get_model(bypass_cache: bool = False, model_id: str = MODEL_ID):
+    """The extraction model, built once per process and reused for every document."""
+    # prompt and examples come from the compiled artifact in prompts/, loaded once per process
+    artifact = treaty_prompt.load_artifact()
+    model_kwargs = {"model_url": MODEL_URL} if MODEL_URL else {}
+    return cached_model(model_id, artifact.examples, bypass=bypass_cache, **model_kwargs) # identical chunks never reach the model twice
+
+
+def warm_up():
+    """Load everything a document needs up front: MarkItDown, the prompt artifact and the model."""
+    get_markitdown()
+    get_model()
+    if CASCADE:
+        get_model(model_id=cascade.SMALL_MODEL_ID)
+
+
+def extract_text(input_text: str, bypass_cache: bool = False, renewals: RenewalIndex | None = None, follow_up: bool = True):
+    """
+    Run the extraction on one converted document; with renewals, only the sections changed since its prior slip.
+    follow_up=False skips the FOLLOWUP_PASSES check, for parts of a document that are checked once merged.
+    """
+    model = get_model(bypass_cache)
+    with metrics.stage("extract", bytes_in=len(input_text.encode("utf-8"))):
+        if renewals is not None: # never with CASCADE, main2.py rejects --incremental with --cascade
+            result = extract_incremental(input_text, model, renewals, section_tokens=SECTION_TOKENS or 512)
+        elif CASCADE:
+            result = cascade.extract(input_text, get_model(bypass_cache, cascade.SMALL_MODEL_ID), model, SECTION_TOKENS or 512)
+        else:
+            result = treaty_prompt.extract(input_text, model, section_tokens=SECTION_TOKENS)
+        if FOLLOWUP_PASSES and follow_up:
+            result = followup_passes.follow_up(result, model, SECTION_TOKENS or 512, FOLLOWUP_PASSES)
+        return result
+
+
+def extract_pdf_by_pages(source: Path, bypass_cache: bool = False, page_workers: int | None = None):
+    """
+    Convert a long PDF page-parallel and extract each page range as soon as it is converted, while the
+    later ranges are still converting. Returns the result over the stitched markdown and the page ranges
+    as (first page, last page, offset), written next to the markdown as <name>.pages.json.
+    """
+    parts, futures = [], []
+    with ThreadPoolExecutor(max_workers=1) as extractor: # one range at a time, its chunks already go to the model as a batch
+        for part in convert_pdf_pages(source, max_workers=page_workers, cache_dir=CACHE_DIR):
+            parts.append(part)
+            futures.append(extractor.submit(extract_text, part.text, bypass_cache, follow_up=False))
+        results = [future.result() for future in futures]
+
+    md_text = PAGE_SEPARATOR.join(part.text for part in parts)
+    page_ranges = [(part.first_page, part.last_page, part.start) for part in parts]
+    write_markdown(source.with_suffix('.md'), md_text, COMPRESS) # same side outputs as load_from_source
+    source.with_suffix('.pages.json').write_text(json.dumps(page_ranges), encoding = 'utf-8')
+
+    # a section running over a range boundary is extracted in two halves, like any chunk boundary
+    chunks = [treaty_chunking.Chunk(part.start, part.start + len(part.text), part.text) for part in parts]
+    result = treaty_chunking.merge_chunk_results(md_text, chunks, results)
+    if FOLLOWUP_PASSES: # on the whole slip, a class missing from one page range is usually in another
+        result = followup_passes.follow_up(result, get_model(bypass_cache), SECTION_TOKENS or 512, FOLLOWUP_PASSES)
+    return result, page_ranges
+
+
+def run_single(source: str, bypass_cache: bool = False, html: bool = False, page_workers: int | None = None, renewals_path: str | None = None):
+    renewals = RenewalIndex(renewals_path) if renewals_path else None
+    if page_workers and Path(source).suffix.lower() == ".pdf": # no renewals here, main2.py rejects --incremental with --page-workers
+        # convert and extract page ranges side by side, for treaty wordings of hundreds of pages
+        result, _ = extract_pdf_by_pages(Path(source), bypass_cache, page_workers)
+    else:
+        # The input text to be processed
+        input_text = load_from_source(source)
+
+        # Run the extraction
+        result = extract_text(input_text, bypass_cache, renewals)
+
+    if renewals is not None:
+        result.document_id = Path(source).stem
+        renewals.add(result) # this year's slip is next year's prior
+        print(f"renewals: {renewals.summary()}")
+
+    # Save the results to a JSONL file
+    if COMPRESS:
+        with JsonlWriter(RESULTS_PATH, append=False) as writer:
+            writer.write(result)
+    else:
+        lx.io.save_annotated_documents([result], output_name="extraction_results.jsonl", output_dir=".")
+
+    # HTML only on request, otherwise: python visualize_results.py extraction_results.jsonl
+    if html:
+        save_html(result, "visualization.html")
+    if treaty_prompt.EXAMPLE_TOKENS is not None:
+        print(f"example selection: {example_selection.summary()}")
+    if CASCADE:
+        print(f"cascade: {cascade.summary()}")
+    if FOLLOWUP_PASSES:
+        print(f"follow-up passes: {followup_passes.summary()}")
+    print(f"conversion cache: {get_cache(CACHE_DIR).log_stats()}")
+    print(f"extraction cache: {get_extraction_cache().stats()}")
+    print(f"stage timings: {', '.join(str(p) for p in metrics.write_report(METRICS_PATH))}")
+
+
+@dataclasses.dataclass
+class BatchRun:
+    writer: JsonlWriter
+    manifest: Manifest
+    source_keys: dict[Path, str] # source -> hash of its bytes
+    bypass_cache: bool = False
+    timings: list = dataclasses.field(default_factory=list) # (name, convert seconds, extract seconds, status)
+    store: ExtractionStore | None = None # also index every result for queries, see extraction_store.py
+    renewals: RenewalIndex | None = None # extract renewals incrementally against their prior slips, see renewals.py
+    started: float = dataclasses.field(default_factory=time.perf_counter)
+    finished: dict = dataclasses.field(default_factory=dict) # source -> perf_counter when its result was written
+
+
+def run_batch(
+        sources: list[Path],
+        workers: int | None,
+        bypass_cache: bool = False,
+        resume: bool = False,
+        parquet_path: str | None = None,
+        store_path: str | None = None,
+        renewals_path: str | None = None
+):
+    """
+    Convert sources in a process pool and extract each one as soon as its markdown is ready.
+    With resume=True, sources the manifest records as extracted are skipped and results are appended.
+    With parquet_path, the whole results JSONL is exported to Parquet/Arrow at the end (needs pyarrow).
+    With store_path, every result is also indexed in that SQLite extraction store as it is written.
+    With renewals_path, renewal slips only send the sections changed since their prior to the model.
+    With SCHEDULE, conversion and extraction follow scheduler.LaneScheduler instead of the source order.
+    """
+    batch_start = time.perf_counter()
+
+    manifest = Manifest(MANIFEST_PATH)
+    if resume:
+        manifest.reconcile(RESULTS_PATH) # results written just before a crash count as done
+    else:
+        manifest.reset()
+
+    source_keys = {source: source_hash(source) for source in sources}
+    todo = [source for source in sources if not manifest.is_extracted(source_keys[source])]
+    if len(todo) < len(sources):
+        print(f"resuming: {len(sources) - len(todo)} of {len(sources)} sources already extracted, skipped")
+
+    # every finished document is appended to the JSONL right away, a crash keeps all completed ones
+    with JsonlWriter(RESULTS_PATH, append=resume) as writer:
+        run = BatchRun(
+            writer, manifest, source_keys, bypass_cache,
+            store=get_store(store_path) if store_path else None,
+            renewals=RenewalIndex(renewals_path) if renewals_path else None,
+        )
+        if SCHEDULE:
+            schedules = run_scheduled(todo, workers, run)
+        else:
+            pack, pack_tokens = [], 0 # converted short documents waiting to share a call
+            for source, md_text, convert_seconds, error in convert_many(todo, max_workers=workers, cache_dir=CACHE_DIR):
+                if not (PACK_TOKENS and error is None and doc_packing.is_short(md_text)):
+                    process_converted(source, md_text, convert_seconds, error, run)
+                    continue
+                _record_converted(source, md_text, convert_seconds, error, run)
+                tokens = treaty_chunking.estimate_tokens(md_text)
+                if pack and pack_tokens + tokens > PACK_TOKENS:
+                    process_pack(pack, run)
+                    pack, pack_tokens = [], 0
+                pack.append((source, md_text, convert_seconds))
+                pack_tokens += tokens
+            if pack:
+                process_pack(pack, run)
+
+    total_seconds = time.perf_counter() - batch_start
+    print_report(run.timings, total_seconds)
+    if SCHEDULE:
+        for stage, lanes in zip(("convert", "extract"), schedules):
+            print(f"{stage} schedule: {lanes.report()}")
+    print(f"manifest: {manifest.summary()}")
+    print(f"conversion cache: {get_cache(CACHE_DIR).log_stats()}")
+    print(f"extraction cache: {get_extraction_cache().stats()}")
+    print(f"stage timings: {', '.join(str(p) for p in metrics.write_report(METRICS_PATH))}")
+    if run.store is not None:
+        print(f"extraction store: {run.store.stats()}")
+    if run.renewals is not None:
+        print(f"renewals: {run.renewals.summary()}")
+    if treaty_prompt.EXAMPLE_TOKENS is not None:
+        print(f"example selection: {example_selection.summary()}")
+    if PACK_TOKENS:
+        print(f"packing: {doc_packing.summary()}")
+    if CASCADE:
+        print(f"cascade: {cascade.summary()}")
+    if FOLLOWUP_PASSES:
+        print(f"follow-up passes: {followup_passes.summary()}")
+
+    if parquet_path is not None:
+        from columnar_export import export_parquet # pyarrow is only needed for this export
+        out_path, rows = export_parquet(RESULTS_PATH, parquet_path)
+        print(f"columnar export: {rows} extractions in {out_path}")
+
+
+def process_converted(source: Path, md_text: str | None, convert_seconds: float, error, run: BatchRun):
+    """Extract one converted batch document, stream its result to the writer and checkpoint it."""
+    if not _record_converted(source, md_text, convert_seconds, error, run):
+        return
+    extract_start = time.perf_counter()
+    try:
+        result = extract_text(md_text, run.bypass_cache, run.renewals)
+    except Exception as e: # keep going, the failure is listed in the report
+        result = e
+    _record_extracted(source, convert_seconds, time.perf_counter() - extract_start, result, run)
+
+
+def process_pack(pack: list[tuple[Path, str, float]], run: BatchRun):
+    """Extract converted short documents, (source, markdown, convert seconds), in shared model calls."""
+    start = time.perf_counter()
+    results = extract_pack([md_text for _, md_text, _ in pack], run.bypass_cache)
+    extract_seconds = (time.perf_counter() - start) / len(pack) # the calls' time shared by their documents
+    for (source, _, convert_seconds), result in zip(pack, results):
+        _record_extracted(source, convert_seconds, extract_seconds, result, run)
+
+
+def extract_pack(texts: list[str], bypass_cache: bool = False) -> list:
+    """
+    doc_packing.extract_packed() with the pipeline's model: a result per text, or the exception for every
+    text of a failed pack. Packed documents skip the cascade and follow-up passes, and renewals: main2.py
+    rejects --pack-tokens with --incremental.
+    """
+    try:
+        return doc_packing.extract_packed(texts, get_model(bypass_cache), PACK_TOKENS or doc_packing.PACK_TOKENS)
+    except Exception as e: # keep going, the failure is listed in the report
+        return [e] * len(texts)
+
+
+def _record_converted(source: Path, md_text: str | None, convert_seconds: float, error, run: BatchRun) -> bool:
+    """Checkpoint a conversion; False if it failed and there is nothing to extract."""
+    key = run.source_keys[source]
+    if error is not None:
+        run.manifest.mark_failed(key, source, "convert", error)
+        run.timings.append((source.name, convert_seconds, 0.0, f"convert failed: {error}"))
+        return False
+
+    write_markdown(source.with_suffix('.md'), md_text, COMPRESS) # same side output as load_from_source
+    run.manifest.mark_converted(key, source, source.stem)
+    return True
+
+
+def _record_extracted(source: Path, convert_seconds: float, extract_seconds: float, result, run: BatchRun):
+    """Write an extraction result (or record its exception) and checkpoint it."""
+    key = run.source_keys[source]
+    if isinstance(result, Exception):
+        run.manifest.mark_failed(key, source, "extract", result)
+        run.timings.append((source.name, convert_seconds, extract_seconds, f"extract failed: {result}"))
+        return
+    result.document_id = source.stem # keep track of which slip a result belongs to
+    run.writer.write(result)
+    if run.renewals is not None:
+        run.renewals.add(result) # this year's slip is next year's prior
+    if run.store is not None:
+        run.store.add(result, source, run.writer.path) # after the JSONL, which stays the record a store can be rebuilt from
+    run.manifest.mark_extracted(key, source) # only after the result line is flushed
+    run.timings.append((source.name, convert_seconds, extract_seconds, "ok"))
+    run.finished[source] = time.perf_counter()
+
+
+def run_scheduled(sources: list[Path], workers: int | None, run: BatchRun) -> tuple[LaneScheduler, LaneScheduler]:
+    """
+    The batch with size-aware scheduling: conversions are submitted by estimated size (PDF pages, file size)
+    and converted documents are extracted by EXTRACT_WORKERS threads, ordered by their markdown size, both
+    in two lanes (see scheduler.py). With PACK_TOKENS, short documents are queued as packs. Only this thread
+    writes results and the manifest, the conversion and extraction threads hand back what they finished.
+    Returns the conversion and extraction schedulers.
+    """
+    converts = LaneScheduler(workers or os.cpu_count() or 1)
+    extracts = LaneScheduler(EXTRACT_WORKERS)
+    events = queue.Queue()
+
+    def convert():
+        try:
+            for converted in convert_many(sources, max_workers=workers, cache_dir=CACHE_DIR, scheduler=converts):
+                events.put(("converted", converted))
+            events.put(("converted_all", None))
+        except Exception as e:
+            events.put(("convert_error", e))
+
+    def extract():
+        while (job := extracts.take()) is not None:
+            documents = job.item # [(source, markdown, convert seconds)], more than one for a pack of short documents
+            start = time.perf_counter()
+            if len(documents) > 1:
+                results = extract_pack([md_text for _, md_text, _ in documents], run.bypass_cache)
+            else:
+                try:
+                    results = [extract_text(documents[0][1], run.bypass_cache, run.renewals)]
+                except Exception as e: # keep going, the failure is listed in the report
+                    results = [e]
+            extracts.finish(job)
+            extract_seconds = (time.perf_counter() - start) / len(documents)
+            for (source, _, convert_seconds), result in zip(documents, results):
+                events.put(("extracted", (source, convert_seconds, extract_seconds, result)))
+
+    def push(documents):
+        extracts.push(documents, sum(estimate_tokens(source, md_text) for source, md_text, _ in documents), run.started)
+
+    threads = [threading.Thread(target=convert, daemon=True)] + [threading.Thread(target=extract, daemon=True) for _ in range(EXTRACT_WORKERS)]
+    for thread in threads:
+        thread.start()
+    converting, extracting = True, 0
+    pack, pack_tokens = [], 0 # converted short documents waiting to share a call
+    while converting or extracting:
+        kind, payload = events.get()
+        if kind == "converted":
+            source, md_text, convert_seconds, error = payload
+            if not _record_converted(source, md_text, convert_seconds, error, run):
+                continue
+            extracting += 1
+            if not (PACK_TOKENS and doc_packing.is_short(md_text)):
+                push([(source, md_text, convert_seconds)])
+                continue
+            tokens = treaty_chunking.estimate_tokens(md_text)
+            if pack and pack_tokens + tokens > PACK_TOKENS:
+                push(pack)
+                pack, pack_tokens = [], 0
+            pack.append((source, md_text, convert_seconds))
+            pack_tokens += tokens
+        elif kind == "extracted":
+            _record_extracted(*payload, run)
+            extracting -= 1
+        elif kind == "converted_all":
+            converting = False
+            if pack:
+                push(pack)
+            extracts.close()
+        else:
+            raise payload
+    return converts, extracts
+
+
+def print_report(timings: list[tuple[str, float, float, str]], total_seconds: float):
+    print(f"\n{'file':40} {'convert s':>10} {'extract s':>10}  status")
+    for name, convert_seconds, extract_seconds, status in timings:
+        print(f"{name:40} {convert_seconds:10.2f} {extract_seconds:10.2f}  {status}")
+
+    done = sum(1 for *_, status in timings if status == "ok")
+    per_minute = done / total_seconds * 60 if total_seconds > 0 else 0.0
+    print(f"\n{done}/{len(timings)} documents in {total_seconds:.1f}s ({per_minute:.1f} documents/min)")
@@ -0,0 +1,606 @@
+import functools
+import json
+import textwrap
+from pathlib import Path
+
+import langextract as lx
+from langextract import prompt_validation as pv
+from langextract.core import format_handler as fh
+
+import example_selection
+import treaty_chunking
+from alignment_index import IndexedResolver
+from instrumentation import metrics
+
+# bump after editing PROMPT_DESCRIPTION or _build_examples, so the compiled artifact is rebuilt
+ARTIFACT_VERSION = 1
+ARTIFACT_DIR = Path(__file__).parent / "prompts"
+ARTIFACT_PATH = ARTIFACT_DIR / f"treaty_prompt.v{ARTIFACT_VERSION}.json"
+EXAMPLE_TOKENS = None # few-shot budget per chunk: only the example sections relevant to it, see example_selection.py; None sends the whole example
+
+PROMPT_DESCRIPTION = textwrap.dedent(
+    """\
+    You are a senior underwriter in a reinsurance company and an excellent linguist.  
+    You extract structured fields from treaty documents in markdown format within non-life reinsurance.
+    Use exact substrings from the source (no paraphrasing). 
+    If a value is missing, omit it.
+    Use only the categories defined within examples.
+    """
+)
+
+
+
+# 2. Provide a high-quality example to guide the model
+def _build_examples() -> list[lx.data.ExampleData]:
+    """
+    Source of the few-shot example. Only used to compile the artifact, runs load it via load_artifact().
+    """
+    return [
+        lx.data.ExampleData(
+            text=textwrap.dedent(
+                """
+                Slip 1
+                Risk Details
+                UMR:
+                A661997MP00001
+                TYPE:
+                Motor Excess of Loss Reinsurance
+                REINSURED:
+                HYDROBIUS INSURANCE AND REINSURANCE S.A., Athens, Greece
+                PERIOD:
+                Losses occurring during the period commencing 12 months from 1st January 2024 to 31st December
+                2024 both days inclusive Local Standard Time at place where loss occurs.
+                CLASS OF BUSINESS:
+                Business in respect of Motor Insurances covering Third Party Bodily Injury, Third Party Material
+                Damage, Passengers Liability, including Green Cards and losses resulting from Presidential Decree
+                1019.
+                TERRITORIAL SCOPE:
+                Business underwritten in the territory of Greece but extended to cover European Union countries,
+                Switzerland, Green Cards and Presidential Decree 1019.
+                LIMITS & RETENTIONS:
+                1st Layer
+                EUR 3,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
+                arising out of one event in excess of:
+                EUR 2,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
+                arising out of one event.
+                2nd Layer
+                EUR 45,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
+                arising out of one event in excess of:
+                EUR 5,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
+                arising out of one event.
+                3rd Layer
+                Unlimited Ultimate Net Loss each and every accident or loss or series of accidents or losses arising
+                out of one event in excess of:
+                EUR 50,000,000 Ultimate Net Loss each and every accident or loss or series of accidents or losses
+                arising out of one event.
+                PREMIUM:
+                1st Layer
+                Minimum & Deposit: EUR 115,440
+                Premium payable in four equal instalments of EUR 28,860 each at 1st January 2024, 1st April 2024,
+                1st July 2024 and 1st October 2024 subject to LSW3000 (60 days) per each instalment.
+                2nd Layer
+                Minimum & Deposit: EUR 88,800
+                Premium payable in four equal instalments of EUR 22,200 each at 1st January 2024, 1st April 2024,
+                1st July 2024 and 1st October 2024 subject to LSW3000 (60 days) per each instalment.
+                3rd Layer
+                Minimum & Deposit: EUR 47,360
+                Premium payable in four equal instalments of EUR 11,840 each at 1st January 2024, 1st April 2024,
+                1st July 2024 and 1st October 2024 subject to LSW3000 (60 days) per each instalment.
+                The term ‘Gross Net Premium Income’ shall mean the original gross premium written by the
+                Reinsured, in respect of the business covered hereunder, less return premiums and less the premiums
+                for outwards reinsurance, recoveries under which inure to the benefit of reinsurers hereon.
+                PREMIUM PAYMENT TERMS:
+                The (Re)Insured undertakes that premium will be paid in full to Reinsurers within 60 days of inception
+                of this policy (or, in respect of instalment premiums, when due).
+                ESTIMATED PREMIUM INCOME:
+                Estimated Premium Income for the period 01/01/2024 - 31/12/2024:
+                EUR 36,000,000
+                TAXES PAYABLE BY THE REINSURED & ADMINISTERED BY
+                UNDERWRITERS:
+                None
+                CONDITIONS:
+                •  Reinsurance Clause
+                •  Ultimate Net Loss Clause
+                •  Net Retained Lines Clause
+                •  Premium Clause
+                •  Premium Processing Clause LSW3003 - 14/12/09
+                •  Claims Reporting and Co-Operation Clause
+                •  Loss Settlements Clause
+                •  Currency Conversion Clause
+                •  Apportionment Clause
+                •  Change In Law Clause
+                •  Local Jurisdiction Clause
+                •  Special Cancellation Clause
+                •  Limits and Retentions Clause
+                •  Extended Expiration Clause
+                •  Amendments and Alterations Clause
+                """
+            ).strip(),
+            extractions=[
+                # umr
+                lx.data.Extraction(
+                    extraction_class="umr_nr",
+                    extraction_text="A661997MP00001"
+                ),
+                # type
+                lx.data.Extraction(
+                    extraction_class="reinsurance_type",
+                    extraction_text="Motor Excess of Loss Reinsurance"
+                ),
+                # reinsured
+                lx.data.Extraction(
+                    extraction_class="company",
+                    extraction_text="HYDROBIUS INSURANCE AND REINSURANCE S.A., Athens, Greece",
+                    attributes={"role": "cedent"}
+                ),
+                # period
+                lx.data.Extraction(
+                    extraction_class="period",
+                    extraction_text="12 months",
+                    attributes={"type": "duration"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="period",
+                    extraction_text="1st January 2024",
+                    attributes={"type": "start"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="period",
+                    extraction_text="31st December 2024",
+                    attributes={"type": "end"}
+                ),
+                # class of business
+                lx.data.Extraction(
+                    extraction_class="class_of_business",
+                    extraction_text="Motor Insurances",
+                    attributes={"type": "business"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="class_of_business",
+                    extraction_text="Third Party Bodily Injury, Third Party Material Damage, Passengers Liability, including Green Cards and losses resulting from Presidential Decree 1019",
+                    attributes={"type": "coverage"}
+                ),
+                # territorial scope
+                lx.data.Extraction(
+                    extraction_class="territory",
+                    extraction_text="Greece",
+                    attributes={"type": "main"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="territory",
+                    extraction_text="European Union countries, Switzerland, Green Cards and Presidential Decree 1019",
+                    attributes={"type": "extended"}
+                ),
+                # limits & retentions
+                lx.data.Extraction(
+                    extraction_class="limits",
+                    extraction_text="EUR 3,000,000",
+                    attributes={"layer": "1st"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="retentions",
+                    extraction_text="EUR 2,000,000",
+                    attributes={"layer": "1st"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="limits",
+                    extraction_text="EUR 45,000,000",
+                    attributes={"layer": "2nd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="retentions",
+                    extraction_text="EUR 5,000,000",
+                    attributes={"layer": "2nd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="limits",
+                    extraction_text="Unlimited",
+                    attributes={"layer": "3rd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="retentions",
+                    extraction_text="EUR 50,000,000",
+                    attributes={"layer": "3rd"}
+                ),
+                # 1st layer premium
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="EUR 115,440",
+                    attributes={"part": "minimum & deposit amount", "layer": "1st"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="four",
+                    attributes={"part": "instalments", "layer": "1st"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="EUR 28,860",
+                    attributes={"part": "instalment amount", "layer": "1st"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="1st January 2024, 1st April 2024, 1st July 2024 and 1st October 2024",
+                    attributes={"part": "instalment dates", "layer": "1st"}
+                ),
+                # 2nd layer premium
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="EUR 88,800",
+                    attributes={"part": "minimum & deposit amount", "layer": "2nd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="four",
+                    attributes={"part": "instalments", "layer": "2nd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="EUR 22,200",
+                    attributes={"part": "instalment amount", "layer": "2nd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="1st January 2024, 1st April 2024, 1st July 2024 and 1st October 2024",
+                    attributes={"part": "instalment dates", "layer": "2nd"}
+                ),
+                # 3rd layer premium
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="EUR 47,360",
+                    attributes={"part": "minimum & deposit amount", "layer": "3rd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="four",
+                    attributes={"part": "instalments", "layer": "3rd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="EUR 11,840",
+                    attributes={"part": "instalment amount", "layer": "3rd"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="premium",
+                    extraction_text="1st January 2024, 1st April 2024, 1st July 2024 and 1st October 2024",
+                    attributes={"part": "instalment dates", "layer": "3rd"}
+                ),
+                # premium payment terms
+                lx.data.Extraction(
+                    extraction_class="premium_terms",
+                    extraction_text="within 60 days of inception of this policy"
+                ),
+                # estimated premium income
+                lx.data.Extraction(
+                    extraction_class="estimated_premium_income",
+                    extraction_text="01/01/2024",
+                    attributes={"part": "start"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="estimated_premium_income",
+                    extraction_text="31/12/2024",
+                    attributes={"part": "end"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="estimated_premium_income",
+                    extraction_text="EUR 36,000,000",
+                    attributes={"part": "amount"}
+                ),
+                # taxes
+                lx.data.Extraction(
+                    extraction_class="taxes",
+                    extraction_text="None"
+                ),
+                # conditions
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Reinsurance Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Ultimate Net Loss Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Net Retained Lines Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Premium Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Premium Processing Clause LSW3003 - 14/12/09",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Claims Reporting and Co-Operation Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Loss Settlements Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Currency Conversion Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Apportionment Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Change In Law Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Local Jurisdiction Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Special Cancellation Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Limits and Retentions Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Extended Expiration Clause",
+                    attributes={"type": "clause"}
+                ),
+                lx.data.Extraction(
+                    extraction_class="conditions",
+                    extraction_text="Amendments and Alterations Clause",
+                    attributes={"type": "clause"}
+                ),
+            ]
+        )
+    ]
+
+
+def _example_to_dict(example: lx.data.ExampleData) -> dict:
+    return {
+        "text": example.text,
+        "extractions": [
+            {"extraction_class": e.extraction_class, "extraction_text": e.extraction_text, "attributes": e.attributes}
+            for e in example.extractions
+        ],
+    }
+
+
+def _example_from_dict(example: dict) -> lx.data.ExampleData:
+    return lx.data.ExampleData(
+        text=example["text"],
+        extractions=[lx.data.Extraction(**e) for e in example["extractions"]],
+    )
+
+
+def compile_artifact(path: Path = ARTIFACT_PATH) -> Path:
+    """
+    Validate the examples against their own text once and write the prompt bundle to a versioned JSON file.
+    """
+    examples = _build_examples()
+
+    # the alignment check lx.extract otherwise repeats for every document
+    report = pv.validate_prompt_alignment(
+        examples=examples,
+        aligner=lx.resolver.WordAligner(),
+        policy=pv.AlignmentPolicy(),
+    )
+    pv.handle_alignment_report(report, level=pv.PromptValidationLevel.WARNING)
+
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "description": PROMPT_DESCRIPTION,
+        "examples": [_example_to_dict(example) for example in examples],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(artifact, ensure_ascii=False, indent=1), encoding="utf-8")
+    return path
+
+
+class PromptArtifact:
+    """
+    Prompt description and examples loaded from the compiled artifact, plus the rendered
+    few-shot prefix per output format, built once and reused verbatim for every chunk.
+    """
+
+    def __init__(self, description: str, examples: list[lx.data.ExampleData]):
+        self.description = description
+        self.examples = examples
+        self._prefixes: dict[tuple, str] = {} # (use_fences, picked sections or None) -> rendered prefix
+        self._section_sizes: dict[bool, list[int]] = {} # use_fences -> tokens of every rendered example section
+
+    def template(self, examples: list[lx.data.ExampleData] | None = None) -> lx.prompting.PromptTemplateStructured:
+        template = lx.prompting.PromptTemplateStructured(description=self.description)
+        template.examples.extend(self.examples if examples is None else examples)
+        return template
+
+    @functools.cached_property
+    def library(self) -> example_selection.ExampleLibrary:
+        return example_selection.ExampleLibrary(self.examples)
+
+    def prefix(self, format_handler, picked: tuple[int, ...] | None = None) -> str:
+        """
+        Everything in the prompt before the chunk text: instructions and rendered examples, all of them
+        or only the picked sections of the library.
+        """
+        key = (format_handler.use_fences, picked)
+        if key not in self._prefixes:
+            examples = None if picked is None else self.library.examples_for(picked)
+            generator = lx.prompting.QAPromptGenerator(template=self.template(examples), format_handler=format_handler)
+            empty = generator.render("")
+            tail = f"{generator.question_prefix}\n{generator.answer_prefix}"
+            assert empty.endswith(tail)
+            self._prefixes[key] = empty[: -len(tail)]
+        return self._prefixes[key]
+
+    def section_sizes(self, format_handler) -> list[int]:
+        """Estimated tokens of every library section rendered as an example, the cost select() budgets with."""
+        key = format_handler.use_fences
+        if key not in self._section_sizes:
+            generator = lx.prompting.QAPromptGenerator(template=self.template(), format_handler=format_handler)
+            self._section_sizes[key] = [
+                treaty_chunking.estimate_tokens(generator.format_example_as_text(example))
+                for [example] in (self.library.examples_for((i,)) for i in range(len(self.library.sections)))
+            ]
+        return self._section_sizes[key]
+
+
+@functools.cache # loaded at most once per process, and only when a run needs it
+def load_artifact() -> PromptArtifact:
+    if not ARTIFACT_PATH.is_file():
+        compile_artifact()
+    artifact = json.loads(ARTIFACT_PATH.read_text(encoding="utf-8"))
+    return PromptArtifact(
+        artifact["description"],
+        [_example_from_dict(example) for example in artifact["examples"]],
+    )
+
+
+class PrefixCachedPromptGenerator(lx.prompting.QAPromptGenerator):
+    """
+    Renders the same prompt as QAPromptGenerator, but pastes the memoized prefix in front of
+    each chunk instead of re-serializing every example. Identical bytes for every chunk also
+    let servers with prefix/KV caching reuse the work for the shared part.
+    """
+
+    def __init__(self, artifact: PromptArtifact, format_handler):
+        super().__init__(template=artifact.template(), format_handler=format_handler)
+        self._prefix = artifact.prefix(format_handler)
+
+    def render(self, question: str, additional_context: str | None = None) -> str:
+        with metrics.stage("prompt_build"):
+            if additional_context:
+                return super().render(question, additional_context) # context goes between description and examples
+            return f"{self._prefix}{self.question_prefix}{question}\n{self.answer_prefix}"
+
+
+class SelectingPromptGenerator(PrefixCachedPromptGenerator):
+    """
+    PrefixCachedPromptGenerator with only the example sections relevant to each chunk, up to a token
+    budget. Chunks of the same sections get the same picks, so their prefix is still rendered once and
+    still identical bytes for prefix caching servers.
+    """
+
+    def __init__(self, artifact: PromptArtifact, format_handler, budget: int):
+        super().__init__(artifact, format_handler)
+        self._artifact = artifact
+        self._budget = budget
+        self._sizes = artifact.section_sizes(format_handler)
+        self._full_tokens = treaty_chunking.estimate_tokens(self._prefix)
+
+    def render(self, question: str, additional_context: str | None = None) -> str:
+        with metrics.stage("prompt_build"):
+            picked = self._artifact.library.select(question, self._budget, self._sizes)
+            prefix = self._artifact.prefix(self.format_handler, picked)
+            example_selection.tally.add(
+                prompts=1, full_prefix_tokens=self._full_tokens, prefix_tokens=treaty_chunking.estimate_tokens(prefix)
+            )
+            if additional_context:
+                examples = self._artifact.library.examples_for(picked)
+                generator = lx.prompting.QAPromptGenerator(template=self._artifact.template(examples), format_handler=self.format_handler)
+                return generator.render(question, additional_context)
+            return f"{prefix}{self.question_prefix}{question}\n{self.answer_prefix}"
+
+
+class ArtifactAnnotator(lx.annotation.Annotator):
+    """lx Annotator that builds its prompts with PrefixCachedPromptGenerator, or SelectingPromptGenerator with a budget."""
+
+    def __init__(self, language_model, artifact: PromptArtifact, format_handler, example_tokens: int | None = None):
+        super().__init__(language_model, artifact.template(), format_handler=format_handler)
+        if example_tokens is None:
+            self._prompt_generator = PrefixCachedPromptGenerator(artifact, format_handler)
+        else:
+            self._prompt_generator = SelectingPromptGenerator(artifact, format_handler, example_tokens)
+
+
+def extract(
+        text: str,
+        model, # a provider or wrapper, e.g. extraction_cache.cached_model(...)
+        max_char_buffer: int = 1000,
+        batch_length: int = 10,
+        show_progress: bool = True,
+        section_tokens: int | None = None # chunk on slip section headers up to this many tokens, None for lx's char chunking
+) -> lx.data.AnnotatedDocument:
+    """
+    Same result as lx.extract(text, prompt_description=..., examples=..., model=model) for the treaty
+    prompt, without re-validating the examples per document or re-rendering them per chunk.
+    With section_tokens set, every chunk from treaty_chunking.build_chunks is sent in one model call.
+    """
+    annotator, resolver = _annotator(model)
+
+    if section_tokens is None:
+        return annotator.annotate_text(
+            text=text,
+            resolver=resolver,
+            max_char_buffer=max_char_buffer,
+            batch_length=batch_length,
+            debug=False,
+            show_progress=show_progress,
+            suppress_parse_errors=True, # lx.extract default
+        )
+
+    chunks = treaty_chunking.build_chunks(text, section_tokens)
+    results = _annotate_texts([chunk.text for chunk in chunks], annotator, resolver, batch_length, show_progress)
+    return treaty_chunking.merge_chunk_results(text, chunks, results)
+
+
+def extract_texts(
+        texts: list[str], # e.g. only the slip sections that changed since last year, see renewals.py
+        model,
+        batch_length: int = 10,
+        show_progress: bool = True,
+        contexts: list[str | None] | None = None # per text, added to the prompt above the examples, e.g. what to look for
+) -> list[lx.data.AnnotatedDocument]:
+    """One model call per text, like the section chunks of extract(); offsets are relative to each text."""
+    annotator, resolver = _annotator(model)
+    return _annotate_texts(texts, annotator, resolver, batch_length, show_progress, contexts)
+
+
+def _annotator(model) -> tuple[ArtifactAnnotator, IndexedResolver]:
+    format_handler, _ = fh.FormatHandler.from_resolver_params(
+        resolver_params=None,
+        base_format_type=lx.data.FormatType.JSON,
+        base_use_fences=model.requires_fence_output,
+        base_attribute_suffix=lx.data.ATTRIBUTE_SUFFIX,
+        base_use_wrapper=True,
+        base_wrapper_key=lx.data.EXTRACTIONS_KEY,
+    )
+    annotator = ArtifactAnnotator(model, load_artifact(), format_handler, EXAMPLE_TOKENS)
+    return annotator, IndexedResolver(format_handler=format_handler) # exact matches in one pass, records parse and align time
+
+
+def _annotate_texts(texts, annotator, resolver, batch_length, show_progress, contexts=None) -> list[lx.data.AnnotatedDocument]:
+    if not texts:
+        return []
+    contexts = contexts or [None] * len(texts)
+    documents = [lx.data.Document(text=text, document_id=f"chunk_{i}", additional_context=context) for i, (text, context) in enumerate(zip(texts, contexts))]
+    results = annotator.annotate_documents(
+        documents,
+        resolver=resolver,
+        max_char_buffer=max(len(text) for text in texts), # never re-split a section chunk
+        batch_length=batch_length,
+        debug=False,
+        show_progress=show_progress,
+        suppress_parse_errors=True,
+    )
+    return list(results)
+
+
+if __name__ == "__main__":
+    print(f"wrote {compile_artifact()}")
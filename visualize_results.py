@@ -0,0 +1,24 @@
+import argparse
+
+# Render HTML visualizations on demand from a results JSONL, e.g.
+# python visualize_results.py extraction_results.jsonl --ids slip_0042 slip_0107 --workers 4
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render HTML for selected documents of an extraction results JSONL")
+    parser.add_argument("jsonl", help = "results file (.jsonl or .jsonl.zst) written by main2.py or io_utils.save_extraction_outputs")
+    parser.add_argument("--ids", nargs = "*", default = None, help = "document ids to render (default: all)")
+    parser.add_argument("--out-dir", default = "out/html")
+    parser.add_argument("--workers", type = int, default = 1, help = "render in this many processes")
+    args = parser.parse_args()
+
+    from io_utils import render_html_from_jsonl # loads langextract, only after --help had its chance
+
+    paths = render_html_from_jsonl(
+        args.jsonl,
+        out_dir = args.out_dir,
+        document_ids = set(args.ids) if args.ids else None,
+        workers = args.workers
+    )
+    for path in paths:
+        print(path)
+    if args.ids and len(paths) < len(set(args.ids)):
+        print(f"{len(set(args.ids)) - len(paths)} of the requested ids were not found in {args.jsonl}")
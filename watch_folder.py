@@ -0,0 +1,313 @@
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import queue
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# Watch-folder ingestion: a long-running service that extracts every .pdf/.txt landing in in/ within
+# seconds, instead of waiting for the next manual batch. inotify reports new files (a directory scan every
+# POLL_SECONDS where inotify is not available, e.g. macOS or network shares), a file is only taken once it
+# has been quiet for DEBOUNCE_SECONDS (copies and scanners write in several goes), and a bounded queue
+# feeds a pool of threads sharing one warm worker.Worker: the threads overlap the model calls of several
+# documents, their conversions take turns on the worker's one MarkItDown. A file with the name stem of
+# another one (a.txt next to a.pdf) would get the same document_id, it is refused like collect_sources()
+# does in batch mode. Queue depth and lag are written to out/watch_status.json and .prom every STATUS_SECONDS.
+#   python watch_folder.py                  # watch in/, append results to extraction_results.jsonl
+#   python watch_folder.py --workers 4 --poll
+
+WATCH_DIR = "in"
+MANIFEST_PATH = "out/watch_manifest.sqlite" # what was extracted, so a restart does not redo the whole folder
+STATUS_PATH = "out/watch_status" # .json and .prom (node exporter textfile collector)
+DEBOUNCE_SECONDS = 1.0 # unchanged size and mtime for this long means the file is completely written
+POLL_SECONDS = 1.0 # directory scan interval without inotify, also the longest the loop sleeps
+STATUS_SECONDS = 10.0
+QUEUE_SIZE = 32 # files waiting for a worker; when full, ready files stay pending (back pressure)
+
+# inotify(7) event masks
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+EVENT = struct.Struct("iIII") # wd, mask, cookie, len, followed by len bytes of name
+
+
+class InotifyWatcher:
+    """Names of files created, written or moved into a directory, from the kernel via libc's inotify."""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("no inotify in this libc")
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.directory = directory
+        self.overflowed = False # events were dropped, the caller should rescan the directory
+
+    def changed(self, timeout: float) -> set[str]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self._fd, 64 * 1024)
+        names, position = set(), 0
+        while position < len(data):
+            _, mask, _, length = EVENT.unpack_from(data, position)
+            position += EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+            name = data[position:position + length].rstrip(b"\0")
+            position += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Same interface as InotifyWatcher, by comparing (size, mtime) of every entry between directory scans."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.overflowed = False
+        self._seen = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        with os.scandir(self.directory) as entries:
+            return {entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns) for entry in entries if entry.is_file()}
+
+    def changed(self, timeout: float) -> set[str]:
+        time.sleep(timeout)
+        current = self._scan()
+        names = {name for name, signature in current.items() if self._seen.get(name) != signature}
+        self._seen = current
+        return names
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory: Path, poll: bool = False):
+    if not poll:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e: # not Linux, or out of inotify watches
+            print(f"inotify unavailable ({e}), polling {directory} every {POLL_SECONDS}s", file=sys.stderr)
+    return PollingWatcher(directory)
+
+
+class Pending:
+    """A file seen in the folder and not yet queued: its last (size, mtime) and when that last changed."""
+
+    def __init__(self, path: Path, now: float):
+        self.path = path
+        self.seen = now # first noticed, the start of its processing lag
+        self.changed = now
+        self.signature = None
+        self.key = None # source hash, once it settled
+        self.queued = 0.0
+
+
+class IngestService:
+    """Debounces new files, queues them for a pool of threads running worker.Worker jobs, records lag."""
+
+    def __init__(self, directory: Path, worker, manifest, workers: int = 2, queue_size: int = QUEUE_SIZE, poll: bool = False):
+        from io_utils import SOURCE_SUFFIXES
+
+        self.directory = directory
+        self.suffixes = SOURCE_SUFFIXES
+        self.worker = worker
+        self.manifest = manifest # only touched by the loop's thread, sqlite connections are per thread
+        self.watcher = open_watcher(directory, poll)
+        self.pending: dict[Path, Pending] = {}
+        self.jobs: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.done: queue.Queue = queue.Queue()
+        self.in_flight = 0
+        self.active: set[str] = set() # source hashes queued or running, a copy of a file landing meanwhile is not redone
+        self.stems = {Path(source).stem: Path(source).name for source in manifest.extracted_sources()} # document_id -> file name that has it
+        self.lags: list[float] = []
+        self.tally = Counter() # queued, extracted, failed, skipped (already in the manifest), refused (name stem taken), vanished
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _wanted(self, name: str) -> bool:
+        # hidden and temporary names are partial uploads (rsync's .name.XXXX, browsers' .part)
+        return not name.startswith(".") and Path(name).suffix.lower() in self.suffixes
+
+    def note(self, names, now: float):
+        for name in names:
+            if self._wanted(name):
+                path = self.directory / name
+                self.pending.setdefault(path, Pending(path, now)).changed = now
+
+    def rescan(self, now: float):
+        """Every file of the folder as if it had just landed, at start and after lost inotify events."""
+        self.note([entry.name for entry in os.scandir(self.directory) if entry.is_file()], now)
+
+    def promote(self, now: float):
+        """Queue the pending files that have been quiet for DEBOUNCE_SECONDS, as long as the queue has room."""
+        from checkpoint import source_hash
+
+        for path, item in list(self.pending.items()):
+            try:
+                stat = path.stat()
+            except FileNotFoundError: # moved away or deleted before it settled
+                del self.pending[path]
+                self.tally["vanished"] += 1
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != item.signature: # still being written, or first look at it
+                item.signature, item.changed = signature, now
+                continue
+            if now - item.changed < DEBOUNCE_SECONDS or stat.st_size == 0:
+                continue
+            item.key = source_hash(path)
+            if item.key in self.active or self.manifest.is_extracted(item.key):
+                del self.pending[path]
+                self.tally["skipped"] += 1
+                continue
+            owner = self.stems.setdefault(path.stem, path.name)
+            if owner != path.name: # the result would replace the other file's under the same document_id
+                del self.pending[path]
+                self.tally["refused"] += 1
+                print(json.dumps({"source": str(path), "status": f"refused: same name stem as {owner}, rename it"}), flush=True)
+                continue
+            item.queued = now
+            try:
+                self.jobs.put_nowait(item)
+            except queue.Full:
+                return # the rest stays pending until a worker frees a slot
+            del self.pending[path]
+            self.active.add(item.key)
+            self.tally["queued"] += 1
+
+    def _work(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            with self._lock:
+                self.in_flight += 1
+            started = time.time()
+            answer = self.worker.run_job({"source": str(item.path), "document_id": item.path.stem})
+            with self._lock:
+                self.in_flight -= 1
+            self.done.put((item, answer, started, time.time()))
+
+    def collect(self):
+        from instrumentation import metrics
+
+        while True:
+            try:
+                item, answer, started, finished = self.done.get_nowait()
+            except queue.Empty:
+                return
+            self.active.discard(item.key)
+            metrics.add("ingest_queue_wait", started - item.queued)
+            metrics.add("ingest_lag", finished - item.seen) # landed to result written
+            if answer["status"] == "ok":
+                self.manifest.mark_extracted(item.key, item.path)
+                self.lags.append(finished - item.seen)
+                self.tally["extracted"] += 1
+            else:
+                self.manifest.mark_failed(item.key, item.path, "watch", answer["status"])
+                self.tally["failed"] += 1
+            print(json.dumps(answer), flush=True)
+
+    def status(self, now: float) -> dict:
+        from instrumentation import percentile
+
+        waiting = [item.seen for item in self.pending.values()]
+        return {
+            "time": now,
+            "pending": len(self.pending), # still being written, or waiting for room in the queue
+            "queue_depth": self.jobs.qsize(),
+            "in_flight": self.in_flight,
+            "oldest_waiting_seconds": round(now - min(waiting), 2) if waiting else 0.0,
+            "lag_p50_seconds": round(percentile(self.lags, 50), 2),
+            "lag_p95_seconds": round(percentile(self.lags, 95), 2),
+            **self.tally,
+        }
+
+    def write_status(self, now: float) -> dict:
+        status = self.status(now)
+        path_stem = Path(STATUS_PATH)
+        path_stem.parent.mkdir(parents=True, exist_ok=True)
+        path_stem.with_suffix(".json").write_text(json.dumps(status, indent=2), encoding="utf-8")
+        path_stem.with_suffix(".prom").write_text(
+            "".join(f"# TYPE watch_{name} gauge\nwatch_{name} {value}\n" for name, value in status.items() if name != "time"),
+            encoding="utf-8",
+        )
+        return status
+
+    def run(self):
+        self.rescan(time.time())
+        next_status = 0.0
+        while True:
+            names = self.watcher.changed(timeout=min(POLL_SECONDS, DEBOUNCE_SECONDS / 2) if self.pending else POLL_SECONDS)
+            now = time.time()
+            if self.watcher.overflowed:
+                self.watcher.overflowed = False
+                self.rescan(now)
+            self.note(names, now)
+            self.collect()
+            self.promote(now)
+            if now >= next_status:
+                print(f"watch: {self.write_status(now)}", file=sys.stderr)
+                next_status = now + STATUS_SECONDS
+
+    def close(self):
+        for _ in self._threads:
+            self.jobs.put(None) # after the queued files, so those still finish
+        for thread in self._threads:
+            thread.join()
+        self.collect()
+        self.watcher.close()
+        print(f"watch: {self.write_status(time.time())}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract every .pdf/.txt that lands in a folder, as it lands")
+    parser.add_argument("--dir", default = WATCH_DIR, help = "folder to watch")
+    parser.add_argument("--workers", type = int, default = 2, help = "documents extracted at the same time; conversion is serialized, one document at a time")
+    parser.add_argument("--queue-size", type = int, default = QUEUE_SIZE)
+    parser.add_argument("--debounce", type = float, default = DEBOUNCE_SECONDS, help = "seconds a file must stay unchanged before it is taken")
+    parser.add_argument("--poll", action = "store_true", help = "scan the folder instead of using inotify")
+    parser.add_argument("--results", default = "extraction_results.jsonl", help = "JSONL the results are appended to")
+    args = parser.parse_args()
+    directory = Path(args.dir)
+    if not directory.is_dir():
+        parser.error(f"--dir not found: {args.dir}")
+    DEBOUNCE_SECONDS = args.debounce
+
+    from checkpoint import Manifest
+    from worker import Worker
+
+    worker = Worker(args.results)
+    print(f"worker ready in {worker.warm_up_seconds:.2f}s, watching {directory}", file=sys.stderr)
+    service = IngestService(directory, worker, Manifest(MANIFEST_PATH), args.workers, args.queue_size, args.poll)
+    signal.signal(signal.SIGTERM, signal.default_int_handler) # stop like Ctrl-C, e.g. from systemd or kill
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        worker.close()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Long-lived extraction worker: pays for langextract, MarkItDown, the prompt artifact and the model once,
+# then runs each job in milliseconds of overhead instead of seconds of imports. Jobs are JSON lines,
+# {"source": "in/slip.pdf"} with optional "document_id" and "no_cache", answered with one JSON line each.
+#   python worker.py --serve                      # listen on 127.0.0.1:8766
+#   python worker.py --submit in/a.pdf in/b.pdf   # send jobs to the running worker
+#   python worker.py --stdin < jobs.jsonl         # no socket, jobs on stdin, answers on stdout
+# Results are appended to --results as they finish, the same JSONL format as main2.py batch mode.
+
+HOST = "127.0.0.1" # local only, jobs name files on this machine
+PORT = 8766
+
+
+class Worker:
+    """Keeps the pipeline loaded and appends every job's result to one results JSONL."""
+
+    def __init__(self, results_path: str):
+        import treaty_pipeline # the heavy imports, done once for the lifetime of the worker
+        from io_utils import JsonlWriter
+
+        self.pipeline = treaty_pipeline
+        start = time.perf_counter()
+        treaty_pipeline.warm_up()
+        self.warm_up_seconds = time.perf_counter() - start
+        self.writer = JsonlWriter(results_path, append=True) # cuts the torn last line of a killed worker first
+        self._write_lock = threading.Lock() # socket jobs run on one thread per connection
+        self._convert_lock = threading.Lock() # one MarkItDown and conversion cache, neither is thread safe; converting is CPU bound anyway
+
+    def run_job(self, job: dict) -> dict:
+        source = Path(job["source"])
+        answer = {"source": str(source), "document_id": job.get("document_id") or source.stem}
+        try:
+            with self._convert_lock:
+                start = time.perf_counter()
+                md_text = self.pipeline.load_from_source(source)
+            answer["convert_seconds"] = round(time.perf_counter() - start, 4)
+
+            start = time.perf_counter()
+            result = self.pipeline.extract_text(md_text, job.get("no_cache", False))
+            answer["extract_seconds"] = round(time.perf_counter() - start, 4)
+        except Exception as e: # a bad job must not take the worker down
+            answer["status"] = f"failed: {e}"
+            return answer
+
+        result.document_id = answer["document_id"]
+        with self._write_lock:
+            self.writer.write(result)
+        answer["extractions"] = len(result.extractions or [])
+        answer["status"] = "ok"
+        return answer
+
+    def answer_line(self, line: str) -> str:
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            return json.dumps({"status": f"failed: not a JSON job: {e}"})
+        return json.dumps(self.run_job(job))
+
+    def close(self):
+        self.writer.close()
+        from instrumentation import metrics
+        print(f"stage timings: {', '.join(str(p) for p in metrics.write_report(self.pipeline.METRICS_PATH))}", file=sys.stderr)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """One connection may send any number of job lines, each is answered in order."""
+
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(self.server.worker.answer_line(line.decode("utf-8")).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, worker: Worker):
+        super().__init__(address, JobHandler)
+        self.worker = worker
+
+
+def submit(sources: list[str], host: str = HOST, port: int = PORT, no_cache: bool = False):
+    """Client side: standard library only, so submitting costs no imports."""
+    with socket.create_connection((host, port)) as conn, conn.makefile("rwb") as stream:
+        for source in sources:
+            stream.write(json.dumps({"source": str(Path(source).resolve()), "no_cache": no_cache}).encode("utf-8") + b"\n")
+        stream.flush()
+        conn.shutdown(socket.SHUT_WR) # no more jobs, the worker answers what it has
+        for line in stream:
+            print(line.decode("utf-8").rstrip())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm extraction worker for treaty slips")
+    mode = parser.add_mutually_exclusive_group(required = True)
+    mode.add_argument("--serve", action = "store_true", help = "keep the pipeline loaded and accept jobs on a local socket")
+    mode.add_argument("--stdin", action = "store_true", help = "read JSON jobs from stdin, answer on stdout")
+    mode.add_argument("--submit", nargs = "+", metavar = "SOURCE", help = "send sources to a running --serve worker")
+    parser.add_argument("--port", type = int, default = PORT)
+    parser.add_argument("--results", default = "extraction_results.jsonl", help = "JSONL the worker appends results to")
+    parser.add_argument("--no-cache", action = "store_true", help = "submit: always call the model for these jobs")
+    args = parser.parse_args()
+
+    if args.submit:
+        submit(args.submit, port = args.port, no_cache = args.no_cache)
+        sys.exit(0)
+
+    worker = Worker(args.results)
+    print(f"worker ready in {worker.warm_up_seconds:.2f}s", file=sys.stderr)
+    try:
+        if args.stdin:
+            for line in sys.stdin:
+                if line.strip():
+                    print(worker.answer_line(line), flush=True)
+        else:
+            with WorkerServer((HOST, args.port), worker) as server:
+                print(f"listening on {HOST}:{args.port}", file=sys.stderr)
+                server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()